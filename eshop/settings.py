@@ -15,7 +15,15 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Mail is queued in the outbox (orders/outbox.py) and delivered by
+# EMAIL_DELIVERY_BACKEND, on a background thread or the send_queued_email worker.
+# Use the locmem or filebased backend as EMAIL_DELIVERY_BACKEND to test locally.
+EMAIL_BACKEND = 'orders.outbox.OutboxEmailBackend'
+EMAIL_DELIVERY_BACKEND = os.getenv('EMAIL_DELIVERY_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+# Run send_queued_email on a schedule (cron, or a worker with --loop) in production: it
+# retries failed messages and recovers interrupted batches. The background thread
+# (EMAIL_OUTBOX_THREAD) only lives as long as its process; set it to False with a worker.
+EMAIL_OUTBOX_THREAD = os.getenv('EMAIL_OUTBOX_THREAD', 'true').lower() in ('1', 'true', 'yes')
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
@@ -67,6 +75,23 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
 ]
+
+# Per-request SQL / template timing in Server-Timing headers and the
+# "orders.metrics" log (orders/metrics.py). Off unless REQUEST_METRICS=True.
+if os.getenv('REQUEST_METRICS', '').lower() in ('1', 'true', 'yes'):
+    MIDDLEWARE.insert(0, 'orders.metrics.RequestMetricsMiddleware')
+
+# Max queries per URL name once the caches are warm; over-budget requests are
+# logged, or raise when strict. Enforced by orders/tests.py. With the database
+# cache backend every cache lookup is a query too.
+QUERY_BUDGETS = {
+    'index': 12,
+    'product_detail': 10,
+    'shop_all': 12,
+    'shopping_cart': 10,
+}
+QUERY_BUDGET_STRICT = False
+
 CORS_ALLOW_ALL_ORIGINS = True
 
 ROOT_URLCONF = 'eshop.urls'
@@ -83,6 +108,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'orders.context_processors.cart_total_quantity',
+                'orders.context_processors.wishlisted_ids',
             ],
         },
     },
@@ -107,6 +133,27 @@ DATABASES = {
     }
 }
 
+# Version tokens (orders/categories.py, coupons.py, homepage.py) and cached
+# pages must be shared by every worker and management command, so the cache is
+# never per-process: Redis when REDIS_URL is set, else a table in the database
+# (created by the orders 0017 migration, or `manage.py createcachetable`).
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -153,6 +200,30 @@ STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
 
+# collectstatic writes content-hashed copies, a staticfiles.json manifest for
+# {% static %}, and .gz/.br siblings (orders/static_storage.py). Outside DEBUG
+# they're served with immutable cache headers by orders/static_serving.py.
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "orders.static_storage.CompressedManifestStaticFilesStorage"},
+}
+
+# Uploaded media is served by orders/media_serving.py (ranges, ETags, cache headers).
+MEDIA_URL = '/media/'
+# Behind nginx, set MEDIA_ACCEL_REDIRECT to an internal location (e.g. /protected-media/)
+# aliased to the media directory and nginx sends the files itself.
+MEDIA_ACCEL_REDIRECT = os.getenv('MEDIA_ACCEL_REDIRECT')
+
+# Product media uploads are staged here and processed by orders/media_jobs.py,
+# on a background thread or the process_media_jobs worker.
+MEDIA_STAGING_ROOT = BASE_DIR / "media_staging"
+# Set MEDIA_JOBS_THREAD=False when running the process_media_jobs worker
+MEDIA_JOBS_THREAD = os.getenv('MEDIA_JOBS_THREAD', 'true').lower() in ('1', 'true', 'yes')
+
+# Related-products lists of saved / deleted products are refreshed on a
+# background thread, or by the refresh_related_products worker (set False then).
+RELATED_PRODUCTS_THREAD = os.getenv('RELATED_PRODUCTS_THREAD', 'true').lower() in ('1', 'true', 'yes')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -14,12 +14,16 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 from eshop_app import views as eshop_views
 from orders import views as landing_views
+from orders.media_serving import serve_media
+from orders.static_serving import serve_static
 from django.contrib.auth import views as auth_views
 from django.urls import reverse_lazy
 
@@ -59,7 +63,22 @@ urlpatterns = [
     # path('login/', auth_views.LoginView.as_view(template_name='login.html'), name='login'),
 ]
 
-# Serve static/media files in development (if DEBUG=True)
+# Static files: collected, hashed and pre-compressed copies outside DEBUG (orders/static_serving.py)
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file
+    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+else:
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % re.escape(settings.STATIC_URL.lstrip('/')), serve_static, name='static'),
+    ]
+
+# Uploaded media, with range requests, ETags and cache headers (orders/media_serving.py).
+# Never without a prefix: the pattern would swallow every URL, APPEND_SLASH redirects included.
+if settings.MEDIA_URL.strip('/'):
+    urlpatterns += [
+        re_path(
+            r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')),
+            serve_media,
+            {'document_root': settings.MEDIA_ROOT},
+            name='media',
+        ),
+    ]
@@ -66,6 +66,11 @@ class Banner(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='inactive')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-created_at'], name='banner_status_created_idx'),
+        ]
+
     def __str__(self):
         return self.title
     
@@ -82,6 +87,12 @@ class Category(models.Model):
     photo = models.ImageField(upload_to='category_photos/', blank=True, null=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'is_parent', 'title'], name='category_status_parent_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -95,6 +106,11 @@ class Brand(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'title'], name='brand_status_title_idx'),
+        ]
+
     def __str__(self):
         return self.title
     
@@ -131,6 +147,26 @@ class Product(models.Model):
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name="products_created")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Storefront listings: active products by price or newest first (id breaks ties)
+            models.Index(fields=['status', 'price', 'id'], name='product_status_price_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='product_status_created_idx'),
+            models.Index(fields=['category', 'status', 'price'], name='product_category_price_idx'),
+            # Homepage featured row and deals, only over the rows they can match
+            models.Index(
+                fields=['-created_at'],
+                name='product_featured_idx',
+                condition=models.Q(is_featured=True, status='active'),
+            ),
+            models.Index(
+                fields=['deal_end_date'],
+                name='product_deal_end_idx',
+                condition=models.Q(deal_end_date__isnull=False, status='active'),
+            ),
+        ]
     
     def _str_(self):
         return self.title
@@ -192,6 +228,8 @@ class Coupon(models.Model):
     min_order_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     usage_limit = models.PositiveIntegerField(default=0, help_text="0 means unlimited")
     per_user_limit = models.PositiveIntegerField(default=0, help_text="0 means unlimited")
+    # Redemptions so far, kept by orders.coupons.redeem_coupon
+    used_count = models.PositiveIntegerField(default=0, editable=False)
     start_date = models.DateTimeField(default=timezone.now)
     end_date = models.DateTimeField(null=True, blank=True)
     is_active = models.BooleanField(default=True)
@@ -199,6 +237,15 @@ class Coupon(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['start_date', 'end_date'],
+                name='coupon_active_window_idx',
+                condition=models.Q(is_active=True),
+            ),
+        ]
+
     def __str__(self):
         return self.code
     
@@ -268,6 +315,11 @@ class Blog(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-publish_date'], name='blog_status_publish_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         # Auto-generate slug if not provided
         if not self.slug:
@@ -316,6 +368,11 @@ class Client(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='client_status_idx'),
+        ]
+
 
 class GeneralFAQ(models.Model):
     """
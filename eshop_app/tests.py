@@ -1,3 +1,95 @@
-from django.test import TestCase
+import tempfile
+from contextlib import redirect_stdout
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from orders.models import MediaUploadJob, ProductColor, ProductSize
+from .models import Category, Product
+
+
+def make_user(email, **kwargs):
+    return get_user_model().objects.create_user(
+        email=email, password='secret-pass-123', first_name='Test', username=email, **kwargs
+    )
+
+
+class MediaJobStatusTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = make_user('owner@example.com')
+        category = Category.objects.create(title='Clothing', is_parent=True)
+        product = Product.objects.create(
+            title='Linen shirt', summary='A shirt', price=Decimal('40.00'), stock=10, category=category,
+            photo='products/linen-shirt.jpg', condition='new', status='active', user=cls.owner,
+        )
+        cls.job = MediaUploadJob.objects.create(
+            product=product, files=[{'path': 'a.jpg', 'name': 'a.jpg', 'color_name': ''}], processed=1,
+        )
+        cls.url = reverse('media_job_status', args=[cls.job.pk])
+
+    def test_owner_sees_progress(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'status': 'queued', 'processed': 1, 'total': 1, 'errors': []})
+
+    def test_staff_sees_any_job(self):
+        self.client.force_login(make_user('staff@example.com', is_staff=True))
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_other_users_are_refused(self):
+        self.client.force_login(make_user('other@example.com'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_anonymous_is_sent_to_login(self):
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+
+class ProductFacetSyncTests(TestCase):
+    """product_add / product_edit keep the colour and size facet rows in step with the product."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = make_user('staff@example.com', is_staff=True)
+        cls.category = Category.objects.create(title='Clothing', is_parent=True)
+
+    def setUp(self):
+        staging = tempfile.TemporaryDirectory()
+        self.addCleanup(staging.cleanup)
+        settings = override_settings(MEDIA_STAGING_ROOT=staging.name, MEDIA_JOBS_THREAD=False)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client.force_login(self.staff)
+
+    def post(self, url, sizes, colors):
+        data = {
+            'title': 'Linen shirt', 'description': 'A shirt', 'cat_id': self.category.pk, 'price': '40',
+            'stock': '5', 'condition': 'new', 'status': 'active',
+            'size': sizes, 'color_name': [name for name, _ in colors], 'color_code': [code for _, code in colors],
+            'media_files': SimpleUploadedFile('shirt.jpg', b'not checked until the media job runs'),
+        }
+        # The views print their progress
+        with redirect_stdout(StringIO()):
+            return self.client.post(url, data)
+
+    def facets(self, product):
+        return (
+            dict(ProductColor.objects.filter(product=product).values_list('value', 'code')),
+            set(ProductSize.objects.filter(product=product).values_list('value', flat=True)),
+        )
+
+    def test_add_and_edit_write_facet_rows(self):
+        response = self.post(reverse('product_add'), ['S', 'M'], [('Red', '#f00'), ('Dark Blue', '#008')])
+        self.assertEqual(response.status_code, 302)
+        product = Product.objects.get()
+        self.assertEqual(self.facets(product), ({'red': '#f00', 'dark blue': '#008'}, {'s', 'm'}))
+
+        response = self.post(reverse('product_edit', args=[product.pk]), ['XL'], [('Green', '#0f0')])
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.facets(product), ({'green': '#0f0'}, {'xl'}))
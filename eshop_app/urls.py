@@ -29,6 +29,7 @@ urlpatterns = [
     path("products/add/", views.product_add, name="product_add"),
     path("products/edit/<int:pk>/", views.product_edit, name="product_edit"),
     path("products/delete/<int:pk>/", views.product_delete, name="product_delete"),
+    path("products/media-jobs/<int:pk>/", views.media_job_status, name="media_job_status"),
     path("ajax/get-child-categories/", views.get_child_categories, name="get_child_categories"),
     path("coupons/list/", views.coupon_list, name="coupon_list"),
     path("coupons/add/", views.coupon_add, name="coupon_add"),
@@ -26,6 +26,11 @@ from .models import GeneralFAQ
 from django.views.decorators.csrf import csrf_exempt
 import json
 from collections import defaultdict
+from orders.search import search_products
+from orders.facets import sync_product_facets
+from orders.categories import get_category_tree
+from orders.media_jobs import enqueue_media
+from orders.models import MediaUploadJob
 
 
 
@@ -605,6 +610,7 @@ def product_add(request):
                 is_free_shipping=is_free_shipping,
                 user=request.user,
             )
+            sync_product_facets(product)
 
             # Media files
             all_media = []
@@ -612,11 +618,11 @@ def product_add(request):
                 key = f"media_files_{color_name}"
                 files = request.FILES.getlist(key)
                 for file in files:
-                    all_media.append({"file": file, "color_name": color_name})
+                    all_media.append((file, color_name))
 
             default_media = request.FILES.getlist("media_files")
             for file in default_media:
-                all_media.append({"file": file, "color_name": ""})
+                all_media.append((file, ""))
 
             if not all_media:
                 return render(request, "product_add.html", {
@@ -624,28 +630,11 @@ def product_add(request):
                     "error_message": "Please upload at least one image or video."
                 })
 
-            uploaded_images = []
-            for i, media in enumerate(all_media):
-                file = media["file"]
-                color_name = media["color_name"]
-                file_type = "video" if file.content_type.startswith("video") else "image"
-
-                ProductMedia.objects.create(
-                    product=product,
-                    file=file,
-                    color_name=color_name,
-                    file_type=file_type,
-                    is_primary=(i == 0)
-                )
-
-                if file_type == "image":
-                    uploaded_images.append(file)
+            # Validation, storage and thumbnails happen in the background (orders/media_jobs.py);
+            # the first image becomes product.photo once it's processed
+            job = enqueue_media(product, all_media, set_primary=True)
 
-            if uploaded_images:
-                product.photo = uploaded_images[0]
-                product.save()
-
-            return redirect(f"{reverse('product_list')}?success=1")
+            return redirect(f"{reverse('product_list')}?success=1&media_job={job.id}")
 
         except Exception as e:
             print("Error adding product:", e)
@@ -654,8 +643,11 @@ def product_add(request):
     
 
 def get_child_categories(request, parent_id):
-    children = Category.objects.filter(parent_id=parent_id, is_parent=False, status="active").values("id", "title")
-    return JsonResponse(list(children), safe=False)
+    children = get_category_tree().active_children(parent_id)
+    return JsonResponse(
+        [{"id": child.id, "title": child.title} for child in children if not child.is_parent],
+        safe=False,
+    )
 
 def product_edit(request, pk):
     product = get_object_or_404(Product, pk=pk)
@@ -748,39 +740,28 @@ def product_edit(request, pk):
                 product.shipping_charge = Decimal(0)
 
             # Handle multiple media files per color
+            uploads = []
             if color_names:
                 for color_name in color_names:
                     safe_color = color_name.replace(' ', '_')
                     key = f"media_files_{safe_color}"
-                    files = request.FILES.getlist(key)
-                    for file in files:
-                        if file.content_type.startswith(('image/', 'video/')):
-                            file_type = "video" if file.content_type.startswith("video") else "image"
-                            ProductMedia.objects.create(
-                                product=product,
-                                file=file,
-                                color_name=color_name,
-                                file_type=file_type,
-                                is_primary=False  # Or set logic for primary
-                            )
+                    for file in request.FILES.getlist(key):
+                        uploads.append((file, color_name))
 
             # Handle default media (without color)
-            default_files = request.FILES.getlist("media_files")
-            for file in default_files:
-                if file.content_type.startswith(('image/', 'video/')):
-                    file_type = "video" if file.content_type.startswith("video") else "image"
-                    ProductMedia.objects.create(
-                        product=product,
-                        file=file,
-                        color_name="",  # No color
-                        file_type=file_type,
-                        is_primary=False
-                    )
+            for file in request.FILES.getlist("media_files"):
+                uploads.append((file, ""))
 
             # Save the product
             product.save()
+            sync_product_facets(product)
+
+            # New media is checked and stored in the background (orders/media_jobs.py)
+            job = enqueue_media(product, uploads, set_primary=not product.photo)
             print("✅ Product updated successfully!")
             
+            if job:
+                return redirect(f"{reverse('product_list')}?success=2&media_job={job.id}")
             return redirect(f"{reverse('product_list')}?success=2")
             
         except Exception as e:
@@ -824,6 +805,20 @@ def get_color_hex(color_name):
     return color_map.get(color_name, '#cccccc')
 
 
+@login_required
+def media_job_status(request, pk):
+    job = get_object_or_404(MediaUploadJob.objects.select_related('product__user'), pk=pk)
+    user = request.user
+    if not (user.is_superuser or user.is_staff or job.product.user == user):
+        return JsonResponse({'status': 'error', 'message': 'Permission denied'}, status=403)
+    return JsonResponse({
+        'status': job.status,
+        'processed': job.processed,
+        'total': len(job.files),
+        'errors': job.errors,
+    })
+
+
 def remove_media(request, media_id):
     if request.method == "POST":
         try:
@@ -850,7 +845,7 @@ def toggle_product_status(request, pk):
 
             product = Product.objects.get(pk=pk)
             product.status = new_status
-            product.save(update_fields=["status"])
+            product.save(update_fields=["status", "updated_at"])
 
             return JsonResponse({"success": True, "status": product.status})
         except Product.DoesNotExist:
@@ -905,11 +900,7 @@ def product_list(request):
     # 3. Search filter (Applied AFTER role filtering)
     search_query = request.GET.get("q", "").strip()
     if search_query:
-        products_list = products_list.filter(
-            Q(title__icontains=search_query) |
-            Q(summary__icontains=search_query) |
-            Q(description__icontains=search_query)
-        )
+        products_list = search_products(products_list, search_query)
 
     # 4. Per page filter (Pagination setup)
     per_page = request.GET.get("per_page", "10")
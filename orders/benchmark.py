@@ -0,0 +1,154 @@
+# orders/benchmark.py
+"""
+Storefront benchmark driven through the Django test client.
+
+Each scenario is a GET against a storefront or admin list URL, as an
+anonymous visitor, a customer with a cart, or a staff user. Every run
+records latency (p50/p95/mean), the number of SQL queries and the bytes
+rendered, so runs on the same dataset (see seed_catalog) can be compared.
+"""
+import math
+import statistics
+import time
+from collections import namedtuple
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from eshop_app.models import Blog, Brand, CustomUser, Product
+from .categories import get_category_tree
+from .models import Cart, ProductColor, ProductSize
+
+# role: None (anonymous), 'customer' or 'staff'
+Scenario = namedtuple('Scenario', ['name', 'url', 'role'])
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def storefront_scenarios():
+    """Scenarios for the URLs the current dataset can serve."""
+    scenarios = [
+        Scenario('home', '/', None),
+        Scenario('home_new_arrivals', '/?filter=new-arrivals', None),
+        Scenario('shop', reverse('shop_all'), None),
+        Scenario('shop_newest', reverse('shop_all') + '?sort=newest', None),
+        Scenario('shop_search', reverse('shop_all') + '?q=cotton+shirt', None),
+        Scenario('shop_price', reverse('shop_by_price', args=[50, 100]), None),
+        Scenario('blog', reverse('landing_blog'), None),
+        Scenario('about', reverse('landing_about_us'), None),
+        Scenario('faqs', reverse('faqs'), None),
+    ]
+
+    product = Product.objects.filter(status='active').order_by('id').first()
+    if product:
+        scenarios += [
+            Scenario('product_detail', reverse('product_detail', args=[product.pk]), None),
+            Scenario('buy_now', reverse('buy_now', args=[product.pk]), 'customer'),
+        ]
+    parents = get_category_tree().parents()
+    if parents:
+        category = min(parents, key=lambda category: category.id)
+        scenarios += [
+            Scenario('shop_category', reverse('shop_by_category', args=[category.id]), None),
+            Scenario('category_products', reverse('category_products', args=[category.id]), None),
+        ]
+    brand = Brand.objects.filter(status='active').order_by('id').first()
+    if brand:
+        scenarios.append(Scenario('shop_brand', reverse('shop_by_brand', args=[brand.id]), None))
+    color = ProductColor.objects.values_list('value', flat=True).first()
+    if color:
+        scenarios.append(Scenario('shop_color', reverse('shop_by_color', args=[color]), None))
+    size = ProductSize.objects.values_list('value', flat=True).first()
+    if size:
+        scenarios.append(Scenario('shop_size', reverse('shop_by_size', args=[size]), None))
+    blog = Blog.objects.filter(status=1).order_by('-publish_date').first()
+    if blog:
+        scenarios.append(Scenario('blog_detail', reverse('landing_blog_detail', args=[blog.slug]), None))
+
+    scenarios += [
+        Scenario('shopping_cart', reverse('shopping_cart'), 'customer'),
+        Scenario('wishlist', reverse('wishlist'), 'customer'),
+        Scenario('checkout', reverse('checkout'), 'customer'),
+        Scenario('admin_products', reverse('product_list'), 'staff'),
+        Scenario('admin_categories', reverse('category_list'), 'staff'),
+        Scenario('admin_brands', reverse('brand_list'), 'staff'),
+        Scenario('admin_coupons', reverse('coupon_list'), 'staff'),
+        Scenario('admin_users', reverse('user_list'), 'staff'),
+        Scenario('admin_blogs', reverse('blog_list'), 'staff'),
+        Scenario('admin_banners', reverse('banner_list'), 'staff'),
+    ]
+    return scenarios
+
+
+def benchmark_users():
+    """{role: user} for the logged-in scenarios; a role is missing if no user fits."""
+    users = {}
+    cart_user_id = Cart.objects.order_by('user_id').values_list('user_id', flat=True).first()
+    customer = CustomUser.objects.filter(pk=cart_user_id).first() if cart_user_id else None
+    if customer:
+        users['customer'] = customer
+    staff = CustomUser.objects.filter(is_staff=True).order_by('id').first()
+    if staff:
+        users['staff'] = staff
+    return users
+
+
+def _render(client, url):
+    response = client.get(url)
+    if response.streaming:
+        size = sum(len(chunk) for chunk in response.streaming_content)
+    else:
+        size = len(response.content)
+    return response.status_code, size
+
+
+def run_scenario(client, scenario, iterations=20, warmup=2):
+    timings, queries = [], []
+    status, size = None, 0
+    for run in range(warmup + iterations):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            status, size = _render(client, scenario.url)
+            elapsed = (time.perf_counter() - start) * 1000
+        if run >= warmup:
+            timings.append(elapsed)
+            queries.append(len(captured))
+
+    return {
+        'url': scenario.url,
+        'role': scenario.role or 'anonymous',
+        'status': status,
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+        'mean_ms': round(statistics.fmean(timings), 2),
+        'queries': max(queries),
+        'bytes': size,
+    }
+
+
+def run_benchmark(iterations=20, warmup=2, only=None, progress=None):
+    """Run every scenario (or those named in `only`); returns {name: result}."""
+    users = benchmark_users()
+    clients = {None: Client()}
+    for role, user in users.items():
+        clients[role] = Client()
+        clients[role].force_login(user)
+
+    results = {}
+    for scenario in storefront_scenarios():
+        if only and scenario.name not in only:
+            continue
+        if scenario.role not in clients:
+            if progress:
+                progress(scenario.name, None)
+            continue
+        results[scenario.name] = run_scenario(clients[scenario.role], scenario, iterations, warmup)
+        if progress:
+            progress(scenario.name, results[scenario.name])
+    return results
@@ -0,0 +1,228 @@
+# orders/blobs.py
+"""
+Content-addressed storage for product media.
+
+The same picture is often uploaded for several colours or products. Uploads
+processed by orders/media_jobs.py are hashed (SHA-256, read in chunks) and
+stored once per digest as product_media/<digest><ext>; a MediaBlob row maps
+the digest to the stored name and counts the ProductMedia.file and
+Product.photo values that point at it, plus the Cart.selected_image and
+OrderLine.selected_image URLs (media_name() maps those back to the name), so a
+picture still shown in a cart or an order is never deleted.
+
+store_blob() hands back a name with one reference already taken for the
+caller. Product.photo and selected_image changes are counted by the signals in
+orders/signals.py (checkout's bulk_create of order lines and the cart API's
+upsert count theirs explicitly), and deleting a ProductMedia row or a product releases its references
+(remove_media, product_delete). The file and its derivatives are deleted
+once the last reference goes away: the row stays at ref_count 0 until the
+transaction commits, and the deletion then re-checks the count under the
+row's lock, so a store_blob() of the same content either takes a reference
+first (and the file stays) or waits and stores the file afresh.
+
+Files that predate this have no MediaBlob row and are never deleted here;
+the dedupe_media command folds them in.
+"""
+import hashlib
+from collections import Counter, defaultdict
+from urllib.parse import unquote, urlsplit
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from eshop_app.models import Product, ProductMedia
+from .gallery import invalidate_gallery
+from .homepage import invalidate_homepage
+from .images import delete_derivatives
+from .models import Cart, MediaBlob, OrderLine
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(fh):
+    """(sha256 hex digest, size) of an open file, read in chunks."""
+    digest = hashlib.sha256()
+    size = 0
+    fh.seek(0)
+    for chunk in iter(lambda: fh.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+        size += len(chunk)
+    fh.seek(0)
+    return digest.hexdigest(), size
+
+
+def store_blob(fh, directory, extension):
+    """
+    Store an open file once per content digest and take a reference to it.
+    Returns (storage name, created); created is False when an identical file was already stored.
+    """
+    digest, size = hash_file(fh)
+    with transaction.atomic():
+        blob, created = MediaBlob.objects.select_for_update().get_or_create(
+            digest=digest,
+            defaults={'name': f'{directory}/{digest}{extension}', 'size': size, 'ref_count': 1},
+        )
+        if not created:
+            MediaBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+        # A file already under the digest name has this content, whoever wrote it
+        if not default_storage.exists(blob.name):
+            saved = default_storage.save(blob.name, fh)
+            if saved != blob.name:
+                MediaBlob.objects.filter(pk=blob.pk).update(name=saved)
+                blob.name = saved
+    return blob.name, created
+
+
+def acquire(name, count=1):
+    """Count `count` more references to a stored name (no-op for files that aren't blobs)."""
+    if name and count:
+        MediaBlob.objects.filter(name=name).update(ref_count=F('ref_count') + count)
+
+
+def media_name(url):
+    """The storage name behind a media URL such as a selected_image value ('' if it isn't one)."""
+    if not url:
+        return ''
+    path = unquote(urlsplit(url).path)
+    base = urlsplit(default_storage.base_url).path or '/'
+    return path[len(base):] if path.startswith(base) else ''
+
+
+def acquire_urls(urls):
+    """Count a reference for each media URL in `urls` (one UPDATE per distinct file)."""
+    for name, count in Counter(filter(None, map(media_name, urls))).items():
+        acquire(name, count)
+
+
+def release(name):
+    """Drop one reference; the file goes once the last one is released and the transaction commits."""
+    if not name:
+        return
+    with transaction.atomic():
+        updated = MediaBlob.objects.filter(name=name, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+        if not updated:
+            return
+        unused = MediaBlob.objects.filter(name=name, ref_count=0).exists()
+    if unused:
+        transaction.on_commit(lambda: _delete_file(name))
+
+
+def _delete_file(name):
+    with transaction.atomic():
+        # store_blob() locks the same row, so it can't take a reference to a file being deleted
+        blob = MediaBlob.objects.select_for_update().filter(name=name, ref_count=0).first()
+        if blob is None:
+            # Referenced again between the release and the commit
+            return
+        delete_derivatives(name)
+        default_storage.delete(name)
+        blob.delete()
+
+
+def _stored_files(directory):
+    try:
+        dirs, files = default_storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in files:
+        yield f'{directory}/{name}'
+    for sub in dirs:
+        yield from _stored_files(f'{directory}/{sub}')
+
+
+def dedupe_stored_media(directories=('product_media', 'products'), dry_run=False, delete_orphans=False):
+    """
+    Fold existing product media into blobs: hash every file under `directories`,
+    point all ProductMedia.file / Product.photo values and selected_image URLs
+    at one copy per digest, record the reference counts and delete the
+    redundant copies.
+    Unreferenced files are only deleted with delete_orphans. Returns a dict of counts.
+    """
+    prefixes = tuple(f'{directory}/' for directory in directories)
+    refs = Counter()
+    for name in ProductMedia.objects.exclude(file='').values_list('file', flat=True).iterator():
+        refs[name] += 1
+    for name in Product.objects.exclude(photo='').values_list('photo', flat=True).iterator():
+        refs[name] += 1
+    # Carts and order snapshots refer to the files by URL
+    image_urls = defaultdict(set)
+    for model in (Cart, OrderLine):
+        urls = model.objects.exclude(selected_image__isnull=True).exclude(selected_image='')
+        for url in urls.values_list('selected_image', flat=True).iterator():
+            name = media_name(url)
+            if name:
+                refs[name] += 1
+                image_urls[name].add(url)
+
+    names = {name for name in refs if name.startswith(prefixes)}
+    for directory in directories:
+        names.update(_stored_files(directory))
+
+    stats = Counter()
+    groups = defaultdict(list)
+    for name in sorted(names):
+        if not default_storage.exists(name):
+            stats['missing'] += 1
+            continue
+        with default_storage.open(name, 'rb') as fh:
+            digest, size = hash_file(fh)
+        groups[digest].append((name, size))
+    known = dict(MediaBlob.objects.filter(digest__in=list(groups)).values_list('digest', 'name'))
+
+    touched_products = set()
+    for digest, files in groups.items():
+        group_names = [name for name, _ in files]
+        total_refs = sum(refs[name] for name in group_names)
+        if not total_refs:
+            stats['orphans'] += len(group_names)
+            if delete_orphans and not dry_run:
+                for name in group_names:
+                    delete_derivatives(name)
+                    default_storage.delete(name)
+            continue
+
+        # Keep the copy a blob already uses, else the most referenced one
+        keep = known.get(digest)
+        if keep not in group_names:
+            keep = max(group_names, key=lambda name: refs[name])
+        duplicates = [name for name in group_names if name != keep]
+        stats['blobs'] += 1
+        stats['duplicates'] += len(duplicates)
+        stats['bytes_freed'] += sum(size for name, size in files if name != keep)
+        if duplicates:
+            touched_products.update(
+                ProductMedia.objects.filter(file__in=duplicates).values_list('product_id', flat=True)
+            )
+            touched_products.update(Product.objects.filter(photo__in=duplicates).values_list('pk', flat=True))
+        if dry_run:
+            continue
+
+        with transaction.atomic():
+            if duplicates:
+                # update() skips the signals, which would count these references again
+                ProductMedia.objects.filter(file__in=duplicates).update(file=keep)
+                Product.objects.filter(photo__in=duplicates).update(photo=keep)
+                stale_urls = [url for name in duplicates for url in image_urls[name]]
+                if stale_urls:
+                    keep_url = default_storage.url(keep)
+                    Cart.objects.filter(selected_image__in=stale_urls).update(selected_image=keep_url)
+                    OrderLine.objects.filter(selected_image__in=stale_urls).update(selected_image=keep_url)
+            MediaBlob.objects.update_or_create(
+                digest=digest,
+                defaults={'name': keep, 'size': dict(files)[keep], 'ref_count': total_refs},
+            )
+        for name in duplicates:
+            delete_derivatives(name)
+            default_storage.delete(name)
+
+    if not dry_run:
+        # Their pages show the new file names (orders/conditional.py)
+        Product.objects.filter(pk__in=touched_products).update(updated_at=timezone.now())
+        for product_id in touched_products:
+            invalidate_gallery(product_id)
+        if touched_products:
+            invalidate_homepage('product')
+    stats['products'] = len(touched_products)
+    return dict(stats)
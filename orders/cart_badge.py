@@ -0,0 +1,48 @@
+# orders/cart_badge.py
+"""
+Per-user cart quantity counter for the header badge.
+
+The total quantity of a user's cart is kept as an integer in the cache
+backend, loaded with one SUM on a miss and then adjusted in place by the Cart
+signals in orders/signals.py, so rendering the badge does not query Cart.
+"""
+from django.core.cache import cache
+from django.db.models import Sum
+
+from .models import Cart
+
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def cart_quantity_cache_key(user_id):
+    return f'cart_quantity:{user_id}'
+
+
+def get_cart_quantity(user):
+    """Total quantity across the user's cart rows (0 for anonymous users)."""
+    if not user.is_authenticated:
+        return 0
+
+    key = cart_quantity_cache_key(user.pk)
+    quantity = cache.get(key)
+    if quantity is None:
+        quantity = Cart.objects.filter(user=user).aggregate(total=Sum('quantity'))['total'] or 0
+        cache.set(key, quantity, CACHE_TIMEOUT)
+    return quantity
+
+
+def adjust_cart_quantity(user_id, delta):
+    # Only adjust a counter that is already cached; a missing one is recomputed on next read
+    if not delta:
+        return
+    key = cart_quantity_cache_key(user_id)
+    try:
+        if cache.incr(key, delta) < 0:
+            cache.delete(key)
+    except ValueError:
+        pass
+
+
+def reset_cart_quantity(user_id):
+    """Drop the counter after bulk changes that bypass the Cart signals."""
+    cache.delete(cart_quantity_cache_key(user_id))
@@ -0,0 +1,174 @@
+# orders/cart_batch.py
+"""
+Batched cart mutations for the JSON cart endpoint.
+
+A batch is a list of operations:
+
+    {"op": "add", "product_id": 3, "size": "m", "color": "Red", "quantity": 2}
+    {"op": "update", "item_id": 41, "quantity": 5}     # 0 removes the row
+    {"op": "remove", "item_id": 41}
+
+Everything runs in a single transaction. The products being added are
+locked and checked for availability and stock there, along with the cart
+rows the batch touches, so the checks hold for the rows that get written.
+All adds go out as one INSERT ... ON CONFLICT upsert against the
+(user, product, size, color) unique constraint: an existing variant gets its
+locked quantity plus the added one, and keeps its selected_image unless the
+add brings a new one. All updates go out as one UPDATE ... CASE and all
+removes as one DELETE. Upserts and updates bypass the Cart signals, so the
+cached pricing and badge counter are reset explicitly, and the
+selected_image references the upsert adds or replaces are counted here
+(orders/blobs.py).
+"""
+from django.db import transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.utils import timezone
+
+from eshop_app.models import Product
+from .blobs import acquire, media_name, release
+from .cart_badge import reset_cart_quantity
+from .models import Cart
+from .pricing import invalidate_cart_pricing
+
+MAX_OPERATIONS = 50
+MAX_QUANTITY = 99
+
+
+class CartBatchError(Exception):
+    """The batch is malformed; nothing was applied."""
+
+
+def _quantity(op, minimum):
+    try:
+        quantity = int(op.get('quantity', 1))
+    except (TypeError, ValueError):
+        raise CartBatchError("Quantity must be a number.")
+    if quantity < minimum or quantity > MAX_QUANTITY:
+        raise CartBatchError(f"Quantity must be between {minimum} and {MAX_QUANTITY}.")
+    return quantity
+
+
+def _item_id(op):
+    try:
+        return int(op['item_id'])
+    except (KeyError, TypeError, ValueError):
+        raise CartBatchError("item_id is required.")
+
+
+def _parse(operations):
+    if not isinstance(operations, list) or not operations:
+        raise CartBatchError("No operations given.")
+    if len(operations) > MAX_OPERATIONS:
+        raise CartBatchError(f"At most {MAX_OPERATIONS} operations per request.")
+
+    adds, updates, removes = {}, {}, set()
+    for op in operations:
+        if not isinstance(op, dict):
+            raise CartBatchError("Each operation must be an object.")
+        kind = op.get('op')
+        if kind == 'add':
+            size = str(op.get('size') or '').strip()
+            color = str(op.get('color') or '').strip()
+            if not size or not color:
+                raise CartBatchError("Please select a size and color.")
+            try:
+                product_id = int(op['product_id'])
+            except (KeyError, TypeError, ValueError):
+                raise CartBatchError("product_id is required.")
+            # Adds of the same variant add up; the last image given wins
+            variant = (product_id, size[:10], color[:50])
+            quantity, selected_image = adds.get(variant, (0, ''))
+            adds[variant] = (
+                quantity + _quantity(op, 1), str(op.get('selected_image') or '')[:200] or selected_image
+            )
+        elif kind == 'update':
+            quantity = _quantity(op, 0)
+            if quantity == 0:
+                removes.add(_item_id(op))
+            else:
+                updates[_item_id(op)] = quantity
+        elif kind == 'remove':
+            removes.add(_item_id(op))
+        else:
+            raise CartBatchError(f"Unknown operation: {kind!r}.")
+
+    for item_id in removes:
+        updates.pop(item_id, None)
+    return adds, updates, removes
+
+
+def _check_stock(product, quantity):
+    if quantity > MAX_QUANTITY:
+        raise CartBatchError(f"At most {MAX_QUANTITY} of {product.title} per order.")
+    if quantity > product.stock:
+        raise CartBatchError(f"Only {product.stock} left in stock for {product.title}.")
+
+
+def _upsert(user, adds, now):
+    product_ids = {product_id for product_id, _, _ in adds}
+    products = Product.objects.select_for_update().filter(id__in=product_ids, status='active').in_bulk()
+    if product_ids - products.keys():
+        raise CartBatchError("A product is no longer available.")
+
+    stored = {
+        (item.product_id, item.size, item.color): item
+        for item in Cart.objects.select_for_update().filter(user=user, product_id__in=product_ids)
+    }
+    rows, images = [], []
+    for variant, (quantity, selected_image) in adds.items():
+        product_id, size, color = variant
+        item = stored.get(variant)
+        previous_image = item.selected_image if item else None
+        quantity += item.quantity if item else 0
+        _check_stock(products[product_id], quantity)
+        rows.append(Cart(
+            user=user, product_id=product_id, size=size, color=color,
+            quantity=quantity, selected_image=selected_image or previous_image,
+            added_at=now, updated_at=now,
+        ))
+        images.append((media_name(selected_image), media_name(previous_image)))
+
+    Cart.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['user', 'product', 'size', 'color'],
+        update_fields=['quantity', 'selected_image', 'updated_at'],
+    )
+    for name, previous in images:
+        if name and name != previous:
+            acquire(name)
+            release(previous)
+
+
+def _update(user, updates, now):
+    items = Cart.objects.select_for_update().filter(user=user, id__in=updates).select_related('product')
+    for item in items:
+        _check_stock(item.product, updates[item.id])
+    Cart.objects.filter(user=user, id__in=updates).update(
+        quantity=Case(
+            *[When(id=item_id, then=Value(quantity)) for item_id, quantity in updates.items()],
+            output_field=IntegerField(),
+        ),
+        updated_at=now,
+    )
+
+
+def apply_cart_operations(user, operations):
+    """Validate and apply a batch of cart operations for `user` atomically."""
+    adds, updates, removes = _parse(operations)
+
+    now = timezone.now()
+    with transaction.atomic():
+        if adds:
+            _upsert(user, adds, now)
+        if updates:
+            _update(user, updates, now)
+        if removes:
+            Cart.objects.filter(user=user, id__in=removes).delete()
+
+        transaction.on_commit(lambda: _reset_caches(user.pk))
+
+
+def _reset_caches(user_id):
+    invalidate_cart_pricing(user_id)
+    reset_cart_quantity(user_id)
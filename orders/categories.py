@@ -0,0 +1,142 @@
+# orders/categories.py
+"""
+In-process category tree.
+
+Category is an adjacency list (parent FK), so walking it with the ORM costs a
+query per level. The whole table is small, so it is loaded in one query and
+kept in process memory with ancestors, descendants and active children
+precomputed per node.
+
+A version token in the shared cache (CACHES in eshop/settings.py: Redis or
+the database, never per-process) ties the per-process copies together: the
+Category signals in orders/signals.py replace it, and every process rebuilds
+its tree the next time it sees a newer version. The token is looked up at most
+once every VERSION_CHECK_INTERVAL seconds per process, so other workers and
+management commands' changes show up within that window.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+
+from eshop_app.models import Category
+
+VERSION_KEY = 'category_tree_version'
+VERSION_CHECK_INTERVAL = 2
+
+_lock = threading.Lock()
+_tree = None
+_version = None
+_checked_at = 0.0
+
+
+class CategoryTree:
+    def __init__(self, categories, version=None):
+        self.version = version
+        self.nodes = {category.id: category for category in categories}
+
+        children = {category_id: [] for category_id in self.nodes}
+        for category in self.nodes.values():
+            if category.parent_id in children:
+                children[category.parent_id].append(category)
+
+        self._children = children
+        self._active_children = {
+            category_id: tuple(child for child in kids if child.status == 'active')
+            for category_id, kids in children.items()
+        }
+        self._ancestors = {category_id: self._walk_up(category_id) for category_id in self.nodes}
+        self._descendants = {category_id: self._walk_down(category_id) for category_id in self.nodes}
+        self._parents = tuple(
+            category for category in self.nodes.values()
+            if category.is_parent and category.status == 'active'
+        )
+
+    def _walk_up(self, category_id):
+        chain, seen = [], {category_id}
+        parent_id = self.nodes[category_id].parent_id
+        while parent_id in self.nodes and parent_id not in seen:
+            seen.add(parent_id)
+            chain.append(self.nodes[parent_id])
+            parent_id = self.nodes[parent_id].parent_id
+        # Root first
+        return tuple(reversed(chain))
+
+    def _walk_down(self, category_id):
+        found, queue, seen = [], list(self._children[category_id]), {category_id}
+        while queue:
+            category = queue.pop(0)
+            if category.id in seen:
+                continue
+            seen.add(category.id)
+            found.append(category)
+            queue.extend(self._children[category.id])
+        return tuple(found)
+
+    def get(self, category_id, active=False):
+        """The category with this id (None if missing, or inactive when active=True)."""
+        try:
+            category = self.nodes.get(int(category_id))
+        except (TypeError, ValueError):
+            return None
+        if category is None or (active and category.status != 'active'):
+            return None
+        return category
+
+    def parents(self):
+        """Active top-level (is_parent) categories."""
+        return self._parents
+
+    def active_children(self, category_id):
+        return self._active_children.get(category_id, ())
+
+    def ancestors(self, category_id):
+        """Ancestors of a category, root first."""
+        return self._ancestors.get(category_id, ())
+
+    def descendants(self, category_id):
+        """All categories below this one, at any depth."""
+        return self._descendants.get(category_id, ())
+
+    def root(self, category_id):
+        """The top-level ancestor of a category (the category itself at the top)."""
+        ancestors = self.ancestors(category_id)
+        return ancestors[0] if ancestors else self.nodes.get(category_id)
+
+
+def _current_version():
+    global _version, _checked_at
+    now = time.monotonic()
+    if _version is not None and now - _checked_at < VERSION_CHECK_INTERVAL:
+        return _version
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # A fresh token rather than a counter, so an evicted key can never
+        # come back with a version some process already holds
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY)
+    _version, _checked_at = version, now
+    return version
+
+
+def get_category_tree():
+    """Return this process's CategoryTree, rebuilding it if a newer version was published."""
+    global _tree
+    version = _current_version()
+    tree = _tree
+    if tree is None or tree.version != version:
+        with _lock:
+            if _tree is None or _tree.version != version:
+                _tree = CategoryTree(Category.objects.order_by('id'), version)
+            tree = _tree
+    return tree
+
+
+def invalidate_category_tree():
+    """Publish a new tree version; every process rebuilds on its next lookup."""
+    global _tree, _version, _checked_at
+    _version = time.time_ns()
+    cache.set(VERSION_KEY, _version, None)
+    # This process knows the current version without looking it up again
+    _checked_at = time.monotonic()
+    _tree = None
@@ -0,0 +1,175 @@
+# orders/checkout.py
+"""
+Transactional order placement shared by the cart checkout and Buy Now.
+
+Everything happens in one transaction:
+
+1. the Product rows being bought are locked with SELECT ... FOR UPDATE in
+   ascending id order, so two checkouts touching the same products always
+   queue in the same order instead of deadlocking;
+2. lines are priced from the locked rows with orders.pricing, and that
+   breakdown is stored on the Order/OrderLine rows as the price snapshot;
+3. stock is decremented with conditional F() updates, which also refuse to
+   oversell on databases without row locks;
+4. a coupon is redeemed against its usage limits (orders.coupons);
+5. the purchased cart rows are removed with a single bulk delete.
+
+Any failure raises CheckoutError and rolls the whole order back.
+"""
+import random
+import string
+from collections import namedtuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from eshop_app.models import Coupon, Product
+from .blobs import acquire_urls
+from .coupons import CouponLimitReached, redeem_coupon
+from .models import Cart, Order, OrderLine
+from .pricing import ZERO, build_pricing, price_line
+
+# A line to buy: a Cart row, or the Buy Now selection in the same shape
+CheckoutItem = namedtuple(
+    'CheckoutItem', ['product_id', 'quantity', 'size', 'color', 'selected_image', 'id'],
+    defaults=('', '', '', None),
+)
+
+ORDER_NUMBER_ATTEMPTS = 5
+
+
+class CheckoutError(Exception):
+    """The order could not be placed; the message is safe to show to the customer."""
+
+
+def _order_number():
+    return 'ORD-' + ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+
+
+def _lock_products(product_ids):
+    # Deterministic lock order: always ascending primary key
+    locked = Product.objects.select_for_update().filter(id__in=sorted(product_ids)).order_by('id')
+    return {product.id: product for product in locked}
+
+
+def _coupon_amount(code, pricing):
+    if not code:
+        return None, ZERO
+
+    now = timezone.now()
+    coupon = Coupon.objects.filter(
+        Q(end_date__isnull=True) | Q(end_date__gte=now),
+        code=code,
+        is_active=True,
+        start_date__lte=now,
+    ).first()
+    if coupon is None:
+        raise CheckoutError(f"Coupon {code} is no longer valid.")
+    if pricing.subtotal < coupon.min_order_amount:
+        raise CheckoutError(f"Coupon requires minimum order of ₹{coupon.min_order_amount}")
+    return coupon, pricing.coupon_amount(coupon.discount_type, coupon.discount_value)
+
+
+def _place_order(user, items, details, coupon_code):
+    # Runs inside the caller's transaction
+    if not items:
+        raise CheckoutError("Your cart is empty.")
+
+    wanted = {}
+    for item in items:
+        wanted[item.product_id] = wanted.get(item.product_id, 0) + item.quantity
+
+    products = _lock_products(wanted)
+    for product_id, quantity in wanted.items():
+        product = products.get(product_id)
+        if product is None or product.status != 'active':
+            raise CheckoutError("A product in your order is no longer available.")
+        if product.stock < quantity:
+            raise CheckoutError(f"Only {product.stock} left in stock for {product.title}.")
+
+    lines = [price_line(products[item.product_id], item.quantity, item) for item in items]
+    pricing = build_pricing(lines)
+    coupon, coupon_discount = _coupon_amount(coupon_code, pricing)
+
+    # Conditional decrement: never takes stock below zero, even without the row lock
+    for product_id in sorted(wanted):
+        updated = Product.objects.filter(id=product_id, stock__gte=wanted[product_id]).update(
+            stock=F('stock') - wanted[product_id]
+        )
+        if not updated:
+            raise CheckoutError(f"{products[product_id].title} just sold out.")
+
+    order = None
+    for _ in range(ORDER_NUMBER_ATTEMPTS):
+        try:
+            # Savepoint, so an order number collision doesn't abort the checkout
+            with transaction.atomic():
+                order = Order.objects.create(
+                    order_number=_order_number(),
+                    user=user if user.is_authenticated else None,
+                    payment_method=details.get('payment_method') or 'cod',
+                    first_name=details.get('first_name', ''),
+                    last_name=details.get('last_name', ''),
+                    email=details.get('email', ''),
+                    phone=details.get('phone', ''),
+                    address=details.get('address', ''),
+                    subtotal=pricing.subtotal,
+                    product_discount_total=pricing.product_discount_total,
+                    coupon_code=coupon.code if coupon else '',
+                    coupon_discount=coupon_discount,
+                    shipping=pricing.shipping,
+                    total=pricing.total(coupon_discount),
+                )
+            break
+        except IntegrityError:
+            continue
+    if order is None:
+        raise CheckoutError("Could not place the order, please try again.")
+
+    OrderLine.objects.bulk_create([
+        OrderLine(
+            order=order,
+            product_id=line.product.id,
+            title=line.product.title,
+            size='' if line.size == 'N/A' else line.size,
+            color='' if line.color == 'N/A' else line.color,
+            selected_image=line.selected_image or '',
+            quantity=line.quantity,
+            unit_price=line.price,
+            discount_percent=line.discount_percent,
+            line_discount=line.line_discount,
+            line_total=line.line_total,
+            shipping_charge=line.shipping_charge,
+        )
+        for line in lines
+    ])
+    # bulk_create skips the signals that count the snapshots' image references
+    acquire_urls(line.selected_image for line in lines)
+
+    if coupon:
+        try:
+            redeem_coupon(coupon, user, order, coupon_discount)
+        except CouponLimitReached as e:
+            raise CheckoutError(str(e))
+    return order
+
+
+def checkout_cart(user, details, coupon_code=None):
+    """Place an order for the user's whole cart and empty it. Returns the Order."""
+    with transaction.atomic():
+        # Locking the cart rows first makes a double-submitted checkout wait,
+        # then find the cart already empty
+        items = list(Cart.objects.select_for_update().filter(user=user).order_by('id'))
+        order = _place_order(user, items, details, coupon_code)
+        Cart.objects.filter(id__in=[item.id for item in items]).delete()
+    return order
+
+
+def buy_now(user, product_id, quantity, details, size='', color='', coupon_code=None):
+    """Place an order for a single product without touching the cart. Returns the Order."""
+    if quantity < 1:
+        raise CheckoutError("Please choose a valid quantity.")
+    item = CheckoutItem(product_id=product_id, quantity=quantity, size=size or '', color=color or '')
+    with transaction.atomic():
+        return _place_order(user, [item], details, coupon_code)
@@ -0,0 +1,34 @@
+# orders/checks.py
+"""
+System checks for settings the orders app relies on.
+
+The version tokens in orders/categories.py, coupons.py and homepage.py are
+how one process tells the others to drop cached data (management commands
+such as seed_catalog included). A per-process cache backend keeps every
+token local, so those invalidations silently never reach the server.
+"""
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+PER_PROCESS_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend not in PER_PROCESS_BACKENDS:
+        return []
+    return [
+        Warning(
+            f"The default cache ({backend}) is not shared between processes.",
+            hint=(
+                "Cache invalidation from other workers and management commands won't be seen; "
+                "cached pages only refresh when their timeout runs out. Use Redis "
+                "(REDIS_URL) or the database cache."
+            ),
+            id='orders.W001',
+        )
+    ]
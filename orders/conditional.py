@@ -0,0 +1,86 @@
+# orders/conditional.py
+"""
+ETags for the product detail and blog detail pages.
+
+The views are wrapped in django.views.decorators.http.condition with the
+functions below, so a browser revalidating an unchanged page gets a 304
+before the view body or the template runs. Each ETag is a hash of:
+
+- the page's own stamps, read in one small query: Product.updated_at, its
+  categories' updated_at and the count / newest created_at of its
+  ProductMedia rows; or Blog.updated_at;
+- for product pages, the homepage version tokens of products and categories
+  (orders/homepage.py), which every Product / Category save or delete bumps,
+  because related products and update_fields saves aren't covered by the
+  stamps above;
+- the viewer: user id, the cached cart badge quantity and wishlist ids,
+  and the CSRF cookie, so a 304 never brings back a form with a stale token;
+- the static manifest hash, so a deploy with new assets re-renders.
+
+Requests with flash messages waiting are not made conditional, since the
+page is what displays them.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.db.models import Count, Max
+
+from eshop_app.models import Blog, Product
+from .cart_badge import get_cart_quantity
+from .homepage import get_versions
+from .wishlist import get_wishlist_ids
+
+
+def _etag(*parts):
+    return hashlib.md5('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def viewer_version(request):
+    """The parts of a page that depend on who is looking at it."""
+    csrf = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    user = request.user
+    if not user.is_authenticated:
+        return ('anonymous', csrf)
+    quantity, wishlist_ids = get_cart_quantity(user), get_wishlist_ids(user)
+    # Reused by the context processors when the page does get rendered
+    request._cart_quantity, request._wishlist_ids = quantity, wishlist_ids
+    wishlist = ','.join(str(product_id) for product_id in sorted(wishlist_ids))
+    return (user.pk, quantity, wishlist, csrf)
+
+
+def _cacheable(request):
+    return not len(messages.get_messages(request))
+
+
+def product_detail_etag(request, pk):
+    if not _cacheable(request):
+        return None
+    stamps = (
+        Product.objects.filter(pk=pk)
+        .annotate(media_count=Count('media_files'), media_changed=Max('media_files__created_at'))
+        .values_list(
+            'updated_at', 'category__updated_at', 'child_category__updated_at', 'media_count', 'media_changed',
+        )
+        .first()
+    )
+    if stamps is None:
+        # Let the view answer the 404
+        return None
+    versions = get_versions()
+    return _etag(
+        'product', pk, *stamps, versions['product'], versions['category'],
+        *viewer_version(request), getattr(staticfiles_storage, 'manifest_hash', ''),
+    )
+
+
+def blog_detail_etag(request, slug):
+    if not _cacheable(request):
+        return None
+    updated_at = Blog.objects.filter(slug=slug, status=1).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        return None
+    return _etag(
+        'blog', slug, updated_at, *viewer_version(request), getattr(staticfiles_storage, 'manifest_hash', ''),
+    )
@@ -1,11 +1,19 @@
-from .models import Cart
-from django.db.models import Sum
+from django.utils.functional import SimpleLazyObject
+from .wishlist import get_wishlist_ids
+from .cart_badge import get_cart_quantity
+
+
+def _loaded(request, attr, load):
+    # Already read for this request (orders/conditional.py), else from the cache
+    value = getattr(request, attr, None)
+    return load(request.user) if value is None else value
+
 
 def cart_total_quantity(request):
-    if request.user.is_authenticated:
-        total_quantity = Cart.objects.filter(user=request.user).aggregate(
-            total=Sum('quantity')
-        )['total'] or 0
-    else:
-        total_quantity = 0
-    return {'cart_total_quantity': total_quantity}
+    # Lazy: the cached counter is only read when a template shows the badge
+    return {'cart_total_quantity': SimpleLazyObject(lambda: _loaded(request, '_cart_quantity', get_cart_quantity))}
+
+
+def wishlisted_ids(request):
+    # Lazy: the cache is only read when a template checks wishlist membership
+    return {'wishlisted_ids': SimpleLazyObject(lambda: _loaded(request, '_wishlist_ids', get_wishlist_ids))}
@@ -0,0 +1,191 @@
+# orders/coupons.py
+"""
+Coupon usage limits.
+
+Every order that uses a coupon gets a CouponRedemption row, and
+Coupon.used_count holds the running total. Redeeming bumps the counter with a
+conditional UPDATE (... SET used_count = used_count + 1 WHERE used_count <
+usage_limit), so the total limit holds under concurrent checkouts without a
+table lock: a redemption that loses the race simply updates no row.
+
+That UPDATE also holds the coupon's row lock until the checkout commits, so
+concurrent redemptions of the same coupon queue behind it, and the per-user
+count that follows (one lookup on coupon_redemption_user_idx) always sees the
+other checkouts' committed rows.
+
+The coupons valid right now are also kept in process memory (ActiveCoupons),
+indexed by code and sorted by min_order_amount, so listing and applying
+coupons in the cart does not query Coupon. A snapshot is rebuilt when the
+next start_date/end_date boundary passes, or when a new version token is
+published on Coupon save/delete (orders/signals.py) or when a redemption uses
+up a coupon's usage_limit. The token lives in the shared cache (CACHES in
+eshop/settings.py) and is looked up at most every VERSION_CHECK_INTERVAL
+seconds, so the list shown in the cart can lag another worker's change by
+that long. Applying a coupon (fresh_coupon) and checkout read the Coupon row
+itself, so a coupon deactivated elsewhere is never accepted.
+"""
+import threading
+import time
+from bisect import bisect_right
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from eshop_app.models import Coupon
+from .models import CouponRedemption
+
+VERSION_KEY = 'active_coupons_version'
+VERSION_CHECK_INTERVAL = 2
+
+_lock = threading.Lock()
+_active = None
+_version = None
+_checked_at = 0.0
+
+
+class CouponLimitReached(Exception):
+    """The coupon has no redemptions left (in total or for this user)."""
+
+
+class ActiveCoupons:
+    def __init__(self, coupons, now, version=None):
+        self.version = version
+        valid = [
+            coupon for coupon in coupons
+            if coupon.start_date <= now and (coupon.end_date is None or coupon.end_date >= now)
+        ]
+        valid.sort(key=lambda coupon: (coupon.min_order_amount, coupon.id))
+        self.coupons = tuple(valid)
+        self._by_code = {coupon.code: coupon for coupon in valid}
+        self._min_amounts = [coupon.min_order_amount for coupon in valid]
+
+        # The snapshot is good until the next coupon starts or ends
+        boundaries = [coupon.start_date for coupon in coupons if coupon.start_date > now]
+        boundaries += [coupon.end_date for coupon in valid if coupon.end_date is not None]
+        self.expires_at = min(boundaries, default=None)
+
+    def expired(self, now):
+        return self.expires_at is not None and now >= self.expires_at
+
+    def get(self, code):
+        """The valid coupon with this code, or None."""
+        return self._by_code.get(code)
+
+    def eligible(self, order_amount):
+        """Valid coupons whose minimum order amount is met by `order_amount`."""
+        return self.coupons[:bisect_right(self._min_amounts, order_amount)]
+
+
+def _current_version():
+    global _version, _checked_at
+    now = time.monotonic()
+    if _version is not None and now - _checked_at < VERSION_CHECK_INTERVAL:
+        return _version
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY)
+    _version, _checked_at = version, now
+    return version
+
+
+def unexpired_coupons(now):
+    """Active coupons that haven't ended, including ones yet to start (for the next boundary)."""
+    return Coupon.objects.filter(Q(end_date__isnull=True) | Q(end_date__gte=now), is_active=True)
+
+
+def get_active_coupons():
+    """Return this process's ActiveCoupons, rebuilding it when stale."""
+    global _active
+    now = timezone.now()
+    version = _current_version()
+    active = _active
+    if active is None or active.version != version or active.expired(now):
+        with _lock:
+            if _active is None or _active.version != version or _active.expired(now):
+                coupons = list(unexpired_coupons(now))
+                _active = ActiveCoupons(coupons, now, version)
+            active = _active
+    return active
+
+
+def invalidate_active_coupons():
+    """Publish a new version; every process reloads coupons on its next lookup."""
+    global _active, _version
+    _version = time.time_ns()
+    cache.set(VERSION_KEY, _version, None)
+    _active = None
+
+
+def fresh_coupon(code):
+    """The coupon with this code if its row is valid right now, read from the database."""
+    if not code:
+        return None
+    now = timezone.now()
+    return Coupon.objects.filter(
+        Q(end_date__isnull=True) | Q(end_date__gte=now),
+        code=code,
+        is_active=True,
+        start_date__lte=now,
+    ).first()
+
+
+def user_redemption_count(coupon, user):
+    if not user or not user.is_authenticated:
+        return 0
+    return CouponRedemption.objects.filter(coupon=coupon, user=user).count()
+
+
+def user_redemption_counts(user, coupons):
+    """{coupon_id: redemptions by `user`} for several coupons in one query."""
+    coupons = [coupon for coupon in coupons if coupon.per_user_limit]
+    if not coupons or not user or not user.is_authenticated:
+        return {}
+    rows = (
+        CouponRedemption.objects.filter(user=user, coupon__in=coupons)
+        .values('coupon')
+        .annotate(total=Count('id'))
+    )
+    return {row['coupon']: row['total'] for row in rows}
+
+
+def limit_message(coupon, used_by_user):
+    """Why the coupon can't be used right now, or None if it can."""
+    if coupon.usage_limit and coupon.used_count >= coupon.usage_limit:
+        return f"Coupon {coupon.code} has reached its usage limit."
+    if coupon.per_user_limit and used_by_user >= coupon.per_user_limit:
+        return f"You have already used coupon {coupon.code} the maximum number of times."
+    return None
+
+
+def redeem_coupon(coupon, user, order, discount):
+    """
+    Record a redemption of `coupon` for `order`. Must run inside the checkout
+    transaction; raises CouponLimitReached (and the caller rolls back) if a
+    limit would be exceeded.
+    """
+    updated = Coupon.objects.filter(
+        Q(usage_limit=0) | Q(used_count__lt=F('usage_limit')),
+        pk=coupon.pk,
+    ).update(used_count=F('used_count') + 1)
+    if not updated:
+        raise CouponLimitReached(f"Coupon {coupon.code} has reached its usage limit.")
+    if coupon.usage_limit and Coupon.objects.filter(
+        pk=coupon.pk, used_count__gte=F('usage_limit')
+    ).exists():
+        # That was the last one: drop it from the cached active coupons
+        transaction.on_commit(invalidate_active_coupons)
+
+    if coupon.per_user_limit and user_redemption_count(coupon, user) >= coupon.per_user_limit:
+        raise CouponLimitReached(
+            f"You have already used coupon {coupon.code} the maximum number of times."
+        )
+
+    return CouponRedemption.objects.create(
+        coupon=coupon,
+        user=user if user and user.is_authenticated else None,
+        order=order,
+        discount=discount,
+    )
@@ -0,0 +1,183 @@
+# orders/facets.py
+"""
+Normalized colour and size facets.
+
+Product.color_data (JSON list of {'name', 'code'}) and Product.size (comma-joined
+string) are projected into ProductColor / ProductSize rows holding one
+normalized value each, so storefront filters become an exact match on an
+indexed column instead of a substring scan over serialized text.
+
+facet_counts() aggregates the shop sidebar (brand, category, size, colour and
+price bucket counts) with one grouped query per facet.
+"""
+from django.db import transaction
+from django.db.models import Count, Max, Q
+
+from .models import ProductColor, ProductSize
+
+# Matches the price links in the shop sidebar (bounds are inclusive, like the filter)
+PRICE_BUCKETS = [(0, 50), (50, 100), (100, 200), (200, 500), (500, 1000)]
+
+# Display order for the usual clothing sizes; anything else sorts after them
+SIZE_ORDER = ['xs', 's', 'm', 'l', 'xl', '2xl', 'xxl', '3xl', '4xl']
+
+
+def normalize_facet(value):
+    """Collapse whitespace and case-fold: '  Dark  Red ' -> 'dark red'."""
+    return ' '.join(str(value or '').split()).casefold()
+
+
+def color_values(color_data):
+    """Map each normalized colour name to its swatch code."""
+    values = {}
+    for color in color_data or []:
+        if isinstance(color, dict):
+            name, code = color.get('name'), color.get('code') or ''
+        else:
+            name, code = color, ''
+        value = normalize_facet(name)
+        if value:
+            values.setdefault(value[:50], str(code)[:20])
+    return values
+
+
+def size_values(size):
+    return {value[:20] for value in map(normalize_facet, (size or '').split(',')) if value}
+
+
+def sync_product_facets(product):
+    """Rewrite the facet rows of one product from its current field values."""
+    with transaction.atomic():
+        ProductColor.objects.filter(product=product).delete()
+        ProductSize.objects.filter(product=product).delete()
+        ProductColor.objects.bulk_create([
+            ProductColor(product=product, value=value, code=code)
+            for value, code in color_values(product.color_data).items()
+        ])
+        ProductSize.objects.bulk_create([
+            ProductSize(product=product, value=value) for value in size_values(product.size)
+        ])
+
+
+def color_q(color):
+    return Q(color_facets__value=normalize_facet(color))
+
+
+def size_q(size):
+    return Q(size_facets__value=normalize_facet(size))
+
+
+def filter_by_color(products, color):
+    """Products having `color`, via the (value, product) index."""
+    return products.filter(color_q(color))
+
+
+def filter_by_size(products, size):
+    """Products available in `size`, via the (value, product) index."""
+    return products.filter(size_q(size))
+
+
+def _narrow(products, filters, facet):
+    """Apply every selected filter except the facet's own, so its other options keep their counts."""
+    for name, condition in filters.items():
+        if name != facet:
+            products = products.filter(condition)
+    return products
+
+
+def _grouped(products, field):
+    return products.order_by().values(field).annotate(count=Count('id'))
+
+
+def facet_querysets(products, filters):
+    """
+    The queries facet_counts() runs, by facet: grouped counts for category,
+    brand, size and colour, and for price the rows its bucket counts are
+    aggregated over. Also explained by orders/query_plans.py.
+    """
+    return {
+        # Grouped by (category, child_category) once; facet_counts rolls it up the tree
+        'category': _narrow(products, filters, 'category').order_by()
+        .values('category_id', 'child_category_id').annotate(count=Count('id')),
+        'brand': _grouped(_narrow(products, filters, 'brand'), 'brand_id'),
+        'size': _grouped(_narrow(products, filters, 'size'), 'size_facets__value'),
+        'color': _narrow(products, filters, 'color').order_by()
+        .values('color_facets__value')
+        .annotate(count=Count('id'), code=Max('color_facets__code')),
+        'price': _narrow(products, filters, 'price').order_by(),
+    }
+
+
+def _counts(rows, field):
+    return {row[field]: row['count'] for row in rows if row[field] is not None}
+
+
+def _size_key(value):
+    if value in SIZE_ORDER:
+        return (0, SIZE_ORDER.index(value), value)
+    return (1, 0, value)
+
+
+def facet_counts(products, filters, category_tree=None, brands=()):
+    """
+    Sidebar facets for a listing.
+
+    `products` is the listing before any sidebar filter is applied and
+    `filters` maps facet name ('category', 'brand', 'size', 'color', 'price')
+    to the Q of the currently selected option. Each facet is counted with
+    every other selected filter applied. Options with no products are left
+    out; `category_tree` (orders.categories) and `brands` give the order.
+    """
+    queries = facet_querysets(products, filters)
+    category_rows = list(queries['category'])
+
+    categories = []
+    for parent in (category_tree.parents() if category_tree else ()):
+        children = []
+        for child in category_tree.active_children(parent.id):
+            count = sum(
+                row['count'] for row in category_rows
+                if child.id in (row['category_id'], row['child_category_id'])
+            )
+            if count:
+                children.append({'category': child, 'count': count})
+        child_ids = {entry['category'].id for entry in children}
+        count = sum(
+            row['count'] for row in category_rows
+            if row['category_id'] == parent.id
+            or row['category_id'] in child_ids
+            or row['child_category_id'] in child_ids
+        )
+        if count:
+            categories.append({'category': parent, 'count': count, 'children': children})
+
+    brand_counts = _counts(queries['brand'], 'brand_id')
+    size_counts = _counts(queries['size'], 'size_facets__value')
+    color_rows = queries['color']
+    price_counts = queries['price'].aggregate(**{
+        f'price_{low}_{high}': Count('id', filter=Q(price__gte=low, price__lte=high))
+        for low, high in PRICE_BUCKETS
+    })
+
+    return {
+        'categories': categories,
+        'brands': [
+            {'brand': brand, 'count': brand_counts[brand.id]}
+            for brand in brands if brand_counts.get(brand.id)
+        ],
+        'sizes': [
+            {'value': value, 'count': size_counts[value]}
+            for value in sorted(size_counts, key=_size_key)
+        ],
+        'colors': sorted(
+            (
+                {'value': row['color_facets__value'], 'code': row['code'], 'count': row['count']}
+                for row in color_rows if row['color_facets__value']
+            ),
+            key=lambda entry: (-entry['count'], entry['value']),
+        ),
+        'prices': [
+            {'min': low, 'max': high, 'count': price_counts[f'price_{low}_{high}']}
+            for low, high in PRICE_BUCKETS if price_counts[f'price_{low}_{high}']
+        ],
+    }
@@ -0,0 +1,75 @@
+# orders/gallery.py
+"""
+Colour gallery for the product detail page.
+
+All image media for a product is fetched in one query and grouped in Python
+by case-folded colour name. The result is cached per product and dropped by
+the ProductMedia / Product signals in orders/signals.py.
+"""
+from collections import defaultdict
+
+from django.core.cache import cache
+
+CACHE_TIMEOUT = 60 * 60
+
+
+def gallery_cache_key(product_id):
+    return f'product_gallery:{product_id}'
+
+
+def invalidate_gallery(product_id):
+    cache.delete(gallery_cache_key(product_id))
+
+
+def _build_gallery(product):
+    media = product.media_files.filter(file_type='image').order_by('-is_primary', '-id')
+
+    all_images = []
+    images_by_color = defaultdict(list)
+    for item in media:
+        url = item.file.url
+        all_images.append(url)
+        if item.color_name:
+            images_by_color[item.color_name.casefold()].append(url)
+
+    colors = []
+    for color in product.color_data or []:
+        color_name = color.get('name')
+        if not color_name:
+            continue
+        images = images_by_color.get(color_name.casefold())
+        if images:
+            colors.append({**color, 'images': images, 'thumb': images[0]})
+
+    primary_color = None
+    gallery_images = []
+    if colors:
+        primary_color = colors[0]['name']
+        gallery_images = colors[0]['images']
+
+    # Fallback: no color-specific images
+    if not gallery_images:
+        gallery_images = all_images
+
+    for color in colors:
+        color['is_current'] = (color['name'] == primary_color)
+
+    return {
+        'colors': colors,
+        'primary_color': primary_color,
+        'gallery_images': gallery_images,
+    }
+
+
+def get_color_gallery(product):
+    """
+    Return {'colors', 'primary_color', 'gallery_images'} for a product,
+    built from a single ProductMedia query and cached until the media or
+    the product's color_data changes.
+    """
+    key = gallery_cache_key(product.pk)
+    gallery = cache.get(key)
+    if gallery is None:
+        gallery = _build_gallery(product)
+        cache.set(key, gallery, CACHE_TIMEOUT)
+    return gallery
@@ -0,0 +1,143 @@
+# orders/homepage.py
+"""
+Cached sections of the landing page.
+
+Each section's data (banners, categories, featured products, deals, product
+grid per filter) is cached under a key carrying the version token of the
+model it is built from, and index.html caches the rendered fragments under
+the same tokens. Saving or deleting a Product, Banner or Category publishes a
+new token for its sections (see orders/signals.py), so stale entries are
+simply never read again and expire on their own.
+
+The tokens must live in a cache every worker shares (CACHES in
+eshop/settings.py; the orders.W001 check warns otherwise), or a change made
+by another process or by a command like seed_catalog is never seen. Data and
+fragments are also cached for at most CACHE_TIMEOUT / DEALS_TIMEOUT, which
+bounds how stale a page can get if a token is lost.
+"""
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+
+from eshop_app.models import Banner, Product
+from .categories import get_category_tree
+
+CACHE_TIMEOUT = 60 * 15
+# Deals drop off when deal_end_date passes, so they are rebuilt more often
+DEALS_TIMEOUT = 60 * 5
+
+FEATURED_LIMIT = 12
+DEALS_LIMIT = 10
+GRID_LIMIT = 9  # 8 cards plus one to know whether to show "Read More"
+
+GRID_FILTERS = ('all', 'new-arrivals', 'hot-sales')
+
+# Model a section is built from -> version key
+SOURCES = ('product', 'banner', 'category')
+
+
+def version_key(source):
+    return f'homepage_version:{source}'
+
+
+def get_versions():
+    """Current version token per source, creating missing ones."""
+    keys = {source: version_key(source) for source in SOURCES}
+    found = cache.get_many(keys.values())
+    versions = {}
+    for source, key in keys.items():
+        version = found.get(key)
+        if version is None:
+            cache.add(key, time.time_ns(), None)
+            version = cache.get(key)
+        versions[source] = version
+    return versions
+
+
+def invalidate_homepage(source):
+    cache.set(version_key(source), time.time_ns(), None)
+
+
+# The querysets behind each section, also explained by orders/query_plans.py
+def banners_queryset():
+    return Banner.objects.filter(status='active').order_by('-created_at')
+
+
+def featured_queryset():
+    return Product.objects.filter(is_featured=True, status='active').order_by('-created_at')[:FEATURED_LIMIT]
+
+
+def deals_queryset():
+    return (
+        Product.objects.filter(
+            Q(condition__iexact='Hot') | Q(discount__isnull=False),
+            status='active',
+            deal_end_date__isnull=False
+        )
+        .exclude(discount=0)
+        .filter(deal_end_date__gte=timezone.now())
+        .select_related('category')
+        .order_by('-discount', '-created_at')[:DEALS_LIMIT]
+    )
+
+
+def grid_queryset(filter_type):
+    products = Product.objects.filter(status='active')
+    if filter_type == 'new-arrivals':
+        products = products.filter(
+            created_at__gte=timezone.now() - timedelta(days=7)
+        ).order_by('-created_at')
+    elif filter_type == 'hot-sales':
+        products = products.filter(price__lt=50).order_by('-price')
+    else:
+        products = products.order_by('-created_at')
+    return products[:GRID_LIMIT]
+
+
+def _banners():
+    return list(banners_queryset())
+
+
+def _categories():
+    return sorted(get_category_tree().parents(), key=lambda category: category.title)
+
+
+def _featured():
+    return list(featured_queryset())
+
+
+def _deals():
+    return list(deals_queryset())
+
+
+def _grid(filter_type):
+    return list(grid_queryset(filter_type))
+
+
+def _section(name, version, builder, timeout=CACHE_TIMEOUT):
+    # Lazy, so a template whose fragment is already cached never loads the data
+    key = f'homepage:{name}:{version}'
+    return SimpleLazyObject(lambda: cache.get_or_set(key, builder, timeout))
+
+
+def homepage_context(filter_type):
+    """Template context for index.html: lazy section data plus fragment cache settings."""
+    if filter_type not in GRID_FILTERS:
+        filter_type = 'all'
+    versions = get_versions()
+
+    return {
+        'filter_type': filter_type,
+        'banners': _section('banners', versions['banner'], _banners),
+        'categories': _section('categories', versions['category'], _categories),
+        'featured_products': _section('featured', versions['product'], _featured),
+        'hot_discounted_products': _section('deals', versions['product'], _deals, DEALS_TIMEOUT),
+        'products': _section(f'grid:{filter_type}', versions['product'], lambda: _grid(filter_type)),
+        'home_versions': versions,
+        'home_cache_timeout': CACHE_TIMEOUT,
+        'deals_cache_timeout': DEALS_TIMEOUT,
+    }
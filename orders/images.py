@@ -0,0 +1,206 @@
+# orders/images.py
+"""
+Responsive image derivatives.
+
+Every uploaded product, media, banner and category image gets resized copies
+at WIDTHS (never wider than the original) in each modern format Pillow can
+write here (AVIF and WebP). They are stored next to the media under
+derivatives/ and recorded as ImageDerivative rows; the responsive_images
+template tags turn them into <picture>/srcset markup.
+
+Generation happens off the request: the post_save signals in
+orders/signals.py call schedule_derivatives(), which runs on a small thread
+pool once the upload's transaction commits. build_image_derivatives
+backfills existing media. Uploaded videos get a poster frame from
+generate_poster() when ffmpeg is installed.
+"""
+import hashlib
+import logging
+import os
+import posixpath
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+from .models import ImageDerivative
+
+logger = logging.getLogger(__name__)
+
+WIDTHS = (320, 640, 1024)
+# Preferred first: browsers take the first <source> they support
+FORMATS = tuple(fmt for fmt in ('avif', 'webp') if features.check(fmt))
+QUALITY = {'avif': 55, 'webp': 78}
+
+CACHE_TIMEOUT = 60 * 60 * 24
+EMPTY_CACHE_TIMEOUT = 60 * 5
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='images')
+
+
+def derivative_name(source, width, fmt):
+    stem = posixpath.splitext(source)[0]
+    return f'derivatives/{stem}-{width}w.{fmt}'
+
+
+def derivatives_cache_key(source):
+    return 'image_derivatives:' + hashlib.md5(source.encode()).hexdigest()
+
+
+def get_derivatives_many(sources):
+    """
+    {source: derivatives} for several stored images: one cache round trip and
+    at most one query for the ones not cached. An image without derivatives
+    yet is only cached for EMPTY_CACHE_TIMEOUT, so it picks them up soon.
+    """
+    keys = {derivatives_cache_key(source): source for source in sources if source}
+    found = {keys[key]: value for key, value in cache.get_many(keys).items()}
+    missing = set(keys.values()) - found.keys()
+    if missing:
+        loaded = {source: {} for source in missing}
+        for row in ImageDerivative.objects.filter(source__in=missing).order_by('width'):
+            loaded[row.source].setdefault(row.format, []).append((row.width, default_storage.url(row.name)))
+        cache.set_many(
+            {derivatives_cache_key(source): value for source, value in loaded.items() if value}, CACHE_TIMEOUT
+        )
+        cache.set_many(
+            {derivatives_cache_key(source): value for source, value in loaded.items() if not value},
+            EMPTY_CACHE_TIMEOUT,
+        )
+        found.update(loaded)
+    return found
+
+
+def get_derivatives(source):
+    """{format: [(width, url), ...] narrowest first} for a stored image; {} if none yet."""
+    if not source:
+        return {}
+    return get_derivatives_many([source])[source]
+
+
+def _open(source):
+    with default_storage.open(source, 'rb') as fh:
+        image = Image.open(fh)
+        image.load()
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        has_alpha = image.mode in ('LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+    return image
+
+
+def generate_derivatives(source, force=False):
+    """Create the missing derivatives of one stored image. Returns how many were written."""
+    if not source or not FORMATS:
+        return 0
+    existing = set() if force else set(
+        ImageDerivative.objects.filter(source=source).values_list('width', 'format')
+    )
+    if existing and {fmt for _, fmt in existing} >= set(FORMATS):
+        # Uploads get unique storage names, so a known source never changes
+        return 0
+    try:
+        image = _open(source)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+        logger.warning("Skipping derivatives for %s: %s", source, e)
+        return 0
+
+    # Never upscale; a small original still gets one recompressed copy
+    widths = [width for width in WIDTHS if width < image.width] or [image.width]
+    rows = []
+    for fmt in FORMATS:
+        for width in widths:
+            if (width, fmt) in existing:
+                continue
+            resized = image.copy()
+            resized.thumbnail((width, image.height), Image.Resampling.LANCZOS)
+            buffer = BytesIO()
+            resized.save(buffer, fmt.upper(), quality=QUALITY[fmt])
+
+            name = derivative_name(source, width, fmt)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            name = default_storage.save(name, ContentFile(buffer.getvalue()))
+            rows.append(ImageDerivative(source=source, width=width, format=fmt, name=name))
+
+    if rows:
+        ImageDerivative.objects.bulk_create(
+            rows, update_conflicts=True,
+            unique_fields=['source', 'width', 'format'], update_fields=['name'],
+        )
+        cache.delete(derivatives_cache_key(source))
+    return len(rows)
+
+
+def generate_poster(source, at_seconds=1):
+    """Grab a JPEG poster frame for a stored video with ffmpeg. Returns True if one was written."""
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        return False
+    try:
+        video_path = default_storage.path(source)
+    except NotImplementedError:
+        # Remote storage: ffmpeg needs a local file
+        return False
+
+    with tempfile.TemporaryDirectory() as tmp:
+        frame = os.path.join(tmp, 'poster.jpg')
+        result = subprocess.run(
+            [ffmpeg, '-v', 'error', '-y', '-ss', str(at_seconds), '-i', video_path,
+             '-frames:v', '1', '-vf', f'scale={WIDTHS[-1]}:-2', frame],
+            capture_output=True, timeout=60,
+        )
+        if result.returncode != 0 or not os.path.exists(frame):
+            logger.warning("No poster frame for %s: %s", source, result.stderr.decode(errors='replace')[:200])
+            return False
+        with Image.open(frame) as image:
+            width = image.width
+        with open(frame, 'rb') as fh:
+            name = default_storage.save(
+                f'derivatives/{posixpath.splitext(source)[0]}-poster.jpg', ContentFile(fh.read())
+            )
+
+    ImageDerivative.objects.update_or_create(
+        source=source, width=width, format='poster', defaults={'name': name},
+    )
+    cache.delete(derivatives_cache_key(source))
+    return True
+
+
+def get_poster_url(source):
+    """URL of a video's poster frame, or '' if there is none."""
+    posters = get_derivatives(source).get('poster')
+    return posters[0][1] if posters else ''
+
+
+def delete_derivatives(source):
+    """Remove every derivative (and poster) of a stored file that is going away."""
+    rows = list(ImageDerivative.objects.filter(source=source))
+    for row in rows:
+        default_storage.delete(row.name)
+    ImageDerivative.objects.filter(pk__in=[row.pk for row in rows]).delete()
+    cache.delete(derivatives_cache_key(source))
+
+
+def _generate_in_thread(sources):
+    try:
+        for source in sources:
+            generate_derivatives(source)
+    except Exception:
+        logger.exception("Image derivatives failed for %s", sources)
+    finally:
+        connection.close()
+
+
+def schedule_derivatives(*sources):
+    """Generate derivatives on the background pool once the current transaction commits."""
+    sources = [source for source in sources if source]
+    if sources:
+        transaction.on_commit(lambda: _executor.submit(_generate_in_thread, sources))
@@ -0,0 +1,169 @@
+# orders/listing.py
+"""
+Shared listing engine for the storefront product grids.
+
+Uses seek (keyset) pagination instead of OFFSET: the cursor carries the value
+of the active sort column plus the product id of the last card rendered, so
+fetching page N is the same indexed range scan as fetching page 1.
+"""
+import base64
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+from django.http import JsonResponse
+from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.utils.dateparse import parse_datetime
+
+PAGE_SIZE = 24
+
+# sort option -> (model field, descending)
+SORT_KEYS = {
+    'low_to_high': ('price', False),
+    'high_to_low': ('price', True),
+    'newest': ('created_at', True),
+    # Only valid on querysets annotated by orders.search.search_products()
+    'relevance': ('search_rank', True),
+}
+DEFAULT_SORT = 'newest'
+
+
+def get_sort_key(sort_option):
+    """Return (field, descending) for a sort option, falling back to newest first."""
+    return SORT_KEYS.get(sort_option, SORT_KEYS[DEFAULT_SORT])
+
+
+def encode_cursor(value, pk):
+    """Encode the sort value and id of the last product on a page as a URL-safe token."""
+    value = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+    raw = json.dumps([value, pk])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, field):
+    """
+    Decode a cursor produced by encode_cursor().
+    Returns (value, pk) or None if the token is missing or malformed.
+    """
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        value, pk = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        pk = int(pk)
+        if field == 'price':
+            value = Decimal(value)
+        elif field == 'search_rank':
+            value = float(value)
+        else:
+            value = parse_datetime(value)
+            if value is None:
+                return None
+    except (ValueError, TypeError, InvalidOperation, json.JSONDecodeError):
+        return None
+    return value, pk
+
+
+def category_filter(category, tree):
+    """
+    Q for the products listed under `category`: a parent covers products
+    assigned to it or to any active child (via category or child_category),
+    a child those assigned to it via either field.
+    """
+    if category.is_parent:
+        child_ids = [child.id for child in tree.active_children(category.id)]
+        return (
+            Q(category_id=category.id) |
+            Q(category_id__in=child_ids) |
+            Q(child_category_id__in=child_ids)
+        )
+    return Q(category_id=category.id) | Q(child_category_id=category.id)
+
+
+def page_queryset(products, sort_option, cursor=None, page_size=PAGE_SIZE):
+    """
+    The query paginate_products() runs: `products` ordered by the active sort
+    key (id as tie-breaker), after `cursor`, with one extra row.
+    Returns (queryset, sort field).
+    """
+    field, descending = get_sort_key(sort_option)
+    if field == 'search_rank' and field not in products.query.annotations:
+        # Relevance only makes sense for a search; order newest first instead
+        field, descending = SORT_KEYS[DEFAULT_SORT]
+
+    if descending:
+        products = products.order_by(f'-{field}', '-id')
+    else:
+        products = products.order_by(field, 'id')
+
+    position = decode_cursor(cursor, field)
+    if position:
+        value, pk = position
+        if descending:
+            products = products.filter(
+                Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': pk})
+            )
+        else:
+            products = products.filter(
+                Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__gt': pk})
+            )
+
+    # One extra row to know whether another page exists
+    return products[:page_size + 1], field
+
+
+def paginate_products(products, sort_option, cursor=None, page_size=PAGE_SIZE):
+    """
+    Order `products` by the active sort key (with id as tie-breaker) and return
+    one page after `cursor` as (page_items, next_cursor).
+    next_cursor is None on the last page.
+    """
+    products, field = page_queryset(products, sort_option, cursor, page_size)
+    items = list(products)
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+
+    return items, next_cursor
+
+
+def render_product_listing(request, template_name, fragment_template, products, context, sort_option=None):
+    """
+    Paginate `products` and render the full listing page.
+
+    When called with ?format=json (infinite scroll), only the product cards
+    are rendered and returned together with the next cursor.
+    """
+    if sort_option is None:
+        sort_option = request.GET.get('sort', DEFAULT_SORT)
+
+    page_items, next_cursor = paginate_products(
+        products, sort_option, cursor=request.GET.get('cursor')
+    )
+
+    next_page_url = None
+    if next_cursor:
+        params = request.GET.copy()
+        params.pop('format', None)
+        params['cursor'] = next_cursor
+        next_page_url = f"{request.path}?{params.urlencode()}"
+
+    context = {
+        **context,
+        'products': page_items,
+        'next_cursor': next_cursor,
+        'next_page_url': next_page_url,
+    }
+
+    if request.GET.get('format') == 'json':
+        html = render_to_string(fragment_template, context, request=request)
+        return JsonResponse({
+            'html': html,
+            'next_cursor': next_cursor,
+            'next_page_url': next_page_url,
+        })
+
+    return render(request, template_name, context)
@@ -0,0 +1,73 @@
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand, CommandError
+from django.template import engines
+
+TEMPLATE_EXTENSIONS = ('.html', '.txt', '.xml')
+_STATIC_TAG = re.compile(r'''{%\s*static\s+(["'])([^"']+)\1''')
+
+
+def _template_files():
+    seen = set()
+    for engine in engines.all():
+        # Includes each app's templates/ directory when APP_DIRS is on
+        for directory in engine.template_dirs:
+            for path in sorted(Path(directory).rglob('*')):
+                if path.suffix in TEMPLATE_EXTENSIONS and path.is_file() and path not in seen:
+                    seen.add(path)
+                    yield path
+
+
+def _static_prefix():
+    return '/' + settings.STATIC_URL.strip('/') + '/'
+
+
+def _hard_coded_pattern(prefix):
+    # A static URL written out in an attribute, url(...) or srcset, or built from {{ STATIC_URL }}
+    return re.compile(
+        r'''(?:(?<=["'(\s,=])%s[^"'()\s,]*|{{\s*STATIC_URL\s*}}[^"'()\s,]*)''' % re.escape(prefix)
+    )
+
+
+class Command(BaseCommand):
+    help = "Flag hard-coded /static/ URLs in templates that bypass the hashed static manifest."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fail', action='store_true',
+            help="Exit with an error when anything is found (for CI).",
+        )
+
+    def handle(self, *args, **options):
+        prefix = _static_prefix()
+        hard_coded = _hard_coded_pattern(prefix)
+        base = Path(settings.BASE_DIR)
+        findings = 0
+        for path in _template_files():
+            try:
+                text = path.read_text(encoding='utf-8')
+            except UnicodeDecodeError:
+                continue
+            shown = path.relative_to(base) if path.is_relative_to(base) else path
+            for number, line in enumerate(text.splitlines(), 1):
+                for match in hard_coded.finditer(line):
+                    findings += 1
+                    url = match.group(0)
+                    name = url[len(prefix):] if url.startswith(prefix) else url.split('}}', 1)[-1].lstrip('/')
+                    self.stdout.write(f"{shown}:{number}: hard-coded {url} -> {{% static '{name}' %}}")
+                for match in _STATIC_TAG.finditer(line):
+                    name = match.group(2)
+                    if '{{' not in name and not finders.find(name):
+                        findings += 1
+                        self.stdout.write(f"{shown}:{number}: {{% static '{name}' %}} doesn't exist")
+
+        if not findings:
+            self.stdout.write(self.style.SUCCESS("No hard-coded or missing static URLs in templates."))
+            return
+        message = f"{findings} static URL problem(s) in templates."
+        if options['fail']:
+            raise CommandError(message)
+        self.stdout.write(self.style.WARNING(message))
@@ -0,0 +1,86 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from orders.benchmark import run_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark storefront and admin list views through the test client and save "
+        "p50/p95 latency, query counts and response sizes as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--only', nargs='*', help="Scenario names to run (default: all).")
+        parser.add_argument(
+            '--output',
+            help="Where to write the JSON results (default: benchmarks/storefront-<timestamp>.json).",
+        )
+        parser.add_argument('--compare', help="A previous results file to compare against.")
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError("--iterations must be at least 1.")
+        baseline = None
+        if options['compare']:
+            try:
+                baseline = json.loads(Path(options['compare']).read_text())['results']
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"Can't read {options['compare']}: {e}")
+
+        # Test-client requests need 'testserver' allowed and a locmem email backend
+        setup_test_environment()
+        try:
+            results = run_benchmark(
+                iterations=options['iterations'],
+                warmup=options['warmup'],
+                only=options['only'],
+                progress=self._progress,
+            )
+        finally:
+            teardown_test_environment()
+
+        if baseline:
+            self._compare(results, baseline)
+
+        started = timezone.now()
+        output = Path(options['output'] or f"benchmarks/storefront-{started:%Y%m%d-%H%M%S}.json")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps({
+            'created_at': started.isoformat(),
+            'database': connection.vendor,
+            'debug': settings.DEBUG,
+            'iterations': options['iterations'],
+            'results': results,
+        }, indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Saved {len(results)} results to {output}"))
+
+    def _progress(self, name, result):
+        if result is None:
+            self.stdout.write(f"{name:<22} skipped (no user for this role)")
+            return
+        line = (
+            f"{name:<22} {result['status']}  p50 {result['p50_ms']:>8.2f} ms  "
+            f"p95 {result['p95_ms']:>8.2f} ms  {result['queries']:>4} queries  {result['bytes']:>9} bytes"
+        )
+        self.stdout.write(line if result['status'] == 200 else self.style.WARNING(line))
+
+    def _compare(self, results, baseline):
+        self.stdout.write("\nChange against baseline (p50, p95, queries):")
+        for name, result in results.items():
+            before = baseline.get(name)
+            if not before:
+                continue
+            self.stdout.write(
+                f"{name:<22} {result['p50_ms'] - before['p50_ms']:>+9.2f} ms "
+                f"{result['p95_ms'] - before['p95_ms']:>+9.2f} ms "
+                f"{result['queries'] - before['queries']:>+5}"
+            )
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from eshop_app.models import Banner, Category, Product, ProductMedia
+from orders.images import FORMATS, generate_derivatives
+
+
+def _sources():
+    names = set()
+    for model, field, extra in (
+        (Product, 'photo', {}),
+        (ProductMedia, 'file', {'file_type': 'image'}),
+        (Banner, 'photo', {}),
+        (Category, 'photo', {}),
+    ):
+        names.update(
+            model.objects.filter(**extra).exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+            .values_list(field, flat=True)
+        )
+    return sorted(names)
+
+
+class Command(BaseCommand):
+    help = "Generate resized WebP/AVIF derivatives for existing product, media, banner and category images."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Regenerate derivatives that already exist.")
+
+    def handle(self, *args, **options):
+        if not FORMATS:
+            self.stderr.write("Pillow here can't write WebP or AVIF; nothing to do.")
+            return
+        sources = _sources()
+        written = 0
+        for number, source in enumerate(sources, 1):
+            written += generate_derivatives(source, force=options['force'])
+            if number % 100 == 0:
+                self.stdout.write(f"{number}/{len(sources)} images")
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} derivatives ({', '.join(FORMATS)}) for {len(sources)} images."
+        ))
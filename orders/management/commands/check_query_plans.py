@@ -0,0 +1,61 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from orders.query_plans import STOREFRONT_QUERIES
+
+
+def _sequential_scan(plan, table):
+    """True if the plan reads `table` with a full sequential scan."""
+    if connection.vendor == 'postgresql':
+        return re.search(rf'Seq Scan on {re.escape(table)}\b', plan) is not None
+    # SQLite: "SCAN <table>" without "USING [COVERING] INDEX"
+    return re.search(rf'\bSCAN (TABLE )?{re.escape(table)}\b(?! USING)', plan) is not None
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN on each registered storefront query and fail if any of them "
+        "reads its table with a sequential scan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-rows', type=int, default=1000,
+            help="Skip tables smaller than this; planners rightly scan tiny tables (default 1000).",
+        )
+        parser.add_argument('--verbose-plans', action='store_true', help="Print every plan.")
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            raise CommandError(f"EXPLAIN checks are not supported on {connection.vendor}.")
+
+        failures, skipped = [], 0
+        for name, builder in STOREFRONT_QUERIES.items():
+            queryset = builder()
+            model = queryset.model
+            table = model._meta.db_table
+
+            rows = model.objects.count()
+            if rows < options['min_rows']:
+                self.stdout.write(f"SKIP {name}: {table} has only {rows} rows")
+                skipped += 1
+                continue
+
+            plan = queryset.explain()
+            if options['verbose_plans']:
+                self.stdout.write(plan)
+            if _sequential_scan(plan, table):
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f"SEQ  {name}"))
+                self.stdout.write(plan)
+            else:
+                self.stdout.write(self.style.SUCCESS(f"OK   {name}"))
+
+        if failures:
+            raise CommandError(f"Sequential scans in: {', '.join(failures)}")
+        checked = len(STOREFRONT_QUERIES) - skipped
+        self.stdout.write(self.style.SUCCESS(
+            f"{checked} queries use an index ({skipped} skipped on small tables)."
+        ))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from orders.blobs import dedupe_stored_media
+
+
+class Command(BaseCommand):
+    help = "Store one copy of each distinct product image/video and count its references."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--directory', action='append', dest='directories',
+            help="Media directory to scan (repeatable; default: product_media and products).",
+        )
+        parser.add_argument('--dry-run', action='store_true', help="Report what would change without changing it.")
+        parser.add_argument(
+            '--delete-orphans', action='store_true',
+            help="Also delete files no product or product media row refers to.",
+        )
+
+    def handle(self, *args, **options):
+        stats = dedupe_stored_media(
+            directories=options['directories'] or ('product_media', 'products'),
+            dry_run=options['dry_run'],
+            delete_orphans=options['delete_orphans'],
+        )
+        prefix = "Would fold" if options['dry_run'] else "Folded"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} {stats.get('duplicates', 0)} duplicate files into {stats.get('blobs', 0)} blobs "
+            f"({stats.get('bytes_freed', 0) / (1024 * 1024):.1f} MB) across {stats.get('products', 0)} products; "
+            f"{stats.get('orphans', 0)} unreferenced files"
+            f"{' deleted' if options['delete_orphans'] and not options['dry_run'] else ''}, "
+            f"{stats.get('missing', 0)} referenced files missing."
+        ))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.media_jobs import run_media_jobs
+
+
+class Command(BaseCommand):
+    help = "Validate, store and build thumbnails for queued product media uploads."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep running, polling for new jobs.")
+        parser.add_argument('--interval', type=float, default=2, help="Seconds between polls with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            count = run_media_jobs()
+            if count or not options['loop']:
+                self.stdout.write(f"Processed {count} media job(s).")
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
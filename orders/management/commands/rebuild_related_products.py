@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from orders.related import rebuild_related_products
+
+
+class Command(BaseCommand):
+    help = "Rebuild the precomputed related-products index for all active products."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = rebuild_related_products(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed related products for {count} products."))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.related import run_related_refreshes
+
+
+class Command(BaseCommand):
+    help = "Refresh the related products of products queued by saves and deletes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep running, polling the queue.")
+        parser.add_argument('--interval', type=float, default=5, help="Seconds between polls with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            count = run_related_refreshes()
+            if count or not options['loop']:
+                self.stdout.write(f"Refreshed related products for {count} product(s).")
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,63 @@
+import random
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from orders import seed
+from orders.categories import invalidate_category_tree
+from orders.coupons import invalidate_active_coupons
+from orders.homepage import SOURCES, invalidate_homepage
+
+
+class Command(BaseCommand):
+    help = "Seed a synthetic catalog (categories, brands, products, media, users, carts, coupons) for load testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--categories', type=int, default=12, help="Top-level categories.")
+        parser.add_argument('--subcategories', type=int, default=6, help="Children per top-level category.")
+        parser.add_argument('--brands', type=int, default=200)
+        parser.add_argument('--media-per-product', type=int, default=2)
+        parser.add_argument('--users', type=int, default=5000)
+        parser.add_argument('--coupons', type=int, default=50)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=1, help="Random seed, for repeatable datasets.")
+        parser.add_argument(
+            '--skip-indexes', action='store_true',
+            help="Don't rebuild the search and related-products indexes afterwards.",
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+
+        parents, leaves = seed.seed_categories(rng, options['categories'], options['subcategories'])
+        brands = seed.seed_brands(options['brands'])
+        self.stdout.write(f"{len(parents) + len(leaves)} categories, {len(brands)} brands")
+
+        product_ids = seed.seed_products(
+            rng, options['products'], parents, leaves, brands,
+            media_per_product=options['media_per_product'], batch_size=batch_size,
+        )
+        self.stdout.write(f"{len(product_ids)} products")
+
+        user_ids = seed.seed_users(options['users'], batch_size=batch_size)
+        carts, wishlists = seed.seed_carts_and_wishlists(rng, user_ids, product_ids, batch_size=batch_size)
+        coupons = seed.seed_coupons(rng, options['coupons'])
+        self.stdout.write(
+            f"{len(user_ids)} users, {carts} cart rows, {wishlists} wishlist rows, {len(coupons)} coupons"
+        )
+
+        # bulk_create skips the signals that normally invalidate these
+        invalidate_category_tree()
+        invalidate_active_coupons()
+        for source in SOURCES:
+            invalidate_homepage(source)
+
+        if not options['skip_indexes']:
+            call_command('rebuild_search_index', stdout=self.stdout)
+            call_command('rebuild_related_products', batch_size=batch_size, stdout=self.stdout)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded catalog. Seed users sign in with password '{seed.SEED_PASSWORD}'."
+        ))
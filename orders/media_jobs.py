@@ -0,0 +1,248 @@
+# orders/media_jobs.py
+"""
+Background processing of uploaded product media.
+
+product_add / product_edit only move each upload into the staging area
+(MEDIA_STAGING_ROOT; a rename for uploads Django already spooled to disk)
+and queue one MediaUploadJob for the lot. A worker then, per file:
+
+1. sniffs the real type from the file's leading bytes rather than trusting
+   the browser's content type, and enforces the size limits;
+2. verifies images with Pillow;
+3. moves the file into media storage, once per distinct content
+   (orders/blobs.py);
+
+then builds the image derivatives and video poster frames (orders/images.py),
+bulk-creates the ProductMedia rows and sets product.photo from the first image
+when asked to. Progress is recorded on the job as it goes, so the admin UI can
+poll it (media_job_status).
+
+Jobs run on a background thread after the upload commits
+(MEDIA_JOBS_THREAD), or from the process_media_jobs command.
+"""
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.move import file_move_safe
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+from PIL import Image
+
+from eshop_app.models import ProductMedia
+from .blobs import release, store_blob
+from .gallery import invalidate_gallery
+from .images import generate_derivatives, generate_poster
+from .models import MediaUploadJob
+
+logger = logging.getLogger(__name__)
+
+MAX_IMAGE_SIZE = 15 * 1024 * 1024
+MAX_VIDEO_SIZE = 200 * 1024 * 1024
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='media-jobs')
+_pending = threading.Event()
+
+
+class MediaRejected(Exception):
+    """The staged file can't be used; the message is shown in the admin."""
+
+
+def staging_root():
+    return Path(getattr(settings, 'MEDIA_STAGING_ROOT', Path(settings.BASE_DIR) / 'media_staging'))
+
+
+def sniff(head):
+    """(file_type, extension) from a file's first bytes, or None if it isn't a supported image or video."""
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image', '.jpg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image', '.png'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image', '.gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image', '.webp'
+    if head[:4] == b'RIFF' and head[8:12] == b'AVI ':
+        return 'video', '.avi'
+    if head.startswith(b'\x1a\x45\xdf\xa3'):
+        return 'video', '.webm'
+    if head[4:8] == b'ftyp':
+        brand = head[8:12]
+        if brand in (b'avif', b'avis'):
+            return 'image', '.avif'
+        if brand == b'qt  ':
+            return 'video', '.mov'
+        if brand in (b'isom', b'iso2', b'mp41', b'mp42', b'avc1', b'M4V ', b'dash'):
+            return 'video', '.mp4'
+    return None
+
+
+def stage_upload(upload):
+    """Move an UploadedFile into the staging area and return its path there."""
+    root = staging_root()
+    root.mkdir(parents=True, exist_ok=True)
+    path = root / uuid.uuid4().hex
+    if hasattr(upload, 'temporary_file_path'):
+        # Already spooled to disk by the upload handler: just move it
+        file_move_safe(upload.temporary_file_path(), str(path))
+    else:
+        with open(path, 'wb') as out:
+            for chunk in upload.chunks():
+                out.write(chunk)
+    return str(path)
+
+
+def enqueue_media(product, uploads, set_primary=False):
+    """
+    Stage `uploads` ([(UploadedFile, color_name), ...]) and queue a job for them.
+    Returns the MediaUploadJob, or None if there was nothing to upload.
+    """
+    if not uploads:
+        return None
+    files = [
+        {
+            'path': stage_upload(upload),
+            'name': get_valid_filename(os.path.basename(upload.name)) or 'upload',
+            'color_name': color_name,
+        }
+        for upload, color_name in uploads
+    ]
+    job = MediaUploadJob.objects.create(product=product, files=files, set_primary=set_primary)
+    if getattr(settings, 'MEDIA_JOBS_THREAD', True):
+        transaction.on_commit(kick_media_jobs)
+    return job
+
+
+def _store(entry):
+    path = Path(entry['path'])
+    if not path.exists():
+        raise MediaRejected("The upload is missing from the staging area.")
+
+    with open(path, 'rb') as fh:
+        found = sniff(fh.read(32))
+    if found is None:
+        raise MediaRejected("Not a supported image or video.")
+    file_type, extension = found
+
+    limit = MAX_IMAGE_SIZE if file_type == 'image' else MAX_VIDEO_SIZE
+    if path.stat().st_size > limit:
+        raise MediaRejected(f"Larger than {limit // (1024 * 1024)} MB.")
+
+    if file_type == 'image':
+        try:
+            with Image.open(path) as image:
+                image.verify()
+        except Exception:
+            raise MediaRejected("The image is corrupt.")
+
+    # Stored once per content digest, with the extension of the sniffed type;
+    # the reference taken here belongs to the ProductMedia row
+    with open(path, 'rb') as fh:
+        name, _ = store_blob(File(fh), 'product_media', extension)
+    return file_type, name
+
+
+def _attach(job, stored):
+    """Create the ProductMedia rows (which own the stored references) and set the primary photo."""
+    product = job.product
+    with transaction.atomic():
+        ProductMedia.objects.bulk_create([
+            ProductMedia(
+                product=product, file=name, file_type=file_type, color_name=color_name,
+                is_primary=job.set_primary and index == 0,
+            )
+            for index, (file_type, name, color_name) in enumerate(stored)
+        ])
+        first_image = next((name for file_type, name, _ in stored if file_type == 'image'), None)
+        if job.set_primary and first_image:
+            product.photo = first_image
+            product.save(update_fields=['photo', 'updated_at'])
+        transaction.on_commit(lambda: invalidate_gallery(product.pk))
+
+
+def process_job(job):
+    stored, errors = [], []
+    try:
+        for entry in job.files:
+            try:
+                file_type, name = _store(entry)
+                stored.append((file_type, name, entry['color_name']))
+            except MediaRejected as e:
+                errors.append({'name': entry['name'], 'error': str(e)})
+            finally:
+                Path(entry['path']).unlink(missing_ok=True)
+            job.processed += 1
+            MediaUploadJob.objects.filter(pk=job.pk).update(processed=job.processed)
+
+        # Before the rows exist, so the product's post_save finds the derivatives already built
+        for file_type, name, _ in stored:
+            if file_type == 'image':
+                generate_derivatives(name)
+            else:
+                generate_poster(name)
+
+        _attach(job, stored)
+    except Exception:
+        # No ProductMedia row took over these references: drop them, or the blobs are never freed
+        for _, name, _ in stored:
+            release(name)
+        raise
+
+    job.status = 'failed' if errors and not stored else 'done'
+    job.errors = errors
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'errors', 'finished_at'])
+    return job
+
+
+def _claim():
+    with transaction.atomic():
+        job = (
+            MediaUploadJob.objects.select_for_update(skip_locked=True)
+            .filter(status='queued').order_by('id').first()
+        )
+        if job:
+            job.status = 'processing'
+            job.save(update_fields=['status'])
+        return job
+
+
+def run_media_jobs():
+    """Process queued jobs until none are left. Returns how many ran."""
+    count = 0
+    while True:
+        job = _claim()
+        if job is None:
+            return count
+        try:
+            process_job(job)
+        except Exception as e:
+            logger.exception("Media job %s failed", job.pk)
+            MediaUploadJob.objects.filter(pk=job.pk).update(
+                status='failed', errors=[{'name': '', 'error': str(e)}], finished_at=timezone.now(),
+            )
+        count += 1
+
+
+def _run_in_thread():
+    try:
+        while _pending.is_set():
+            _pending.clear()
+            run_media_jobs()
+    except Exception:
+        logger.exception("Media jobs: background run failed")
+    finally:
+        connection.close()
+
+
+def kick_media_jobs():
+    """Run queued media jobs on the background thread (at most one run queued at a time)."""
+    if not _pending.is_set():
+        _pending.set()
+        _executor.submit(_run_in_thread)
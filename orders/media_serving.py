@@ -0,0 +1,211 @@
+# orders/media_serving.py
+"""
+Serving uploaded media (product videos and images, banners, derivatives...).
+
+django.conf.urls.static sends every file whole with no validators, so a
+browser seeking in a product video or coming back to a page downloads the
+files again. serve_media() adds:
+
+- strong ETags (size + mtime) and Last-Modified, answering If-None-Match /
+  If-Modified-Since with 304 and If-Match / If-Unmodified-Since with 412;
+- single byte ranges (Range / If-Range) with 206 and 416 responses;
+- long-lived Cache-Control, marked immutable for content-addressed blobs and
+  derivatives, whose names change whenever their content does;
+- FileResponse for whole files, which the WSGI server's file_wrapper can send
+  with sendfile(). With MEDIA_ACCEL_REDIRECT set (e.g. "/protected-media/")
+  the file is handed to nginx with X-Accel-Redirect instead.
+
+MEDIA_ROOT isn't set in this project, so uploads live in the project
+directory; only the directories models upload into are served from there.
+"""
+import mimetypes
+import re
+from functools import lru_cache
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import FileField
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+DEFAULT_MAX_AGE = 60 * 60 * 24 * 30
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+CHUNK_SIZE = 64 * 1024
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# orders/blobs.py names: <sha256><ext>
+_CONTENT_ADDRESSED = re.compile(r'(^|/)[0-9a-f]{64}\.\w+$')
+
+
+@lru_cache(maxsize=None)
+def upload_directories():
+    """Top-level directories the models' file fields upload into, plus derivatives/."""
+    directories = {'derivatives'}
+    for model in apps.get_models():
+        for field in model._meta.get_fields():
+            if not isinstance(field, FileField):
+                continue
+            upload_to = field.upload_to
+            if callable(upload_to):
+                try:
+                    upload_to = upload_to(None, 'file')
+                except Exception:
+                    continue
+            directory = str(upload_to).strip('/').split('/')[0]
+            if directory:
+                directories.add(directory)
+    return frozenset(directories)
+
+
+def _resolve(path, document_root):
+    if not document_root:
+        # Uploads share the project directory with the code: serve the upload directories only
+        directory, _, path = path.partition('/')
+        if directory not in upload_directories():
+            raise Http404("Not a media file.")
+        document_root = Path(settings.BASE_DIR) / directory
+    try:
+        return Path(safe_join(document_root, path))
+    except SuspiciousFileOperation:
+        raise Http404("Not a media file.")
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single "bytes=" range, None to send the whole file
+    (no header, several ranges or one we don't understand), or False if it can't be satisfied.
+    """
+    match = _RANGE.match(header.strip()) if header else None
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    else:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if not length:
+            return False
+        start, end = max(size - length, 0), size - 1
+    if start >= size:
+        return False
+    return start, end
+
+
+class RangeFile:
+    """Reads `length` bytes of an open file starting at `start`, for FileResponse."""
+
+    def __init__(self, fh, start, length):
+        self.fh = fh
+        self.remaining = length
+        fh.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fh.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.fh.close()
+
+
+def _if_range_matches(request, etag, mtime):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    modified = parse_http_date_safe(if_range)
+    return modified is not None and int(mtime) <= modified
+
+
+def serve_media(request, path, document_root=None):
+    immutable = path.startswith('derivatives/') or bool(_CONTENT_ADDRESSED.search(path))
+    file_path = _resolve(path, document_root)
+    accel_prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT', None)
+    return serve_file(
+        request, file_path, immutable=immutable,
+        accel_redirect=accel_prefix.rstrip('/') + '/' + path if accel_prefix else None,
+    )
+
+
+def serve_file(
+    request, file_path, immutable=False, max_age=None, content_type=None, content_encoding=None,
+    accel_redirect=None,
+):
+    """
+    Response for one local file with validators, conditional and range handling and cache headers.
+    Also used for static files (orders/static_serving.py).
+    """
+    try:
+        stat = file_path.stat()
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404("Not a media file.")
+    if not file_path.is_file():
+        raise Http404("Not a media file.")
+
+    size = stat.st_size
+    etag = quote_etag(f'{stat.st_mtime_ns:x}-{size:x}')
+    if immutable:
+        max_age = IMMUTABLE_MAX_AGE
+    elif max_age is None:
+        max_age = getattr(settings, 'MEDIA_CACHE_MAX_AGE', DEFAULT_MAX_AGE)
+
+    validators = HttpResponse()
+    validators['ETag'] = etag
+    validators['Last-Modified'] = http_date(stat.st_mtime)
+    validators['Cache-Control'] = f'public, max-age={max_age}' + (', immutable' if immutable else '')
+    conditional = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime), response=validators,
+    )
+    if conditional is not validators:
+        return conditional
+
+    if content_type is None:
+        content_type, content_encoding = mimetypes.guess_type(str(file_path))
+    content_type = content_type or 'application/octet-stream'
+
+    byte_range = None
+    if request.method in ('GET', 'HEAD') and _if_range_matches(request, etag, stat.st_mtime):
+        byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    if accel_redirect:
+        # nginx serves the bytes (and the range) from its internal location
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = accel_redirect
+    elif byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        response = FileResponse(
+            RangeFile(open(file_path, 'rb'), start, length), status=206, content_type=content_type,
+        )
+        response.block_size = CHUNK_SIZE
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    else:
+        # A real file object, so the server can use sendfile() through wsgi.file_wrapper
+        response = FileResponse(open(file_path, 'rb'), content_type=content_type)
+        response['Content-Length'] = str(size)
+
+    for header in ('ETag', 'Last-Modified', 'Cache-Control'):
+        response[header] = validators[header]
+    response['Accept-Ranges'] = 'bytes'
+    if content_encoding:
+        response['Content-Encoding'] = content_encoding
+    return response
@@ -0,0 +1,171 @@
+# orders/metrics.py
+"""
+Opt-in per-request instrumentation.
+
+RequestMetricsMiddleware (enabled with REQUEST_METRICS=True in the
+environment, see eshop/settings.py) records for every request:
+
+- the number of SQL queries and the time spent in them,
+- duplicate queries, fingerprinted by their SQL with the parameters left out,
+  which is how N+1 loops show up,
+- the time spent rendering templates,
+- the response size,
+
+and reports them in a Server-Timing header (visible in the browser's network
+panel) and as one JSON log line on the "orders.metrics" logger.
+
+Per-view query budgets can be set in QUERY_BUDGETS ({url name: max queries}).
+A request over budget is logged as a warning, or raises QueryBudgetExceeded
+when QUERY_BUDGET_STRICT is set (e.g. in tests). query_budget() does the same
+check around any block of code.
+"""
+import functools
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.template.backends.django import Template
+from django.test.utils import CaptureQueriesContext
+
+logger = logging.getLogger('orders.metrics')
+
+_current = ContextVar('request_metrics', default=None)
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """More queries ran than the budget allows."""
+
+
+def fingerprint(sql):
+    """The statement with whitespace collapsed and IN lists of any length folded."""
+    return _IN_LIST.sub('IN (...)', _WHITESPACE.sub(' ', sql).strip())
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.fingerprints = Counter()
+        self._rendering = False
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper() hook
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self):
+        """{fingerprint: count} for statements run more than once, most repeated first."""
+        return {sql: count for sql, count in self.fingerprints.most_common() if count > 1}
+
+
+def _timed_render(render):
+    @functools.wraps(render)
+    def wrapper(self, context=None, request=None):
+        metrics = _current.get()
+        # Only the outermost render is timed, so nested render_to_string calls aren't counted twice
+        if metrics is None or metrics._rendering:
+            return render(self, context, request)
+        metrics._rendering = True
+        start = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - start
+            metrics._rendering = False
+    wrapper._request_metrics = True
+    return wrapper
+
+
+def _instrument_templates():
+    if not getattr(Template.render, '_request_metrics', False):
+        Template.render = _timed_render(Template.render)
+
+
+def _check_budget(name, queries, strict):
+    budget = getattr(settings, 'QUERY_BUDGETS', {}).get(name)
+    if budget is None or queries <= budget:
+        return
+    message = f"{name} ran {queries} queries (budget {budget})"
+    if strict:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+@contextmanager
+def query_budget(limit, using=DEFAULT_DB_ALIAS):
+    """Fail with QueryBudgetExceeded if the block runs more than `limit` queries."""
+    with CaptureQueriesContext(connections[using]) as captured:
+        yield captured
+    if len(captured) > limit:
+        repeated = Counter(fingerprint(query['sql']) for query in captured.captured_queries)
+        worst = ', '.join(f"{count}x {sql[:80]}" for sql, count in repeated.most_common(3) if count > 1)
+        raise QueryBudgetExceeded(
+            f"{len(captured)} queries, budget {limit}" + (f"; repeated: {worst}" if worst else "")
+        )
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        _instrument_templates()
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - start
+
+        size = None if response.streaming else len(response.content)
+        duplicates = metrics.duplicates()
+        timings = [
+            f'db;dur={metrics.sql_time * 1000:.2f};desc="{metrics.queries} queries, '
+            f'{sum(duplicates.values())} duplicated"',
+            f'tpl;dur={metrics.template_time * 1000:.2f};desc="templates"',
+            f'total;dur={total * 1000:.2f}',
+        ]
+        if size is not None:
+            timings.append(f'size;desc="{size} bytes"')
+        response['Server-Timing'] = ', '.join(timings)
+
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': view_name,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'sql_count': metrics.queries,
+            'sql_ms': round(metrics.sql_time * 1000, 2),
+            'template_ms': round(metrics.template_time * 1000, 2),
+            'bytes': size,
+            'duplicates': [
+                {'sql': sql[:200], 'count': count} for sql, count in list(duplicates.items())[:5]
+            ],
+        }))
+
+        if view_name:
+            _check_budget(view_name, metrics.queries, getattr(settings, 'QUERY_BUDGET_STRICT', False))
+        return response
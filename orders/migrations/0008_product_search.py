@@ -0,0 +1,51 @@
+from django.db import migrations
+
+# Keep in sync with PG_DOCUMENT in orders/search.py
+PG_INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS product_search_gin ON eshop_app_product USING GIN (
+    to_tsvector('english',
+        coalesce("eshop_app_product"."title", '') || ' ' ||
+        coalesce("eshop_app_product"."summary", '') || ' ' ||
+        coalesce("eshop_app_product"."description", ''))
+)
+"""
+
+SQLITE_TABLE_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS product_search
+USING fts5(title, summary, description, tokenize='porter unicode61')
+"""
+
+SQLITE_BACKFILL_SQL = """
+INSERT INTO product_search (rowid, title, summary, description)
+SELECT id, coalesce(title, ''), coalesce(summary, ''), coalesce(description, '')
+FROM eshop_app_product
+"""
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(PG_INDEX_SQL)
+    elif vendor == 'sqlite':
+        schema_editor.execute(SQLITE_TABLE_SQL)
+        schema_editor.execute(SQLITE_BACKFILL_SQL)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS product_search_gin")
+    elif vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS product_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eshop_app', '0032_product_deal_end_date'),
+        ('orders', '0007_relatedproduct'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2 on 2026-10-18 17:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from orders.facets import color_values, size_values
+
+
+def backfill_facets(apps, schema_editor):
+    Product = apps.get_model('eshop_app', 'Product')
+    ProductColor = apps.get_model('orders', 'ProductColor')
+    ProductSize = apps.get_model('orders', 'ProductSize')
+
+    colors, sizes = [], []
+    for product_id, color_data, size in Product.objects.values_list('id', 'color_data', 'size').iterator():
+        colors.extend(ProductColor(product_id=product_id, value=value) for value in color_values(color_data))
+        sizes.extend(ProductSize(product_id=product_id, value=value) for value in size_values(size))
+    ProductColor.objects.bulk_create(colors, batch_size=1000)
+    ProductSize.objects.bulk_create(sizes, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eshop_app', '0032_product_deal_end_date'),
+        ('orders', '0008_product_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductColor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.CharField(max_length=50)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='color_facets', to='eshop_app.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['value', 'product'], name='product_color_value_idx')],
+                'unique_together': {('product', 'value')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSize',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.CharField(max_length=20)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='size_facets', to='eshop_app.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['value', 'product'], name='product_size_value_idx')],
+                'unique_together': {('product', 'value')},
+            },
+        ),
+        migrations.RunPython(backfill_facets, migrations.RunPython.noop),
+    ]
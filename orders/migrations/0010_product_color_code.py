@@ -0,0 +1,36 @@
+# Generated by Django 5.2 on 2026-10-18 17:56
+
+from django.db import migrations, models
+
+from orders.facets import color_values
+
+
+def backfill_codes(apps, schema_editor):
+    Product = apps.get_model('eshop_app', 'Product')
+    ProductColor = apps.get_model('orders', 'ProductColor')
+
+    codes = {
+        product_id: color_values(color_data)
+        for product_id, color_data in Product.objects.values_list('id', 'color_data').iterator()
+    }
+    updated = []
+    for facet in ProductColor.objects.all().iterator():
+        facet.code = codes.get(facet.product_id, {}).get(facet.value, '')
+        updated.append(facet)
+    ProductColor.objects.bulk_update(updated, ['code'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_product_facets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productcolor',
+            name='code',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.RunPython(backfill_codes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-18 18:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eshop_app', '0034_storefront_indexes'),
+        ('orders', '0014_image_derivative'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaUploadJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('files', models.JSONField(default=list)),
+                ('set_primary', models.BooleanField(default=False)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('processed', models.PositiveIntegerField(default=0)),
+                ('errors', models.JSONField(blank=True, default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='media_jobs', to='eshop_app.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='media_job_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-18 18:56
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eshop_app', '0035_product_category_updated_at'),
+        ('orders', '0019_outgoing_email_sending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedProductRefresh',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('queued_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='related_refresh', to='eshop_app.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['queued_at'], name='related_refresh_queue_idx')],
+            },
+        ),
+    ]
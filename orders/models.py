@@ -1,7 +1,8 @@
 # orders/models.py
 from django.db import models
 from django.conf import settings  # <-- import settings
-from eshop_app.models import Product
+from django.utils import timezone
+from eshop_app.models import Coupon, Product
 
 
 class Wishlist(models.Model):
@@ -86,3 +87,294 @@ class Address(models.Model):
         return f"{self.full_name} - {self.city} ({self.address_type})"
     
 
+
+
+class RelatedProduct(models.Model):
+    """
+    Precomputed "related products" for the product detail page.
+    One row per (product, related) pair, ranked best-first; rebuilt by
+    `manage.py rebuild_related_products` and refreshed in the background when
+    a product is saved (see RelatedProductRefresh).
+    A product with nothing related has one row with related=None.
+    """
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='related_entries'
+    )
+    related = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='related_from'
+    )
+    rank = models.PositiveSmallIntegerField()
+    score = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('product', 'related')
+        indexes = [
+            models.Index(fields=['product', 'rank'], name='related_product_rank_idx'),
+        ]
+        ordering = ['product', 'rank']
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} (#{self.rank})"
+
+
+class RelatedProductRefresh(models.Model):
+    """
+    A product whose RelatedProduct rows are out of date, waiting for
+    orders.related.run_related_refreshes(). Queued again (queued_at moves on)
+    if it changes while being refreshed.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='related_refresh')
+    queued_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['queued_at'], name='related_refresh_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"Refresh related products of {self.product_id}"
+
+
+class ProductColor(models.Model):
+    """
+    Colour facet of a product: one row per normalized colour name in
+    Product.color_data. Maintained by orders.facets.sync_product_facets().
+    """
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='color_facets'
+    )
+    value = models.CharField(max_length=50)
+    code = models.CharField(max_length=20, blank=True, default='')  # swatch colour for the sidebar
+
+    class Meta:
+        unique_together = ('product', 'value')
+        indexes = [
+            models.Index(fields=['value', 'product'], name='product_color_value_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} - {self.value}"
+
+
+class ProductSize(models.Model):
+    """
+    Size facet of a product: one row per normalized size in the comma-joined
+    Product.size. Maintained by orders.facets.sync_product_facets().
+    """
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='size_facets'
+    )
+    value = models.CharField(max_length=20)
+
+    class Meta:
+        unique_together = ('product', 'value')
+        indexes = [
+            models.Index(fields=['value', 'product'], name='product_size_value_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} - {self.value}"
+
+
+class Order(models.Model):
+    STATUS_CHOICES = [
+        ('placed', 'Placed'),
+        ('processing', 'Processing'),
+        ('shipped', 'Shipped'),
+        ('delivered', 'Delivered'),
+        ('cancelled', 'Cancelled'),
+    ]
+    PAYMENT_CHOICES = [
+        ('cod', 'Cash on Delivery'),
+    ]
+
+    order_number = models.CharField(max_length=20, unique=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='orders'
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='placed')
+    payment_method = models.CharField(max_length=20, choices=PAYMENT_CHOICES, default='cod')
+
+    # Billing / shipping details as entered at checkout
+    first_name = models.CharField(max_length=100)
+    last_name = models.CharField(max_length=100)
+    email = models.EmailField()
+    phone = models.CharField(max_length=15)
+    address = models.TextField()
+
+    # Price snapshot taken inside the checkout transaction
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2)
+    product_discount_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    coupon_code = models.CharField(max_length=50, blank=True, default='')
+    coupon_discount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    shipping = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    total = models.DecimalField(max_digits=12, decimal_places=2)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='order_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.order_number} ({self.get_status_display()})"
+
+
+class OrderLine(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='lines')
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='order_lines'
+    )
+    # Snapshot of the product as sold, so later edits don't rewrite history
+    title = models.CharField(max_length=200)
+    size = models.CharField(max_length=10, blank=True, default='')
+    color = models.CharField(max_length=50, blank=True, default='')
+    selected_image = models.URLField(blank=True, default='')
+    quantity = models.PositiveIntegerField()
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    discount_percent = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    line_discount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    line_total = models.DecimalField(max_digits=12, decimal_places=2)
+    shipping_charge = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.order.order_number} - {self.title} (x{self.quantity})"
+
+
+class CouponRedemption(models.Model):
+    """One row per order that used a coupon; Coupon.used_count is the running total."""
+    coupon = models.ForeignKey(Coupon, on_delete=models.CASCADE, related_name='redemptions')
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='coupon_redemptions'
+    )
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='coupon_redemption')
+    discount = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Per-user limit check: COUNT(*) WHERE coupon_id = ? AND user_id = ?
+            models.Index(fields=['coupon', 'user'], name='coupon_redemption_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.coupon_id} - {self.order_id}"
+
+
+class OutgoingEmail(models.Model):
+    """A message waiting in the outbox; delivered by orders.outbox.deliver_outbox."""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=998)
+    body = models.TextField(blank=True, default='')
+    html_body = models.TextField(blank=True, default='')
+    from_email = models.CharField(max_length=254, blank=True, default='')
+    to = models.JSONField(default=list)
+    cc = models.JSONField(default=list, blank=True)
+    bcc = models.JSONField(default=list, blank=True)
+    reply_to = models.JSONField(default=list, blank=True)
+    headers = models.JSONField(default=dict, blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    # Not before this time; pushed back after each failed attempt
+    send_after = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'send_after'], name='outgoing_email_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
+
+
+class ImageDerivative(models.Model):
+    """A resized, recompressed copy of an uploaded image (see orders/images.py)."""
+    source = models.CharField(max_length=255)  # storage name of the original
+    width = models.PositiveIntegerField()
+    format = models.CharField(max_length=10)
+    name = models.CharField(max_length=255)  # storage name of the derivative
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('source', 'width', 'format')
+
+    def __str__(self):
+        return self.name
+
+
+class MediaUploadJob(models.Model):
+    """Uploaded product media waiting in the staging area (see orders/media_jobs.py)."""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='media_jobs')
+    # Staged uploads: [{"path", "name", "color_name"}, ...] in upload order
+    files = models.JSONField(default=list)
+    # The first image becomes product.photo when the product has none yet
+    set_primary = models.BooleanField(default=False)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    processed = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='media_job_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Media job {self.pk} for product {self.product_id} ({self.status})"
+
+
+class MediaBlob(models.Model):
+    """One stored copy of a product image or video, shared by every row that uses it (see orders/blobs.py)."""
+    digest = models.CharField(max_length=64, unique=True)  # SHA-256 of the content
+    name = models.CharField(max_length=255, unique=True)  # storage name
+    size = models.PositiveBigIntegerField(default=0)
+    # ProductMedia.file and Product.photo values pointing at this blob
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
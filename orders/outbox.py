@@ -0,0 +1,232 @@
+# orders/outbox.py
+"""
+Queued email delivery.
+
+EMAIL_BACKEND points at OutboxEmailBackend, so send_mail(), the password reset
+form and anything else that sends mail only insert OutgoingEmail rows inside
+the request. deliver_outbox() sends due messages in batches over a single
+connection of the real backend (EMAIL_DELIVERY_BACKEND, SMTP in production,
+locmem or filebased locally), retrying failures with exponential backoff.
+
+A batch is claimed in a short transaction (status 'sending', attempts bumped,
+send_after pushed CLAIM_TIMEOUT ahead as a lease) and sent after it commits,
+so no row lock is held across the SMTP round-trips. A worker that dies
+mid-batch leaves its rows in 'sending'; they are picked up again once the
+lease runs out.
+
+In production run the send_queued_email command on a schedule (a cron job,
+or a long-running worker with --loop): it is what retries failed messages
+and recovers interrupted batches regardless of new mail coming in. With
+EMAIL_OUTBOX_THREAD on, a background thread is also kicked after each
+enqueueing transaction commits, and while retries are pending it re-arms
+itself for the next one (at least every SWEEP_INTERVAL seconds) as long as
+the process lives.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import connection as db_connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 5
+# How long a claimed batch may take before other workers may send it again
+CLAIM_TIMEOUT = timedelta(minutes=10)
+SWEEP_INTERVAL = 60
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='outbox')
+_pending = threading.Event()
+_timer_lock = threading.Lock()
+_timer = None
+
+
+def delivery_backend():
+    return getattr(settings, 'EMAIL_DELIVERY_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+
+
+class OutboxEmailBackend(BaseEmailBackend):
+    """Email backend that stores messages in the outbox instead of sending them."""
+
+    def send_messages(self, email_messages):
+        queued, direct = [], []
+        for message in email_messages:
+            if not message.recipients():
+                continue
+            if message.attachments:
+                # Attachments aren't stored in the outbox; hand these straight over
+                direct.append(message)
+                continue
+            html = next(
+                (content for content, mimetype in getattr(message, 'alternatives', []) if mimetype == 'text/html'),
+                '',
+            )
+            queued.append(OutgoingEmail(
+                subject=message.subject,
+                body=message.body,
+                html_body=html,
+                from_email=message.from_email or '',
+                to=list(message.to),
+                cc=list(message.cc),
+                bcc=list(message.bcc),
+                reply_to=list(message.reply_to),
+                headers=dict(message.extra_headers),
+            ))
+
+        if queued:
+            OutgoingEmail.objects.bulk_create(queued)
+            if getattr(settings, 'EMAIL_OUTBOX_THREAD', False):
+                transaction.on_commit(kick_outbox)
+        sent = len(queued)
+        if direct:
+            sent += get_connection(delivery_backend(), fail_silently=self.fail_silently).send_messages(direct)
+        return sent
+
+
+def _message(email, connection):
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email or None,
+        to=email.to,
+        cc=email.cc,
+        bcc=email.bcc,
+        reply_to=email.reply_to,
+        headers=email.headers,
+        connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    return message
+
+
+def _retry_delay(attempts):
+    return timedelta(minutes=2 ** attempts)
+
+
+def _claim(batch_size, max_attempts):
+    """Mark a batch of due messages as being sent by this worker and return it."""
+    now = timezone.now()
+    with transaction.atomic():
+        # Interrupted sends that have used up their attempts are given up on
+        OutgoingEmail.objects.filter(
+            status='sending', send_after__lte=now, attempts__gte=max_attempts,
+        ).update(status='failed', last_error='Delivery was interrupted.')
+
+        # skip_locked lets several workers claim batches at the same time
+        batch = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(status__in=('queued', 'sending'), send_after__lte=now)
+            .order_by('send_after', 'id')[:batch_size]
+        )
+        if batch:
+            OutgoingEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+                status='sending', attempts=F('attempts') + 1, send_after=now + CLAIM_TIMEOUT,
+            )
+            for email in batch:
+                email.status = 'sending'
+                email.attempts += 1
+    return batch
+
+
+def deliver_outbox(batch_size=BATCH_SIZE, max_attempts=MAX_ATTEMPTS):
+    """Claim and send one batch of due messages. Returns (sent, failed)."""
+    batch = _claim(batch_size, max_attempts)
+    if not batch:
+        return 0, 0
+
+    sent = failed = 0
+    connection = get_connection(delivery_backend())
+    try:
+        connection.open()
+    except Exception as e:
+        # Nothing can go out; push the whole batch back
+        logger.warning("Outbox: could not connect to the mail server: %s", e)
+        connection = None
+        error = str(e)
+
+    for email in batch:
+        if connection is not None:
+            try:
+                _message(email, connection).send()
+            except Exception as e:
+                error = str(e)
+                # A broken connection would fail the rest of the batch too
+                connection.close()
+            else:
+                email.status = 'sent'
+                email.sent_at = timezone.now()
+                email.last_error = ''
+                email.save(update_fields=['status', 'sent_at', 'last_error'])
+                sent += 1
+                continue
+
+        email.last_error = error
+        if email.attempts >= max_attempts:
+            email.status = 'failed'
+        else:
+            email.status = 'queued'
+            email.send_after = timezone.now() + _retry_delay(email.attempts)
+        email.save(update_fields=['status', 'last_error', 'send_after'])
+        failed += 1
+
+    if connection is not None:
+        connection.close()
+    return sent, failed
+
+
+def drain_outbox(batch_size=BATCH_SIZE):
+    """Deliver batches until nothing due is left. Returns (sent, failed)."""
+    total_sent = total_failed = 0
+    while True:
+        sent, failed = deliver_outbox(batch_size)
+        total_sent += sent
+        total_failed += failed
+        if sent + failed < batch_size:
+            return total_sent, total_failed
+
+
+def _schedule_sweep():
+    """Kick the thread again when the next retry or claim lease falls due."""
+    global _timer
+    next_due = (
+        OutgoingEmail.objects.filter(status__in=('queued', 'sending'))
+        .order_by('send_after').values_list('send_after', flat=True).first()
+    )
+    if next_due is None:
+        return
+    delay = min(max((next_due - timezone.now()).total_seconds(), 1), SWEEP_INTERVAL)
+    with _timer_lock:
+        if _timer is not None:
+            _timer.cancel()
+        _timer = threading.Timer(delay, kick_outbox)
+        _timer.daemon = True
+        _timer.start()
+
+
+def _run_in_thread():
+    try:
+        while _pending.is_set():
+            _pending.clear()
+            drain_outbox()
+        _schedule_sweep()
+    except Exception:
+        logger.exception("Outbox: background delivery failed")
+    finally:
+        db_connection.close()
+
+
+def kick_outbox():
+    """Deliver queued mail on the background thread (at most one run queued at a time)."""
+    if not _pending.is_set():
+        _pending.set()
+        _executor.submit(_run_in_thread)
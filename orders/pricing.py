@@ -0,0 +1,152 @@
+# orders/pricing.py
+"""
+Single-pass cart pricing shared by the cart, coupon and checkout views.
+
+A cart is priced with one query and the resulting breakdown is immutable.
+It is memoised on the request and kept in the shared cache (CACHES in
+eshop/settings.py) per user until a Cart row (or a Product in that cart)
+changes; see orders/signals.py. Every worker reads the same entry, so an
+invalidation in one process is seen by all of them.
+"""
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.core.cache import cache
+
+from .models import Cart
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+CACHE_TIMEOUT = 60 * 15
+
+
+def _money(value):
+    return Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+@dataclass(frozen=True)
+class PriceLine:
+    product: object
+    quantity: int
+    price: Decimal
+    discount_percent: Decimal
+    per_unit_discount: Decimal
+    line_original: Decimal
+    line_discount: Decimal
+    line_after_discount: Decimal
+    shipping_charge: Decimal
+    item_id: int = None
+    size: str = 'N/A'
+    color: str = 'N/A'
+    selected_image: str = ''
+
+    @property
+    def line_total(self):
+        return self.line_after_discount
+
+
+@dataclass(frozen=True)
+class CartPricing:
+    lines: tuple
+    subtotal: Decimal
+    product_discount_total: Decimal
+    shipping: Decimal
+
+    def __bool__(self):
+        return bool(self.lines)
+
+    def coupon_amount(self, discount_type, discount_value):
+        """Coupon discount, calculated on the subtotal only (before shipping)."""
+        discount_value = Decimal(discount_value or 0)
+        if discount_type == 'percent':
+            return _money(self.subtotal * discount_value / Decimal('100'))
+        return _money(min(discount_value, self.subtotal))
+
+    def total(self, coupon_amount=ZERO):
+        """Final total: (subtotal - coupon) + shipping."""
+        return _money(self.subtotal - coupon_amount + self.shipping)
+
+
+def price_line(product, quantity, item=None):
+    """Price a single product line (a cart row or a buy-now selection)."""
+    qty = quantity or 1
+    price = _money(product.price or 0)
+    discount_percent = Decimal(product.discount or 0)
+
+    per_unit_discount = _money(price * discount_percent / 100) if discount_percent > 0 else ZERO
+    line_original = _money(price * qty)
+    line_discount = _money(per_unit_discount * qty)
+    line_after_discount = _money(line_original - line_discount)
+
+    if product.is_free_shipping or not product.shipping_charge:
+        shipping_charge = ZERO
+    else:
+        shipping_charge = _money(product.shipping_charge)
+
+    extra = {}
+    if item is not None:
+        extra = {
+            'item_id': item.id,
+            'size': item.size or 'N/A',
+            'color': item.color or 'N/A',
+            'selected_image': item.selected_image or (product.photo.url if product.photo else ''),
+        }
+
+    return PriceLine(
+        product=product,
+        quantity=qty,
+        price=price,
+        discount_percent=discount_percent,
+        per_unit_discount=per_unit_discount,
+        line_original=line_original,
+        line_discount=line_discount,
+        line_after_discount=line_after_discount,
+        shipping_charge=shipping_charge,
+        **extra,
+    )
+
+
+def build_pricing(lines):
+    """Total up priced lines into a CartPricing."""
+    return CartPricing(
+        lines=tuple(lines),
+        subtotal=_money(sum((line.line_after_discount for line in lines), ZERO)),
+        product_discount_total=_money(sum((line.line_discount for line in lines), ZERO)),
+        shipping=_money(sum((line.shipping_charge for line in lines), ZERO)),
+    )
+
+
+def price_buy_now(product, quantity):
+    """Price a single buy-now selection with the same rules as the cart."""
+    return build_pricing([price_line(product, quantity)])
+
+
+def cart_cache_key(user_id):
+    return f'cart_pricing:{user_id}'
+
+
+def invalidate_cart_pricing(*user_ids):
+    cache.delete_many([cart_cache_key(user_id) for user_id in user_ids])
+
+
+def get_cart_pricing(request):
+    """
+    Return the CartPricing for the logged-in user's cart.
+    Computed at most once per request and once per cart change.
+    """
+    pricing = getattr(request, '_cart_pricing', None)
+    if pricing is not None:
+        return pricing
+    if not request.user.is_authenticated:
+        # Carts belong to users; an anonymous visitor's is always empty
+        return build_pricing([])
+
+    key = cart_cache_key(request.user.pk)
+    pricing = cache.get(key)
+    if pricing is None:
+        items = Cart.objects.filter(user=request.user).select_related('product').order_by('id')
+        pricing = build_pricing([price_line(item.product, item.quantity, item) for item in items])
+        cache.set(key, pricing, CACHE_TIMEOUT)
+
+    request._cart_pricing = pricing
+    return pricing
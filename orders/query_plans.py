@@ -0,0 +1,191 @@
+# orders/query_plans.py
+"""
+Storefront queries whose plans are checked by `manage.py check_query_plans`.
+
+Each entry builds its queryset with the same helper the view or cache
+builder named in its comment calls (orders/listing.py, orders/facets.py,
+orders/homepage.py, orders/coupons.py), with sample categories and cursors
+taken from the database, so the EXPLAIN output is the plan of the query that
+actually ships and shows whether the indexes declared on the models are used.
+"""
+from django.db.models import Q
+from django.utils import timezone
+
+from eshop_app.models import Blog, Brand, Category, Client, Product
+from .categories import get_category_tree
+from .coupons import unexpired_coupons
+from .facets import facet_querysets
+from .homepage import banners_queryset, deals_queryset, featured_queryset, grid_queryset
+from .listing import category_filter, page_queryset, paginate_products
+
+STOREFRONT_QUERIES = {}
+
+
+def storefront_query(name):
+    def register(builder):
+        STOREFRONT_QUERIES[name] = builder
+        return builder
+    return register
+
+
+def _active_products():
+    return Product.objects.filter(status='active')
+
+
+def _sample_category(parent):
+    """An active parent with children (parent=True) or an active child category; None if there is none."""
+    tree = get_category_tree()
+    for category in tree.nodes.values():
+        if category.status != 'active':
+            continue
+        if parent and category.is_parent and tree.active_children(category.id):
+            return category
+        if not parent and not category.is_parent:
+            return category
+    return None
+
+
+def _category_filter(parent):
+    category = _sample_category(parent)
+    # No such category: the plan of a filter matching nothing is still the same shape
+    return category_filter(category, get_category_tree()) if category else Q(category_id=0)
+
+
+def _second_page(products, sort_option):
+    """Page two of a listing, with the cursor the first page hands out."""
+    _, cursor = paginate_products(products, sort_option)
+    queryset, _ = page_queryset(products, sort_option, cursor)
+    return queryset
+
+
+# shop_all_products / listing.paginate_products, "low_to_high" sort (the shop default)
+@storefront_query('products_by_price')
+def products_by_price():
+    return page_queryset(_active_products(), 'low_to_high')[0]
+
+
+# listing.paginate_products, "low_to_high" sort, next page (keyset cursor)
+@storefront_query('products_by_price_cursor')
+def products_by_price_cursor():
+    return _second_page(_active_products(), 'low_to_high')
+
+
+# listing.paginate_products, "newest" sort (shop_by_category / shop_by_brand default)
+@storefront_query('products_newest')
+def products_newest():
+    return page_queryset(_active_products(), 'newest')[0]
+
+
+# listing.paginate_products, "newest" sort, next page (keyset cursor)
+@storefront_query('products_newest_cursor')
+def products_newest_cursor():
+    return _second_page(_active_products(), 'newest')
+
+
+# shop_by_category / shop_all_products?category= on a parent category
+@storefront_query('category_products_by_price')
+def category_products_by_price():
+    return page_queryset(_active_products().filter(_category_filter(parent=True)), 'low_to_high')[0]
+
+
+# shop_by_category on a child category, next page
+@storefront_query('child_category_products_cursor')
+def child_category_products_cursor():
+    return _second_page(_active_products().filter(_category_filter(parent=False)), 'newest')
+
+
+def _facet(name):
+    # shop_all_products sidebar with a parent category selected
+    return facet_querysets(_active_products(), {'category': _category_filter(parent=True)})[name]
+
+
+# facets.facet_counts: category roll-up, brand, size, colour and price facets
+@storefront_query('facet_categories')
+def facet_categories():
+    return _facet('category')
+
+
+@storefront_query('facet_brands')
+def facet_brands():
+    return _facet('brand')
+
+
+@storefront_query('facet_sizes')
+def facet_sizes():
+    return _facet('size')
+
+
+@storefront_query('facet_colors')
+def facet_colors():
+    return _facet('color')
+
+
+@storefront_query('facet_prices')
+def facet_prices():
+    return _facet('price')
+
+
+# homepage._featured
+@storefront_query('featured_products')
+def featured_products():
+    return featured_queryset()
+
+
+# homepage._deals
+@storefront_query('deal_products')
+def deal_products():
+    return deals_queryset()
+
+
+# homepage._grid, "all"
+@storefront_query('homepage_grid')
+def homepage_grid():
+    return grid_queryset('all')
+
+
+# homepage._grid, "new-arrivals"
+@storefront_query('new_arrivals')
+def new_arrivals():
+    return grid_queryset('new-arrivals')
+
+
+# homepage._grid, "hot-sales"
+@storefront_query('hot_sales')
+def hot_sales():
+    return grid_queryset('hot-sales')
+
+
+# coupons.get_active_coupons
+@storefront_query('active_coupons')
+def active_coupons():
+    return unexpired_coupons(timezone.now())
+
+
+# landing_blog
+@storefront_query('published_blogs')
+def published_blogs():
+    return Blog.objects.filter(status=1).order_by('-publish_date')[:10]
+
+
+# homepage._banners
+@storefront_query('active_banners')
+def active_banners():
+    return banners_queryset()
+
+
+# shop sidebar brands
+@storefront_query('active_brands')
+def active_brands():
+    return Brand.objects.filter(status='active').order_by('title')
+
+
+# product_add / product_edit parent category choices
+@storefront_query('parent_categories')
+def parent_categories():
+    return Category.objects.filter(is_parent=True, status='active').order_by('title')
+
+
+# landing_about_us
+@storefront_query('active_clients')
+def active_clients():
+    return Client.objects.filter(status='active').order_by('id')
@@ -0,0 +1,292 @@
+# orders/related.py
+"""
+Related-products index for the product detail page.
+
+Candidates come from the same top-level category tree (the old behaviour),
+scored by shared category, brand and colours with recency (higher id) as the
+tie-breaker. The top RELATED_LIMIT per product are stored in RelatedProduct,
+so the detail page reads them with one indexed lookup. A product with no
+related products gets a single row with related=None, so "indexed, nothing
+related" is told apart from "not indexed yet".
+
+Saving a product only queues it (RelatedProductRefresh) once the save
+commits; deleting one queues the products that listed it, before the cascade
+removes their rows. A background thread (RELATED_PRODUCTS_THREAD) or the
+refresh_related_products command then recomputes each queued product's list
+and the lists it can appear in (the products that listed it before and the
+ones it now lists), outside the request. The detail page never writes: a
+product that isn't indexed yet is ranked on the fly until its refresh or
+rebuild_related_products stores its list.
+"""
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from eshop_app.models import Product
+from .categories import get_category_tree
+from .models import RelatedProduct, RelatedProductRefresh
+
+logger = logging.getLogger(__name__)
+
+RELATED_LIMIT = 8
+
+# How many recent candidates to pull from each bucket before scoring
+CANDIDATES_PER_BUCKET = 50
+
+SAME_CATEGORY_SCORE = 4
+SAME_BRAND_SCORE = 2
+SHARED_COLOR_SCORE = 1
+
+PRODUCT_FIELDS = ('id', 'category_id', 'child_category_id', 'brand_id', 'color_data')
+
+REFRESH_BATCH_SIZE = 100
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='related-products')
+_pending = threading.Event()
+
+
+def _top_category_map():
+    """Map every category id to the id of its top-level ancestor."""
+    tree = get_category_tree()
+    return {category_id: tree.root(category_id).id for category_id in tree.nodes}
+
+
+def _color_set(color_data):
+    return {
+        color.get('name', '').casefold()
+        for color in color_data or []
+        if isinstance(color, dict) and color.get('name')
+    }
+
+
+def _score(row, candidate):
+    score = 0
+    leaf = row['child_category_id'] or row['category_id']
+    if leaf and leaf in (candidate['child_category_id'], candidate['category_id']):
+        score += SAME_CATEGORY_SCORE
+    if row['brand_id'] and row['brand_id'] == candidate['brand_id']:
+        score += SAME_BRAND_SCORE
+    score += SHARED_COLOR_SCORE * len(row['colors'] & candidate['colors'])
+    return score
+
+
+def _rank(row, candidates, limit=RELATED_LIMIT):
+    scored = [
+        (_score(row, candidate), candidate['id'])
+        for candidate in candidates
+        if candidate['id'] != row['id']
+    ]
+    # Best score first, most recent first among equals
+    scored.sort(reverse=True)
+    return scored[:limit]
+
+
+def _rows(queryset):
+    rows = []
+    for row in queryset.values(*PRODUCT_FIELDS):
+        row['colors'] = _color_set(row.pop('color_data'))
+        rows.append(row)
+    return rows
+
+
+def _entries(product_id, ranked):
+    if not ranked:
+        # Marker: indexed, nothing related
+        return [RelatedProduct(product_id=product_id, related=None, rank=0, score=0)]
+    return [
+        RelatedProduct(product_id=product_id, related_id=related_id, rank=rank, score=score)
+        for rank, (score, related_id) in enumerate(ranked)
+    ]
+
+
+def _save(product_id, ranked):
+    RelatedProduct.objects.filter(product_id=product_id).delete()
+    RelatedProduct.objects.bulk_create(_entries(product_id, ranked))
+
+
+def _product_row(product):
+    return {
+        'id': product.pk,
+        'category_id': product.category_id,
+        'child_category_id': product.child_category_id,
+        'brand_id': product.brand_id,
+        'colors': _color_set(product.color_data),
+    }
+
+
+def _rank_product(row, tops):
+    """Rank candidates for one product row (active products only); reads, never writes."""
+    top = tops.get(row['category_id'])
+    if top is None:
+        return []
+
+    tree_ids = [category_id for category_id, top_id in tops.items() if top_id == top]
+    active = Product.objects.filter(status='active', category_id__in=tree_ids).order_by('-id')
+
+    leaf = row['child_category_id'] or row['category_id']
+    buckets = [active[:CANDIDATES_PER_BUCKET]]
+    if leaf:
+        buckets.append(active.filter(category_id=leaf)[:CANDIDATES_PER_BUCKET])
+        buckets.append(active.filter(child_category_id=leaf)[:CANDIDATES_PER_BUCKET])
+    if row['brand_id']:
+        buckets.append(active.filter(brand_id=row['brand_id'])[:CANDIDATES_PER_BUCKET])
+
+    candidates = {}
+    for bucket in buckets:
+        for candidate in _rows(bucket):
+            candidates[candidate['id']] = candidate
+    return _rank(row, candidates.values())
+
+
+def refresh_related_products(product):
+    """
+    Recompute and store the related products of a product and of the products
+    whose lists it can change: those that listed it and those it now lists.
+    """
+    tops = _top_category_map()
+
+    with transaction.atomic():
+        affected = set(
+            RelatedProduct.objects.filter(related_id=product.pk).values_list('product_id', flat=True)
+        )
+        ranked = _rank_product(_product_row(product), tops) if product.status == 'active' else []
+        _save(product.pk, ranked)
+
+        affected.update(related_id for _, related_id in ranked)
+        affected.discard(product.pk)
+        neighbours = _rows(Product.objects.filter(pk__in=affected, status='active'))
+        for row in neighbours:
+            _save(row['id'], _rank_product(row, tops))
+        # Neighbours that are no longer active don't list anything
+        inactive = affected - {row['id'] for row in neighbours}
+        if inactive:
+            RelatedProduct.objects.filter(product_id__in=inactive).delete()
+            RelatedProduct.objects.bulk_create([
+                entry for product_id in inactive for entry in _entries(product_id, [])
+            ])
+
+
+def queue_related_refresh(*product_ids):
+    """Queue products for run_related_refreshes() (call once the change has committed)."""
+    product_ids = {product_id for product_id in product_ids if product_id}
+    if not product_ids:
+        return
+    now = timezone.now()
+    RelatedProductRefresh.objects.bulk_create(
+        [RelatedProductRefresh(product_id=product_id, queued_at=now) for product_id in product_ids],
+        update_conflicts=True,
+        unique_fields=['product'],
+        update_fields=['queued_at'],
+    )
+    if getattr(settings, 'RELATED_PRODUCTS_THREAD', True):
+        kick_related_refreshes()
+
+
+def run_related_refreshes(batch_size=REFRESH_BATCH_SIZE):
+    """Refresh queued products until the queue is empty. Returns how many were refreshed."""
+    count = 0
+    while True:
+        queued = list(
+            RelatedProductRefresh.objects.order_by('queued_at').values_list('product_id', 'queued_at')[:batch_size]
+        )
+        if not queued:
+            return count
+        products = Product.objects.in_bulk([product_id for product_id, _ in queued])
+        for product_id, queued_at in queued:
+            # Deleted products take their queue entry with them
+            if product_id in products:
+                try:
+                    refresh_related_products(products[product_id])
+                except Exception:
+                    # Don't hold up the queue; the product's next save queues it again
+                    logger.exception("Related products: refreshing product %s failed", product_id)
+            # Left in place if the product was queued again meanwhile
+            RelatedProductRefresh.objects.filter(product_id=product_id, queued_at=queued_at).delete()
+            count += 1
+
+
+def _run_in_thread():
+    try:
+        while _pending.is_set():
+            _pending.clear()
+            run_related_refreshes()
+    except Exception:
+        logger.exception("Related products: background refresh failed")
+    finally:
+        connection.close()
+
+
+def kick_related_refreshes():
+    """Run queued refreshes on the background thread (at most one run queued at a time)."""
+    if not _pending.is_set():
+        _pending.set()
+        _executor.submit(_run_in_thread)
+
+
+def rebuild_related_products(batch_size=1000):
+    """
+    Rebuild the whole index in bulk: one pass over active products, grouped
+    by top-level category, with candidates drawn from per-category and
+    per-brand recency buckets. Returns the number of products indexed.
+    """
+    started = timezone.now()
+    tops = _top_category_map()
+    rows = _rows(Product.objects.filter(status='active').order_by('-id'))
+
+    groups = defaultdict(list)
+    for row in rows:
+        top = tops.get(row['category_id'])
+        if top is not None:
+            groups[top].append(row)
+
+    entries = []
+    for group in groups.values():
+        by_leaf = defaultdict(list)
+        by_brand = defaultdict(list)
+        for row in group:
+            if row['category_id']:
+                by_leaf[row['category_id']].append(row)
+            if row['child_category_id'] and row['child_category_id'] != row['category_id']:
+                by_leaf[row['child_category_id']].append(row)
+            if row['brand_id']:
+                by_brand[row['brand_id']].append(row)
+
+        # Rows are already newest-first, so slicing a bucket keeps the most recent
+        recent = group[:CANDIDATES_PER_BUCKET]
+        for row in group:
+            leaf = row['child_category_id'] or row['category_id']
+            candidates = {c['id']: c for c in recent}
+            candidates.update((c['id'], c) for c in by_leaf.get(leaf, [])[:CANDIDATES_PER_BUCKET])
+            if row['brand_id']:
+                candidates.update((c['id'], c) for c in by_brand[row['brand_id']][:CANDIDATES_PER_BUCKET])
+
+            entries.extend(_entries(row['id'], _rank(row, candidates.values())))
+
+    with transaction.atomic():
+        RelatedProduct.objects.all().delete()
+        RelatedProduct.objects.bulk_create(entries, batch_size=batch_size)
+        # Anything queued before this pass started is covered by it
+        RelatedProductRefresh.objects.filter(queued_at__lte=started).delete()
+
+    return len(rows)
+
+
+def get_related_products(product, limit=RELATED_LIMIT):
+    """Related products for the detail page, best first (single indexed lookup)."""
+    related = Product.objects.filter(
+        related_from__product=product, status='active'
+    ).order_by('related_from__rank')
+
+    products = list(related[:limit])
+    if not products and not RelatedProduct.objects.filter(product=product).exists():
+        # Not indexed yet: rank now, but leave storing it to the queued
+        # refresh or rebuild_related_products
+        ids = [related_id for _, related_id in _rank_product(_product_row(product), _top_category_map())]
+        by_id = Product.objects.filter(status='active').in_bulk(ids[:limit])
+        products = [by_id[related_id] for related_id in ids[:limit] if related_id in by_id]
+    return products
@@ -0,0 +1,147 @@
+# orders/search.py
+"""
+Pluggable full-text product search.
+
+- PostgreSQL: to_tsvector() over title/summary/description, backed by a GIN
+  expression index, ranked with ts_rank().
+- SQLite: an FTS5 shadow table (product_search) kept in sync by the Product
+  signals in orders/signals.py, joined to the product query on rowid and
+  ranked with bm25().
+- Anything else: the old icontains scan.
+
+Every backend returns the queryset filtered to matches and annotated with
+`search_rank` (higher is better), which the listing engine can sort on.
+Set PRODUCT_SEARCH_BACKEND to a dotted path to force a backend.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from eshop_app.models import Product
+
+PRODUCT_TABLE = Product._meta.db_table
+FTS_TABLE = 'product_search'
+
+# Must match the GIN index expression in orders/migrations/0008_product_search.py
+PG_DOCUMENT = (
+    "to_tsvector('english', "
+    f"coalesce(\"{PRODUCT_TABLE}\".\"title\", '') || ' ' || "
+    f"coalesce(\"{PRODUCT_TABLE}\".\"summary\", '') || ' ' || "
+    f"coalesce(\"{PRODUCT_TABLE}\".\"description\", ''))"
+)
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _terms(query):
+    return WORD_RE.findall(query or '')
+
+
+class IContainsSearchBackend:
+    """Fallback: substring match, no ranking."""
+
+    def search(self, queryset, query):
+        if query:
+            queryset = queryset.filter(
+                Q(title__icontains=query) |
+                Q(summary__icontains=query) |
+                Q(description__icontains=query)
+            )
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    def index_product(self, product):
+        pass
+
+    def remove_product(self, product_id):
+        pass
+
+    def rebuild(self):
+        return 0
+
+
+class PostgresSearchBackend(IContainsSearchBackend):
+    """tsvector search using the GIN expression index."""
+
+    def _tsquery(self, query):
+        # Prefix-match every term so keystroke-driven searches work
+        return ' & '.join(f"{term}:*" for term in _terms(query))
+
+    def search(self, queryset, query):
+        tsquery = self._tsquery(query)
+        if not tsquery:
+            return super().search(queryset, query)
+        return queryset.filter(
+            RawSQL(f"{PG_DOCUMENT} @@ to_tsquery('english', %s)", [tsquery], output_field=BooleanField())
+        ).annotate(
+            # ts_rank() is float4; as float8 the rank a cursor carries compares equal to the column
+            search_rank=RawSQL(
+                f"ts_rank({PG_DOCUMENT}, to_tsquery('english', %s))::float8", [tsquery], output_field=FloatField()
+            )
+        )
+
+
+class SQLiteFTSSearchBackend(IContainsSearchBackend):
+    """FTS5 shadow table keyed by product id (rowid)."""
+
+    def _match(self, query):
+        # Quote each term (FTS5 syntax characters are not allowed through) and prefix-match it
+        return ' '.join(f'"{term}"*' for term in _terms(query))
+
+    def search(self, queryset, query):
+        match = self._match(query)
+        if not match:
+            return super().search(queryset, query)
+        # Join the shadow table so MATCH runs once; a correlated rank
+        # subquery would run the full-text query again for every product row
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = "{PRODUCT_TABLE}"."id"', f'{FTS_TABLE} MATCH %s'],
+            params=[match],
+        ).annotate(
+            # bm25() is lower-is-better, so negate it
+            search_rank=RawSQL(f"-bm25({FTS_TABLE})", [], output_field=FloatField())
+        )
+
+    def index_product(self, product):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product.pk])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, summary, description) VALUES (%s, %s, %s, %s)",
+                [product.pk, product.title or '', product.summary or '', product.description or ''],
+            )
+
+    def remove_product(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, summary, description) "
+                f"SELECT id, coalesce(title, ''), coalesce(summary, ''), coalesce(description, '') "
+                f"FROM {PRODUCT_TABLE}"
+            )
+            return cursor.rowcount
+
+
+BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteFTSSearchBackend,
+}
+
+
+def get_search_backend():
+    backend_path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', None)
+    if backend_path:
+        return import_string(backend_path)()
+    return BACKENDS.get(connection.vendor, IContainsSearchBackend)()
+
+
+def search_products(queryset, query):
+    """Filter `queryset` to products matching `query`, annotated with search_rank."""
+    return get_search_backend().search(queryset, query)
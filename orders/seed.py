@@ -0,0 +1,171 @@
+# orders/seed.py
+"""
+Synthetic catalog for load testing and query-plan checks.
+
+Everything is written with bulk_create in batches, so model signals do not
+fire: facet rows are built here directly, and the search and related-products
+indexes are rebuilt by the seed_catalog command afterwards. Seeded rows are
+recognisable by their "Seed" titles and seed-*@example.com emails, and the
+caches fed by the skipped signals are reset by the command as well.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from eshop_app.models import Brand, Category, Coupon, CustomUser, Product, ProductMedia
+from .facets import color_values, size_values
+from .models import Cart, ProductColor, ProductSize, Wishlist
+
+COLORS = [
+    ('Black', '#000000'), ('White', '#ffffff'), ('Red', '#e53935'), ('Blue', '#1e88e5'),
+    ('Green', '#43a047'), ('Yellow', '#fdd835'), ('Grey', '#9e9e9e'), ('Navy', '#1a237e'),
+    ('Pink', '#ec407a'), ('Brown', '#6d4c41'),
+]
+SIZES = ['XS', 'S', 'M', 'L', 'XL', 'XXL']
+WORDS = [
+    'classic', 'slim', 'cotton', 'linen', 'denim', 'summer', 'winter', 'casual', 'formal',
+    'sport', 'relaxed', 'printed', 'striped', 'plain', 'vintage', 'premium',
+]
+ITEMS = ['shirt', 'tee', 'jeans', 'jacket', 'dress', 'skirt', 'hoodie', 'sweater', 'shorts', 'coat']
+
+SEED_PASSWORD = 'seed-password'
+
+
+def _batches(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def seed_categories(rng, parents, children):
+    created = Category.objects.bulk_create([
+        Category(title=f"Seed Category {i}", is_parent=True, status='active')
+        for i in range(parents)
+    ])
+    leaves = Category.objects.bulk_create([
+        Category(
+            title=f"{parent.title}.{j}", is_parent=False, parent=parent,
+            status='active' if rng.random() > 0.1 else 'inactive',
+        )
+        for parent in created for j in range(children)
+    ])
+    return created, leaves
+
+
+def seed_brands(count):
+    return Brand.objects.bulk_create([Brand(title=f"Seed Brand {i}", status='active') for i in range(count)])
+
+
+def _product(rng, number, parents, leaves, brands):
+    colors = rng.sample(COLORS, rng.randint(1, 4))
+    sizes = rng.sample(SIZES, rng.randint(1, len(SIZES)))
+    leaf = rng.choice(leaves) if leaves else None
+    category = leaf.parent if leaf else rng.choice(parents)
+    now = timezone.now()
+    return Product(
+        title=f"Seed {rng.choice(WORDS).title()} {rng.choice(WORDS)} {rng.choice(ITEMS)} {number}",
+        summary=' '.join(rng.choices(WORDS, k=12)),
+        description=' '.join(rng.choices(WORDS + ITEMS, k=60)),
+        is_featured=rng.random() < 0.02,
+        category=category,
+        child_category=leaf,
+        price=Decimal(rng.randint(199, 150000)) / 100,
+        discount=rng.choice([0, 0, 0, 5, 10, 20, 30]),
+        size=','.join(sizes),
+        color_data=[{'name': name, 'code': code} for name, code in colors],
+        brand=rng.choice(brands) if brands else None,
+        condition=rng.choice(['default', 'default', 'new', 'hot']),
+        deal_end_date=now + timedelta(days=rng.randint(1, 30)) if rng.random() < 0.05 else None,
+        stock=rng.randint(0, 500),
+        shipping_charge=Decimal(rng.choice([0, 0, 40, 60])),
+        is_free_shipping=rng.random() < 0.3,
+        photo='products/seed.jpg',
+        status='active' if rng.random() > 0.05 else 'inactive',
+    )
+
+
+def seed_products(rng, count, parents, leaves, brands, media_per_product=2, batch_size=2000):
+    """Create `count` products with their media and facet rows. Returns the product ids."""
+    product_ids = []
+    for batch in _batches(range(count), batch_size):
+        with transaction.atomic():
+            products = Product.objects.bulk_create(
+                [_product(rng, number, parents, leaves, brands) for number in batch]
+            )
+            media, colors, sizes = [], [], []
+            for product in products:
+                names = [color['name'] for color in product.color_data]
+                for n in range(media_per_product):
+                    media.append(ProductMedia(
+                        product=product,
+                        file=f'product_media/seed-{product.id}-{n}.jpg',
+                        file_type='image',
+                        is_primary=n == 0,
+                        color_name=names[n % len(names)],
+                    ))
+                colors += [
+                    ProductColor(product=product, value=value, code=code)
+                    for value, code in color_values(product.color_data).items()
+                ]
+                sizes += [ProductSize(product=product, value=value) for value in size_values(product.size)]
+            ProductMedia.objects.bulk_create(media)
+            ProductColor.objects.bulk_create(colors)
+            ProductSize.objects.bulk_create(sizes)
+        product_ids += [product.id for product in products]
+    return product_ids
+
+
+def seed_users(count, batch_size=2000):
+    password = make_password(SEED_PASSWORD)
+    start = CustomUser.objects.count()
+    users = [
+        CustomUser(
+            email=f"seed-{start + i}@example.com",
+            username=f"seed-{start + i}@example.com",
+            first_name="Seed",
+            last_name=str(start + i),
+            password=password,
+        )
+        for i in range(count)
+    ]
+    for batch in _batches(users, batch_size):
+        CustomUser.objects.bulk_create(batch)
+    return list(CustomUser.objects.filter(email__startswith='seed-').values_list('id', flat=True))
+
+
+def seed_carts_and_wishlists(rng, user_ids, product_ids, batch_size=2000):
+    carts, wishlists = [], []
+    for user_id in user_ids:
+        for product_id in rng.sample(product_ids, min(len(product_ids), rng.randint(0, 4))):
+            carts.append(Cart(
+                user_id=user_id, product_id=product_id, quantity=rng.randint(1, 3),
+                size=rng.choice(SIZES), color=rng.choice(COLORS)[0],
+            ))
+        for product_id in rng.sample(product_ids, min(len(product_ids), rng.randint(0, 6))):
+            wishlists.append(Wishlist(user_id=user_id, product_id=product_id))
+    for batch in _batches(carts, batch_size):
+        Cart.objects.bulk_create(batch, ignore_conflicts=True)
+    for batch in _batches(wishlists, batch_size):
+        Wishlist.objects.bulk_create(batch, ignore_conflicts=True)
+    return len(carts), len(wishlists)
+
+
+def seed_coupons(rng, count):
+    now = timezone.now()
+    start = Coupon.objects.count()
+    return Coupon.objects.bulk_create([
+        Coupon(
+            code=f"SEED{start + i}",
+            discount_type=rng.choice(['percent', 'fixed']),
+            discount_value=Decimal(rng.choice([5, 10, 15, 50, 100])),
+            min_order_amount=Decimal(rng.choice([0, 100, 500, 1000])),
+            usage_limit=rng.choice([0, 0, 100, 1000]),
+            per_user_limit=rng.choice([0, 1, 3]),
+            start_date=now - timedelta(days=rng.randint(0, 30)),
+            end_date=now + timedelta(days=rng.randint(-5, 60)) if rng.random() < 0.8 else None,
+            is_active=rng.random() > 0.1,
+        )
+        for i in range(count)
+    ])
@@ -0,0 +1,185 @@
+# orders/signals.py
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete
+from django.db import transaction
+from django.dispatch import receiver
+
+from eshop_app.models import Banner, Category, Coupon, Product, ProductMedia
+from .models import Cart, OrderLine, RelatedProduct, Wishlist
+from .blobs import acquire, media_name, release
+from .pricing import invalidate_cart_pricing
+from .cart_badge import adjust_cart_quantity
+from .categories import invalidate_category_tree
+from .coupons import invalidate_active_coupons
+from .homepage import invalidate_homepage
+from .images import schedule_derivatives
+from .gallery import invalidate_gallery
+from .related import queue_related_refresh
+from .search import get_search_backend
+from .wishlist import invalidate_wishlist_ids
+
+
+@receiver([post_save, post_delete], sender=Cart)
+def cart_changed(sender, instance, **kwargs):
+    invalidate_cart_pricing(instance.user_id)
+
+
+@receiver(post_init, sender=Cart)
+def cart_loaded(sender, instance, **kwargs):
+    # Remember the stored quantity so a save can adjust the badge counter by the difference
+    instance._badge_quantity = instance.quantity if instance.pk else 0
+
+
+@receiver(post_save, sender=Cart)
+def cart_saved(sender, instance, created, **kwargs):
+    previous = 0 if created else instance._badge_quantity
+    adjust_cart_quantity(instance.user_id, instance.quantity - previous)
+    instance._badge_quantity = instance.quantity
+
+
+@receiver(post_delete, sender=Cart)
+def cart_deleted(sender, instance, **kwargs):
+    adjust_cart_quantity(instance.user_id, -instance._badge_quantity)
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    # The cached gallery depends on color_data
+    invalidate_gallery(instance.pk)
+
+    # Its related-products entries and its neighbours' are refreshed in the background
+    product_id = instance.pk
+    transaction.on_commit(lambda: queue_related_refresh(product_id))
+
+    # Keep the full-text index in sync (no-op on PostgreSQL, which indexes the table itself)
+    get_search_backend().index_product(instance)
+
+    # Cached cart breakdowns embed the product's price, discount and shipping
+    user_ids = set(Cart.objects.filter(product=instance).values_list('user_id', flat=True))
+    if user_ids:
+        invalidate_cart_pricing(*user_ids)
+
+
+@receiver(pre_delete, sender=Product)
+def product_deleting(sender, instance, **kwargs):
+    # The cascade is about to drop this product from other products' related
+    # lists; queue those for a refresh so they don't fall back to ranking on the fly
+    listed_by = list(RelatedProduct.objects.filter(related=instance).values_list('product_id', flat=True))
+    if listed_by:
+        transaction.on_commit(lambda: queue_related_refresh(*listed_by))
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    get_search_backend().remove_product(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_homepage_changed(sender, instance, **kwargs):
+    # Featured grid, deals and product grid are built from products
+    transaction.on_commit(lambda: invalidate_homepage('product'))
+
+
+@receiver([post_save, post_delete], sender=Banner)
+def banner_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_homepage('banner'))
+
+
+@receiver([post_save, post_delete], sender=Coupon)
+def coupon_changed(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_active_coupons)
+
+
+@receiver([post_save, post_delete], sender=Wishlist)
+def wishlist_changed(sender, instance, **kwargs):
+    # Dropped once committed, so the rebuild on the next read sees the change
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_wishlist_ids(user_id))
+
+
+@receiver([post_save, post_delete], sender=ProductMedia)
+def product_media_changed(sender, instance, **kwargs):
+    invalidate_gallery(instance.product_id)
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, instance, **kwargs):
+    # Publish after commit so no process rebuilds the tree from pre-commit rows
+    transaction.on_commit(invalidate_category_tree)
+    transaction.on_commit(lambda: invalidate_homepage('category'))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Banner)
+@receiver(post_save, sender=Category)
+def photo_saved(sender, instance, **kwargs):
+    # Resized WebP/AVIF copies are built in the background after commit
+    if instance.photo:
+        schedule_derivatives(instance.photo.name)
+
+
+@receiver(post_save, sender=ProductMedia)
+def media_file_saved(sender, instance, **kwargs):
+    if instance.file and instance.file_type == 'image':
+        schedule_derivatives(instance.file.name)
+
+
+@receiver(post_init, sender=Product)
+def product_loaded(sender, instance, **kwargs):
+    # The stored photo, so a save can move its blob reference; None when the field was deferred
+    photo = instance.__dict__.get('photo')
+    instance._stored_photo = None if 'photo' not in instance.__dict__ else (str(photo) if photo else '')
+
+
+@receiver(post_save, sender=Product)
+def product_photo_saved(sender, instance, created, update_fields=None, **kwargs):
+    if instance._stored_photo is None or (update_fields is not None and 'photo' not in update_fields):
+        return
+    photo = instance.photo.name or ''
+    previous = '' if created else instance._stored_photo
+    if photo != previous:
+        acquire(photo)
+        release(previous)
+    instance._stored_photo = photo
+
+
+@receiver(post_delete, sender=Product)
+def product_photo_deleted(sender, instance, **kwargs):
+    if instance._stored_photo:
+        release(instance._stored_photo)
+
+
+@receiver(post_delete, sender=ProductMedia)
+def media_file_deleted(sender, instance, **kwargs):
+    # The stored file goes with its last reference (orders/blobs.py)
+    if instance.file:
+        release(instance.file.name)
+
+
+@receiver(post_init, sender=Cart)
+@receiver(post_init, sender=OrderLine)
+def selected_image_loaded(sender, instance, **kwargs):
+    # The stored image's file name, so a save or delete can move its blob reference
+    if 'selected_image' not in instance.__dict__:
+        instance._stored_image = None
+    else:
+        instance._stored_image = media_name(instance.selected_image) if instance.pk else ''
+
+
+@receiver(post_save, sender=Cart)
+@receiver(post_save, sender=OrderLine)
+def selected_image_saved(sender, instance, created, update_fields=None, **kwargs):
+    if instance._stored_image is None or (update_fields is not None and 'selected_image' not in update_fields):
+        return
+    name = media_name(instance.selected_image)
+    previous = '' if created else instance._stored_image
+    if name != previous:
+        acquire(name)
+        release(previous)
+    instance._stored_image = name
+
+
+@receiver(post_delete, sender=Cart)
+@receiver(post_delete, sender=OrderLine)
+def selected_image_deleted(sender, instance, **kwargs):
+    if instance._stored_image:
+        release(instance._stored_image)
@@ -0,0 +1,87 @@
+# orders/static_serving.py
+"""
+Serving collected static files outside DEBUG.
+
+serve_static() serves STATIC_ROOT as written by collectstatic with
+CompressedManifestStaticFilesStorage (orders/static_storage.py):
+
+- content-hashed names from staticfiles.json get a year-long immutable
+  Cache-Control; anything else (the plain copies) a short max-age, since
+  its content can change under the same name;
+- the .br or .gz sibling is sent when the client accepts it, with
+  Content-Encoding and Vary: Accept-Encoding;
+- ETags, conditional requests and ranges are handled by
+  orders.media_serving.serve_file.
+
+In DEBUG, runserver keeps serving static files straight from the app and
+STATICFILES_DIRS directories.
+"""
+import mimetypes
+import re
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+
+from .media_serving import serve_file
+
+UNHASHED_MAX_AGE = 60 * 10
+ENCODINGS = (('br', 'br'), ('gzip', 'gz'))
+
+_ACCEPT_ENCODING = re.compile(r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?\s*')
+
+
+@lru_cache(maxsize=None)
+def hashed_names():
+    """Every content-hashed name in the collectstatic manifest (read once per process)."""
+    return frozenset(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+
+def accepted_encodings(header):
+    """Content codings an Accept-Encoding header allows (q=0 means refused)."""
+    accepted = set()
+    for part in (header or '').split(','):
+        match = _ACCEPT_ENCODING.fullmatch(part)
+        if not match:
+            continue
+        try:
+            quality = float(match.group(2) or 1)
+        except ValueError:
+            continue
+        if quality > 0:
+            accepted.add(match.group(1).lower())
+    return accepted
+
+
+def serve_static(request, path):
+    try:
+        file_path = Path(safe_join(settings.STATIC_ROOT, path))
+    except SuspiciousFileOperation:
+        raise Http404("Not a static file.")
+    if path.endswith(('.gz', '.br')) or path == 'staticfiles.json':
+        raise Http404("Not a static file.")
+
+    content_type, _ = mimetypes.guess_type(path)
+    immutable = path in hashed_names()
+
+    chosen, content_encoding = file_path, None
+    # Ranges are only served from the uncompressed file
+    if 'HTTP_RANGE' not in request.META:
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING'))
+        for encoding, suffix in ENCODINGS:
+            sibling = file_path.with_name(f'{file_path.name}.{suffix}')
+            if encoding in accepted and sibling.is_file():
+                chosen, content_encoding = sibling, encoding
+                break
+
+    response = serve_file(
+        request, chosen, immutable=immutable, max_age=UNHASHED_MAX_AGE,
+        content_type=content_type or 'application/octet-stream', content_encoding=content_encoding,
+    )
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
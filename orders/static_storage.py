@@ -0,0 +1,86 @@
+# orders/static_storage.py
+"""
+Static files storage for collectstatic.
+
+CompressedManifestStaticFilesStorage is Django's ManifestStaticFilesStorage
+(content-hashed names such as css/style.3f2a9c1e.css, recorded in
+staticfiles.json and used by {% static %}) that also writes pre-compressed
+siblings of every compressible file: .gz always, and .br when the brotli
+package is installed. orders/static_serving.py picks the best sibling for
+the request's Accept-Encoding and marks hashed names immutable.
+
+The bundled themes reference a few files they don't ship (fonts, maps,
+sample images). Those references are left unhashed with a warning instead
+of failing the whole build.
+"""
+import gzip
+import logging
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # optional: only .gz siblings without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_EXTENSIONS = (
+    '.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.xml', '.html',
+    '.ico', '.ttf', '.otf', '.eot',
+)
+# Not worth a sibling unless it saves at least this fraction of the original
+MIN_SAVING = 0.05
+MIN_SIZE = 512
+
+
+def compress(data):
+    """{'gz': bytes, 'br': bytes} for the encodings that pay off for `data`."""
+    if len(data) < MIN_SIZE:
+        return {}
+    candidates = {'gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        candidates['br'] = brotli.compress(data, quality=11)
+    limit = len(data) * (1 - MIN_SAVING)
+    return {encoding: body for encoding, body in candidates.items() if len(body) <= limit}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # A {% static %} for a file missing from the manifest falls back to the plain name
+    manifest_strict = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._reported_missing = set()
+
+    def hashed_name(self, name, content=None, filename=None):
+        try:
+            return super().hashed_name(name, content, filename)
+        except ValueError:
+            # Once per name, not once per post-processing pass
+            if name not in self._reported_missing:
+                self._reported_missing.add(name)
+                logger.warning("Static files: %s is referenced but doesn't exist; left unhashed.", name)
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        # The plain names are compressed too, for URLs that don't go through {% static %}
+        collected = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                collected.update((name, hashed_name))
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+
+        for name in sorted(collected):
+            if not name.lower().endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            with self.open(name) as fh:
+                data = fh.read()
+            for encoding, body in compress(data).items():
+                sibling = f'{name}.{encoding}'
+                if self.exists(sibling):
+                    self.delete(sibling)
+                self._save(sibling, ContentFile(body))
@@ -0,0 +1,78 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from orders.images import get_derivatives, get_derivatives_many
+
+register = template.Library()
+
+DEFAULT_SIZES = '(max-width: 576px) 100vw, (max-width: 992px) 50vw, 33vw'
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp'}
+
+
+def _srcset(variants):
+    return ', '.join(f'{url} {width}w' for width, url in variants)
+
+
+def _derivatives(image):
+    # Set by prefetch_derivatives for every image on the page
+    found = getattr(image, '_derivatives', None)
+    return get_derivatives(image.name) if found is None else found
+
+
+@register.simple_tag
+def prefetch_derivatives(objects, field='photo'):
+    """
+    Load the derivatives of every object's image in one cache round trip (and
+    at most one query), so the responsive_image / image_variant calls in the
+    loop that follows don't each look them up.
+    Usage: {% prefetch_derivatives products %} before {% for product in products %}
+    """
+    images = [image for image in (getattr(obj, field, None) for obj in objects) if image]
+    found = get_derivatives_many(image.name for image in images)
+    for image in images:
+        image._derivatives = found.get(image.name, {})
+    return ''
+
+
+@register.simple_tag
+def responsive_image(image, alt='', sizes=DEFAULT_SIZES, **attrs):
+    """
+    <picture> with AVIF/WebP srcsets for an uploaded image, falling back to the original.
+    Usage: {% responsive_image product.photo product.title class="category-img" %}
+    """
+    if not image:
+        return ''
+    attrs.setdefault('loading', 'lazy')
+    extra = format_html_join('', ' {}="{}"', attrs.items())
+    img = format_html('<img src="{}" alt="{}"{}>', image.url, alt, extra)
+
+    derivatives = _derivatives(image)
+    if not derivatives:
+        return img
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        (
+            (mime_type, _srcset(derivatives[fmt]), sizes)
+            for fmt, mime_type in MIME_TYPES.items() if fmt in derivatives
+        ),
+    )
+    return format_html('<picture>{}{}</picture>', sources, img)
+
+
+@register.filter
+def image_variant(image, width):
+    """
+    URL of the smallest WebP copy at least `width` pixels wide (or the widest there is),
+    for places that need a single URL such as CSS backgrounds.
+    Usage: data-setbg="{{ banner.photo|image_variant:1024 }}"
+    """
+    if not image:
+        return ''
+    variants = _derivatives(image).get('webp')
+    if not variants:
+        return image.url
+    width = int(width)
+    for variant_width, url in variants:
+        if variant_width >= width:
+            return url
+    return variants[-1][1]
@@ -1,3 +1,1250 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import re
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.http import Http404
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from PIL import Image
+
+from eshop_app.models import Banner, Brand, Category, Coupon, Product, ProductMedia
+from .categories import VERSION_CHECK_INTERVAL, VERSION_KEY, get_category_tree, invalidate_category_tree
+from .blobs import store_blob
+from .checkout import CheckoutError, checkout_cart
+from .coupons import get_active_coupons, invalidate_active_coupons
+from .facets import filter_by_color, filter_by_size, sync_product_facets
+from .gallery import get_color_gallery
+from .homepage import get_versions
+from .images import FORMATS, WIDTHS, generate_derivatives
+from .listing import PAGE_SIZE, paginate_products
+from .media_serving import IMMUTABLE_MAX_AGE, parse_range, serve_media
+from .metrics import query_budget
+from .outbox import MAX_ATTEMPTS, deliver_outbox
+from .models import (
+    Cart, CouponRedemption, ImageDerivative, MediaBlob, Order, OrderLine, OutgoingEmail, RelatedProduct,
+    RelatedProductRefresh, Wishlist,
+)
+from .pricing import cart_cache_key, get_cart_pricing
+from .related import get_related_products, rebuild_related_products, run_related_refreshes
+from .search import search_products
+from .static_serving import UNHASHED_MAX_AGE, hashed_names, serve_static
+from .static_storage import brotli
+from .wishlist import get_wishlist_ids
+
+DETAILS = {'first_name': 'Test', 'email': 'shopper@example.com', 'address': '1 Main St', 'payment_method': 'cod'}
+
+
+def make_user(email='shopper@example.com', **kwargs):
+    return get_user_model().objects.create_user(
+        email=email, password='secret-pass-123', first_name='Test', username=email, **kwargs
+    )
+
+
+def make_product(category, **kwargs):
+    fields = {
+        'title': 'Linen shirt',
+        'summary': 'A shirt',
+        'price': Decimal('40.00'),
+        'stock': 10,
+        'size': 'S,M,L',
+        'color_data': [{'name': 'Red', 'code': '#ff0000'}],
+        'photo': 'products/linen-shirt.jpg',
+        'condition': 'new',
+        'status': 'active',
+        **kwargs,
+    }
+    return Product.objects.create(category=category, **fields)
+
+
+@override_settings(RELATED_PRODUCTS_THREAD=False)
+class StorefrontTestCase(TestCase):
+    """
+    The cached snapshots (category tree, active coupons) live in process
+    memory and their version tokens in the cache; both would outlive the
+    rolled-back data of the previous test. Related-product refreshes stay
+    queued rather than racing the test transaction from a thread.
+    """
+
+    def setUp(self):
+        cache.clear()
+        invalidate_category_tree()
+        invalidate_active_coupons()
+
+
+class QueryBudgetTests(StorefrontTestCase):
+    """Every view in QUERY_BUDGETS stays within its budget once the caches are warm."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.parent = Category.objects.create(title='Clothing', is_parent=True)
+        cls.child = Category.objects.create(title='Shirts', is_parent=False, parent=cls.parent)
+        cls.products = [
+            make_product(cls.parent, child_category=cls.child, title=f'Shirt {n}', price=Decimal(20 + n))
+            for n in range(30)
+        ]
+        cls.user = make_user()
+        for product in cls.products[:3]:
+            Cart.objects.create(user=cls.user, product=product, size='M', color='Red', quantity=1)
+        # Kept up to date on commit in production; test transactions never commit
+        rebuild_related_products()
+
+    def assertWithinBudget(self, name, url):
+        # The first request fills the caches; the budget is for the steady state
+        self.client.get(url)
+        with query_budget(settings.QUERY_BUDGETS[name]):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_index(self):
+        self.assertWithinBudget('index', reverse('index'))
+        self.client.force_login(self.user)
+        self.assertWithinBudget('index', reverse('index'))
+
+    def test_product_detail(self):
+        url = reverse('product_detail', args=[self.products[0].pk])
+        self.assertWithinBudget('product_detail', url)
+        self.client.force_login(self.user)
+        self.assertWithinBudget('product_detail', url)
+
+    def test_shop_all(self):
+        url = reverse('shop_all')
+        self.assertWithinBudget('shop_all', url)
+        self.assertWithinBudget('shop_all', f'{url}?category={self.parent.pk}&sort=newest')
+        self.client.force_login(self.user)
+        self.assertWithinBudget('shop_all', url)
+
+    def test_shopping_cart(self):
+        self.client.force_login(self.user)
+        self.assertWithinBudget('shopping_cart', reverse('shopping_cart'))
+
+
+
+class CategoryTreeTests(StorefrontTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.women = Category.objects.create(title='Women', is_parent=True)
+        cls.tops = Category.objects.create(title='Tops', is_parent=False, parent=cls.women)
+        cls.shirts = Category.objects.create(title='Shirts', is_parent=False, parent=cls.tops)
+        cls.hidden = Category.objects.create(title='Hidden', is_parent=False, parent=cls.women, status='inactive')
+        cls.men = Category.objects.create(title='Men', is_parent=True)
+
+    def test_lookups(self):
+        with self.assertNumQueries(1):
+            tree = get_category_tree()
+        with self.assertNumQueries(0):
+            self.assertIs(get_category_tree(), tree)
+
+        self.assertEqual(tree.descendants(self.women.pk), (self.tops, self.hidden, self.shirts))
+        self.assertEqual(tree.descendants(self.shirts.pk), ())
+        self.assertEqual(tree.ancestors(self.shirts.pk), (self.women, self.tops))
+        self.assertEqual(tree.root(self.shirts.pk), self.women)
+        self.assertEqual(tree.root(self.men.pk), self.men)
+        self.assertEqual(tree.active_children(self.women.pk), (self.tops,))
+        self.assertEqual(tree.parents(), (self.women, self.men))
+        self.assertIsNone(tree.get(self.hidden.pk, active=True))
+        self.assertIsNone(tree.get('not-a-number'))
+
+    def test_category_save_publishes_a_new_tree(self):
+        tree = get_category_tree()
+        self.shirts.title = 'Blouses'
+        self.shirts.parent = self.men
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shirts.save()
+
+        tree = get_category_tree()
+        self.assertEqual(tree.get(self.shirts.pk).title, 'Blouses')
+        self.assertEqual(tree.descendants(self.women.pk), (self.tops, self.hidden))
+        self.assertEqual(tree.root(self.shirts.pk), self.men)
+
+    def test_other_processes_changes_show_up_after_the_check_interval(self):
+        tree = get_category_tree()
+        # Another process edited a category and published a new version
+        Category.objects.filter(pk=self.tops.pk).update(title='Tees')
+        cache.set(VERSION_KEY, time.time_ns(), None)
+
+        self.assertIs(get_category_tree(), tree)
+        later = time.monotonic() + VERSION_CHECK_INTERVAL + 1
+        with mock.patch('orders.categories.time.monotonic', return_value=later):
+            self.assertEqual(get_category_tree().get(self.tops.pk).title, 'Tees')
+
+
+class HomepageCacheTests(StorefrontTestCase):
+    """The landing page's cached fragments change exactly when their source's version token does."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title='Outerwear', is_parent=True)
+        cls.banner = Banner.objects.create(title='Summer sale', photo='banners/summer.jpg', status='active')
+        cls.product = make_product(cls.category, title='Rain jacket', is_featured=True)
+
+    def page(self):
+        return self.client.get(reverse('index')).content.decode()
+
+    def edit(self, instance, **fields):
+        # Without the signals: the cached fragments must not notice
+        type(instance).objects.filter(pk=instance.pk).update(**fields)
+
+    def save(self, instance, **fields):
+        for name, value in fields.items():
+            setattr(instance, name, value)
+        with self.captureOnCommitCallbacks(execute=True):
+            instance.save()
+
+    def assertRefreshed(self, instance, source, old, new, field='title'):
+        self.assertIn(old, self.page())
+        self.edit(instance, **{field: new})
+        self.assertIn(old, self.page())
+
+        versions = get_versions()
+        self.save(instance, **{field: new})
+        changed = {name for name, version in get_versions().items() if version != versions[name]}
+        self.assertIn(source, changed)
+        page = self.page()
+        self.assertIn(new, page)
+        self.assertNotIn(old, page)
+        return changed
+
+    def test_banner_save(self):
+        self.assertEqual(self.assertRefreshed(self.banner, 'banner', 'Summer sale', 'Winter sale'), {'banner'})
+
+    def test_product_save(self):
+        self.assertEqual(self.assertRefreshed(self.product, 'product', 'Rain jacket', 'Storm jacket'), {'product'})
+
+    def test_category_save(self):
+        self.assertRefreshed(self.category, 'category', 'Outerwear', 'Coats')
+
+    def test_delete(self):
+        self.assertIn('Summer sale', self.page())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.banner.delete()
+        self.assertNotIn('Summer sale', self.page())
+
+class CheckoutTests(StorefrontTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title='Clothing', is_parent=True)
+        cls.product = make_product(cls.category, stock=2)
+        cls.user = make_user()
+
+    def add_to_cart(self, user, quantity):
+        return Cart.objects.create(user=user, product=self.product, size='M', color='Red', quantity=quantity)
+
+    def test_checkout_takes_stock_and_empties_cart(self):
+        self.add_to_cart(self.user, 2)
+        order = checkout_cart(self.user, DETAILS)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+        self.assertEqual(order.lines.get().quantity, 2)
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+
+    def test_insufficient_stock(self):
+        self.add_to_cart(self.user, 3)
+        with self.assertRaisesMessage(CheckoutError, 'Only 2 left in stock for Linen shirt.'):
+            checkout_cart(self.user, DETAILS)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 2)
+        self.assertTrue(Cart.objects.filter(user=self.user).exists())
+        self.assertFalse(Order.objects.exists())
+
+    def test_coupon_usage_limit(self):
+        Coupon.objects.create(code='ONCE', discount_value=Decimal('10'), usage_limit=1)
+        other = make_user('other@example.com')
+        self.add_to_cart(self.user, 1)
+        self.add_to_cart(other, 1)
+        checkout_cart(self.user, DETAILS, coupon_code='ONCE')
+
+        with self.assertRaisesMessage(CheckoutError, 'Coupon ONCE has reached its usage limit.'):
+            checkout_cart(other, DETAILS, coupon_code='ONCE')
+        # The failed checkout rolled back its stock and order
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Coupon.objects.get(code='ONCE').used_count, 1)
+
+    def test_coupon_per_user_limit(self):
+        Coupon.objects.create(code='WELCOME', discount_value=Decimal('10'), per_user_limit=1)
+        self.add_to_cart(self.user, 1)
+        checkout_cart(self.user, DETAILS, coupon_code='WELCOME')
+
+        self.add_to_cart(self.user, 1)
+        message = 'You have already used coupon WELCOME the maximum number of times.'
+        with self.assertRaisesMessage(CheckoutError, message):
+            checkout_cart(self.user, DETAILS, coupon_code='WELCOME')
+        self.assertEqual(CouponRedemption.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(Coupon.objects.get(code='WELCOME').used_count, 1)
+
+
+
+class ActiveCouponsTests(StorefrontTestCase):
+
+    def create(self, code, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Coupon.objects.create(code=code, discount_value=Decimal('10'), **fields)
+
+    def codes(self):
+        return [coupon.code for coupon in get_active_coupons().coupons]
+
+    def test_only_coupons_inside_their_window(self):
+        now = timezone.now()
+        self.create('BIG', min_order_amount=Decimal('100'), start_date=now - timedelta(days=1))
+        self.create('SMALL', min_order_amount=Decimal('20'), end_date=now + timedelta(days=1))
+        self.create('SOON', start_date=now + timedelta(hours=1))
+        self.create('OVER', start_date=now - timedelta(days=2), end_date=now - timedelta(hours=1))
+        self.create('OFF', is_active=False)
+
+        active = get_active_coupons()
+        self.assertEqual(self.codes(), ['SMALL', 'BIG'])
+        self.assertIsNone(active.get('SOON'))
+        self.assertIsNone(active.get('OVER'))
+        self.assertEqual([coupon.code for coupon in active.eligible(Decimal('50'))], ['SMALL'])
+        with self.assertNumQueries(0):
+            self.assertEqual(get_active_coupons().get('BIG').code, 'BIG')
+
+    def test_snapshot_rebuilt_when_a_window_opens_or_closes(self):
+        now = timezone.now()
+        self.create('SOON', start_date=now + timedelta(hours=1), end_date=now + timedelta(hours=2))
+        self.assertEqual(self.codes(), [])
+
+        with mock.patch('orders.coupons.timezone.now', return_value=now + timedelta(minutes=90)):
+            self.assertEqual(self.codes(), ['SOON'])
+        with mock.patch('orders.coupons.timezone.now', return_value=now + timedelta(hours=3)):
+            self.assertEqual(self.codes(), [])
+
+    def test_coupon_save_and_delete_invalidate(self):
+        coupon = self.create('SAVE10')
+        self.assertEqual(self.codes(), ['SAVE10'])
+
+        # Without the signals the snapshot is kept
+        Coupon.objects.filter(pk=coupon.pk).update(is_active=False)
+        self.assertEqual(self.codes(), ['SAVE10'])
+
+        coupon.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            coupon.save()
+        self.assertEqual(self.codes(), [])
+
+        self.create('SAVE20')
+        self.assertEqual(self.codes(), ['SAVE20'])
+        with self.captureOnCommitCallbacks(execute=True):
+            Coupon.objects.get(code='SAVE20').delete()
+        self.assertEqual(self.codes(), [])
+
+
+class ConditionalProductPageTests(StorefrontTestCase):
+    """Revalidating the product page gets a 304 until something shown on it changes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title='Clothing', is_parent=True)
+        cls.product = make_product(cls.category)
+        cls.other = make_product(cls.category, title='Wool scarf')
+        cls.user = make_user()
+        cls.url = reverse('product_detail', args=[cls.product.pk])
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = 'a' * 32
+
+    def etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def assertChanges(self, change):
+        before = self.etag()
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        after = self.etag()
+        self.assertNotEqual(after, before)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=before).status_code, 200)
+
+    def test_unchanged_page_is_not_modified(self):
+        etag = self.etag()
+        self.assertEqual(self.etag(), etag)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+    def test_product_edit(self):
+        def edit():
+            self.product.title = 'Linen shirt, washed'
+            self.product.save()
+        self.assertChanges(edit)
+
+    def test_cart_change(self):
+        self.assertChanges(lambda: Cart.objects.create(user=self.user, product=self.other, size='M', color='Red'))
+
+    def test_wishlist_change(self):
+        self.assertChanges(lambda: Wishlist.objects.create(user=self.user, product=self.other))
+
+    def test_csrf_token_change(self):
+        def rotate():
+            self.client.cookies[settings.CSRF_COOKIE_NAME] = 'b' * 32
+        self.assertChanges(rotate)
+
+    def test_viewer_change(self):
+        self.assertChanges(lambda: self.client.force_login(make_user('other@example.com')))
+
+class CartApiTests(StorefrontTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title='Clothing', is_parent=True)
+        cls.product = make_product(cls.category, stock=5)
+        cls.user = make_user()
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def post(self, *operations):
+        # The batch resets the cached totals once it commits
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse('cart_api'), json.dumps({'operations': list(operations)}), content_type='application/json'
+            )
+
+    def add(self, quantity, **extra):
+        return {'op': 'add', 'product_id': self.product.pk, 'size': 'M', 'color': 'Red', 'quantity': quantity, **extra}
+
+    def test_add_increments_existing_line(self):
+        image = '/media/products/linen-shirt-red.jpg'
+        self.assertEqual(self.post(self.add(1, selected_image=image)).status_code, 200)
+        response = self.post(self.add(2))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['cart_total_quantity'], 3)
+        item = Cart.objects.get(user=self.user)
+        self.assertEqual(item.quantity, 3)
+        # An add without an image keeps the one already chosen
+        self.assertEqual(item.selected_image, image)
+
+    def test_adds_in_one_batch_add_up(self):
+        self.post(self.add(2), self.add(2))
+        self.assertEqual(Cart.objects.get(user=self.user).quantity, 4)
+
+    def test_insufficient_stock(self):
+        self.post(self.add(4))
+        response = self.post(self.add(2))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['message'], 'Only 5 left in stock for Linen shirt.')
+        self.assertEqual(Cart.objects.get(user=self.user).quantity, 4)
+
+    def test_update_and_remove(self):
+        self.post(self.add(1))
+        item = Cart.objects.get(user=self.user)
+        self.post({'op': 'update', 'item_id': item.pk, 'quantity': 3})
+        self.assertEqual(Cart.objects.get(pk=item.pk).quantity, 3)
+        self.post({'op': 'remove', 'item_id': item.pk})
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.post(self.add(1)).status_code, 302)
+        self.assertFalse(Cart.objects.exists())
+
+
+class ListingCursorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Clothing', is_parent=True)
+        # Repeated prices, so pages have to break ties by id
+        for n in range(11):
+            make_product(category, title=f'Shirt {n}', price=Decimal(10 + n % 3))
+
+    def walk(self, sort_option, page_size=4):
+        products = Product.objects.filter(status='active')
+        seen, cursor = [], None
+        while True:
+            items, cursor = paginate_products(products, sort_option, cursor, page_size)
+            seen.extend(items)
+            if cursor is None:
+                return seen
+
+    def test_pages_cover_every_product_once_in_order(self):
+        seen = self.walk('low_to_high')
+        self.assertEqual([p.pk for p in seen], [p.pk for p in Product.objects.order_by('price', 'id')])
+
+        seen = self.walk('newest')
+        self.assertEqual([p.pk for p in seen], [p.pk for p in Product.objects.order_by('-created_at', '-id')])
+
+    def test_malformed_cursor_starts_over(self):
+        products = Product.objects.filter(status='active')
+        first_page, _ = paginate_products(products, 'low_to_high', page_size=4)
+        items, _ = paginate_products(products, 'low_to_high', 'not-a-cursor', page_size=4)
+        self.assertEqual(items, first_page)
+
+
+
+class SearchTests(StorefrontTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title='Clothing', is_parent=True)
+        cls.best = make_product(cls.category, title='Linen linen shirt', summary='Pure linen')
+        # Identical text, so their ranks tie and pages have to break ties by id
+        for n in range(PAGE_SIZE + 5):
+            make_product(cls.category, title='Linen shirt', description=f'Style {n}')
+        make_product(cls.category, title='Wool jumper', summary='Warm')
+
+    def search(self, query):
+        return search_products(Product.objects.filter(status='active'), query)
+
+    def test_index_follows_saves_and_deletes(self):
+        self.assertFalse(self.search('corduroy').exists())
+        product = make_product(self.category, title='Corduroy trousers')
+        self.assertEqual(list(self.search('corduroy')), [product])
+
+        product.title = 'Denim trousers'
+        product.save()
+        self.assertFalse(self.search('corduroy').exists())
+        self.assertEqual(list(self.search('denim')), [product])
+
+        product.delete()
+        self.assertFalse(self.search('denim').exists())
+
+    def test_prefix_terms_and_relevance(self):
+        self.assertEqual(self.search('lin').count(), PAGE_SIZE + 6)
+        self.assertEqual(self.search('linen wool').count(), 0)
+        items, _ = paginate_products(self.search('linen'), 'relevance')
+        self.assertEqual(items[0], self.best)
+
+    def test_relevance_pages_cover_every_match_once(self):
+        url = reverse('shop_all')
+        response = self.client.get(url, {'q': 'linen', 'sort': 'relevance'})
+        seen = list(response.context['products'])
+        while response.context['next_page_url']:
+            response = self.client.get(response.context['next_page_url'])
+            seen.extend(response.context['products'])
+
+        self.assertEqual(seen[0], self.best)
+        self.assertEqual(len(seen), PAGE_SIZE + 6)
+        self.assertEqual(len({product.pk for product in seen}), len(seen))
+        ranks = [product.search_rank for product in seen]
+        self.assertEqual(ranks, sorted(ranks, reverse=True))
+
+
+class FacetFilterTests(StorefrontTestCase):
+    """The facet tables answer the shop's colour / size filters the way the old icontains lookups did."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Clothing', is_parent=True)
+        colors = [{'name': 'Red', 'code': '#f00'}, {'name': ' Dark  Blue ', 'code': '#008'}]
+        cls.shirt = make_product(category, size=' S, m ,XL', color_data=colors)
+        cls.jumper = make_product(category, size='XS,L', color_data=[{'name': 'GREEN', 'code': '#0f0'}])
+        for product in (cls.shirt, cls.jumper):
+            sync_product_facets(product)
+
+    def colored(self, color):
+        return set(filter_by_color(Product.objects.all(), color))
+
+    def sized(self, size):
+        return set(filter_by_size(Product.objects.all(), size))
+
+    def test_color_filter_ignores_case_and_whitespace(self):
+        self.assertEqual(self.colored('red'), {self.shirt})
+        self.assertEqual(self.colored(' RED '), {self.shirt})
+        self.assertEqual(self.colored('dark blue'), {self.shirt})
+        self.assertEqual(self.colored('Green'), {self.jumper})
+        self.assertEqual(self.colored('purple'), set())
+
+    def test_size_filter_ignores_case_and_whitespace(self):
+        self.assertEqual(self.sized('M'), {self.shirt})
+        self.assertEqual(self.sized(' s'), {self.shirt})
+        self.assertEqual(self.sized('xl'), {self.shirt})
+        self.assertEqual(self.sized('xs'), {self.jumper})
+        self.assertEqual(self.sized('xxl'), set())
+
+    def test_facet_rows_follow_edits(self):
+        self.shirt.size = 'L'
+        self.shirt.color_data = [{'name': 'Green', 'code': '#0f0'}]
+        self.shirt.save()
+        sync_product_facets(self.shirt)
+        self.assertEqual(self.sized('m'), set())
+        self.assertEqual(self.sized('l'), {self.shirt, self.jumper})
+        self.assertEqual(self.colored('red'), set())
+        self.assertEqual(self.colored('green'), {self.shirt, self.jumper})
+
+    def test_shop_filters(self):
+        response = self.client.get(reverse('shop_all'), {'color': 'RED', 'size': ' xl '})
+        self.assertEqual(list(response.context['products']), [self.shirt])
+
+
+class FacetCountTests(StorefrontTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.parent = Category.objects.create(title='Clothing', is_parent=True)
+        cls.shirts = Category.objects.create(title='Shirts', is_parent=False, parent=cls.parent)
+        cls.trousers = Category.objects.create(title='Trousers', is_parent=False, parent=cls.parent)
+        cls.acme = Brand.objects.create(title='Acme')
+        cls.zenith = Brand.objects.create(title='Zenith')
+        sizes = ['S,M', 'M,L', 'L']
+        red, blue = {'name': 'Red', 'code': '#f00'}, {'name': 'Blue', 'code': '#00f'}
+        colors = [[red], [blue, red]]
+        prices = [30, 80, 150, 300]
+        for n in range(24):
+            product = make_product(
+                cls.parent, child_category=cls.shirts if n % 2 else cls.trousers,
+                brand=cls.acme if n % 3 else cls.zenith, size=sizes[n % 3], color_data=colors[n % 2 if n < 20 else 0],
+                price=Decimal(prices[n % 4]), title=f'Item {n}',
+            )
+            sync_product_facets(product)
+
+    def shop(self, params):
+        response = self.client.get(reverse('shop_all'), params)
+        return response.context['facets'], len(response.context['products'])
+
+    def test_counts_leave_out_their_own_filter_and_match_the_listing(self):
+        params = {
+            'category': self.shirts.pk, 'brand': self.acme.pk, 'size': 'm', 'color': 'red',
+            'min_price': '50', 'max_price': '100',
+        }
+        facets, _ = self.shop(params)
+
+        # The selected brand doesn't hide the other one
+        self.assertEqual([entry['brand'] for entry in facets['brands']], [self.acme, self.zenith])
+
+        options = {
+            'brands': [({'brand': entry['brand'].pk}, entry['count']) for entry in facets['brands']],
+            'sizes': [({'size': entry['value']}, entry['count']) for entry in facets['sizes']],
+            'colors': [({'color': entry['value']}, entry['count']) for entry in facets['colors']],
+            'prices': [
+                ({'min_price': entry['min'], 'max_price': entry['max']}, entry['count'])
+                for entry in facets['prices']
+            ],
+            'categories': [
+                ({'category': entry['category'].pk}, entry['count'])
+                for parent in facets['categories'] for entry in [parent, *parent['children']]
+            ],
+        }
+        for facet, entries in options.items():
+            self.assertGreater(len(entries), 1, facet)
+            for option, count in entries:
+                with self.subTest(facet=facet, option=option):
+                    # Picking the option gives exactly the listing its count promised
+                    self.assertEqual(self.shop({**params, **option})[1], count)
+
+class CartPricingCacheTests(StorefrontTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title='Clothing', is_parent=True)
+        cls.product = make_product(cls.category, price=Decimal('40.00'))
+        cls.user = make_user()
+        cls.item = Cart.objects.create(user=cls.user, product=cls.product, size='M', color='Red', quantity=1)
+
+    def pricing(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        return get_cart_pricing(request)
+
+    def test_cached_until_the_cart_changes(self):
+        subtotal = self.pricing().subtotal
+        self.assertIsNotNone(cache.get(cart_cache_key(self.user.pk)))
+
+        self.item.quantity = 2
+        self.item.save()
+        self.assertIsNone(cache.get(cart_cache_key(self.user.pk)))
+        self.assertEqual(self.pricing().subtotal, subtotal * 2)
+
+    def test_product_change_invalidates(self):
+        self.pricing()
+        self.product.price = Decimal('50.00')
+        self.product.save()
+        self.assertEqual(self.pricing().subtotal, Decimal('50.00'))
+
+    def test_cart_api_invalidates_on_commit(self):
+        self.pricing()
+        self.client.force_login(self.user)
+        operation = {'op': 'update', 'item_id': self.item.pk, 'quantity': 3}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('cart_api'), json.dumps({'operations': [operation]}), content_type='application/json'
+            )
+        self.assertEqual(self.pricing().subtotal, Decimal('120.00'))
+
+
+
+
+class WishlistTests(StorefrontTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Clothing', is_parent=True)
+        cls.product = make_product(category)
+        cls.user = make_user()
+
+    def toggle(self):
+        # The cached id set is dropped once the toggle commits
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('toggle_wishlist', args=[self.product.pk])).json()
+
+    def listed_ids(self):
+        return set(self.client.get(reverse('shop_all')).context['wishlisted_ids'])
+
+    def test_toggle_shows_on_listings(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.listed_ids(), set())
+
+        response = self.toggle()
+        self.assertEqual((response['is_added'], response['wishlist_count']), (True, 1))
+        self.assertEqual(self.listed_ids(), {self.product.pk})
+
+        response = self.toggle()
+        self.assertEqual((response['is_added'], response['wishlist_count']), (False, 0))
+        self.assertEqual(self.listed_ids(), set())
+
+    def test_cached_set_is_rebuilt_not_patched(self):
+        self.assertEqual(get_wishlist_ids(self.user), frozenset())
+        with self.captureOnCommitCallbacks(execute=True):
+            Wishlist.objects.create(user=self.user, product=self.product)
+        self.assertEqual(get_wishlist_ids(self.user), {self.product.pk})
+
+
+class RelatedProductsTests(StorefrontTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title='Clothing', is_parent=True)
+        cls.shirt = make_product(cls.category, title='Shirt')
+        cls.scarf = make_product(cls.category, title='Scarf', color_data=[{'name': 'Blue', 'code': '#00f'}])
+
+    def setUp(self):
+        super().setUp()
+        rebuild_related_products()
+
+    def related_ids(self, product):
+        return list(
+            RelatedProduct.objects.filter(product=product).order_by('rank').values_list('related_id', flat=True)
+        )
+
+    def test_save_is_refreshed_in_the_background(self):
+        self.assertEqual(self.related_ids(self.shirt), [self.scarf.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            tie = make_product(self.category, title='Tie')
+        # The request only queued it
+        self.assertEqual(self.related_ids(tie), [])
+        self.assertTrue(RelatedProductRefresh.objects.filter(product=tie).exists())
+
+        self.assertEqual(run_related_refreshes(), 1)
+        self.assertFalse(RelatedProductRefresh.objects.exists())
+        # Red shares a colour with the shirt, so the tie ranks ahead of the scarf there
+        self.assertEqual(self.related_ids(tie), [self.shirt.pk, self.scarf.pk])
+        self.assertEqual(self.related_ids(self.shirt), [tie.pk, self.scarf.pk])
+        self.assertEqual(self.related_ids(self.scarf), [tie.pk, self.shirt.pk])
+
+    def test_deactivating_removes_it_from_neighbours(self):
+        self.scarf.status = 'inactive'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.scarf.save()
+        run_related_refreshes()
+        self.assertEqual(self.related_ids(self.shirt), [None])
+        self.assertEqual(get_related_products(self.shirt), [])
+
+    def test_delete_queues_the_products_that_listed_it(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.scarf.delete()
+        self.assertEqual(list(RelatedProductRefresh.objects.values_list('product_id', flat=True)), [self.shirt.pk])
+
+        run_related_refreshes()
+        # Indexed as having nothing related, rather than ranked on every view
+        self.assertEqual(self.related_ids(self.shirt), [None])
+        with self.assertNumQueries(2):
+            self.assertEqual(get_related_products(self.shirt), [])
+
+
+# Cache lookups aren't queries here, so assertNumQueries sees only the database work
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ColorGalleryTests(StorefrontTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Clothing', is_parent=True)
+        cls.product = make_product(category, color_data=[
+            {'name': 'Red', 'code': '#f00'}, {'name': 'Blue', 'code': '#00f'}, {'name': 'Green', 'code': '#0f0'},
+        ])
+
+    def add_media(self, name, color_name=None, is_primary=False):
+        return ProductMedia.objects.create(
+            product=self.product, file=f'product_media/{name}', color_name=color_name, is_primary=is_primary,
+        )
+
+    def test_groups_by_casefolded_colour_in_one_query(self):
+        red = self.add_media('red.jpg', 'RED')
+        red_primary = self.add_media('red-front.jpg', 'red', is_primary=True)
+        blue = self.add_media('blue.jpg', 'Blue')
+        self.add_media('blue.mp4', 'Blue')
+        self.add_media('plain.jpg')
+
+        with self.assertNumQueries(1):
+            gallery = get_color_gallery(self.product)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_color_gallery(self.product), gallery)
+
+        # Green has no pictures, videos aren't gallery images
+        self.assertEqual([color['name'] for color in gallery['colors']], ['Red', 'Blue'])
+        self.assertEqual(gallery['primary_color'], 'Red')
+        self.assertEqual(gallery['gallery_images'], [red_primary.file.url, red.file.url])
+        self.assertEqual(gallery['colors'][1]['images'], [blue.file.url])
+        self.assertEqual(gallery['colors'][1]['thumb'], blue.file.url)
+        self.assertEqual([color['is_current'] for color in gallery['colors']], [True, False])
+
+    def test_falls_back_to_every_image(self):
+        plain = self.add_media('plain.jpg')
+        other = self.add_media('other.jpg', 'Purple')
+        gallery = get_color_gallery(self.product)
+        self.assertEqual(gallery['colors'], [])
+        self.assertEqual(gallery['gallery_images'], [other.file.url, plain.file.url])
+
+    def test_media_and_product_changes_invalidate(self):
+        self.assertEqual(get_color_gallery(self.product)['gallery_images'], [])
+
+        media = self.add_media('blue.jpg', 'Blue')
+        self.assertEqual(get_color_gallery(self.product)['primary_color'], 'Blue')
+
+        self.product.color_data = [{'name': 'Navy', 'code': '#000080'}]
+        self.product.save()
+        self.assertIsNone(get_color_gallery(self.product)['primary_color'])
+
+        media.delete()
+        self.assertEqual(get_color_gallery(self.product)['gallery_images'], [])
+
+
+class ImageDerivativeTests(StorefrontTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title='Clothing', is_parent=True)
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        overrides = override_settings(MEDIA_ROOT=media.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def upload(self, name, width, height):
+        buffer = io.BytesIO()
+        Image.new('RGB', (width, height), '#c33').save(buffer, 'PNG')
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def render(self, name):
+        product = make_product(self.category, photo=name)
+        template = Template('{% load responsive_images %}{% responsive_image product.photo product.title %}')
+        return template.render(Context({'product': product}))
+
+    def srcset(self, html, fmt):
+        match = re.search(f'<source type="image/{fmt}" srcset="([^"]+)"', html)
+        return [entry.rsplit(' ', 1) for entry in match.group(1).split(', ')] if match else []
+
+    def test_webp_siblings_at_configured_widths(self):
+        self.assertIn('webp', FORMATS)
+        source = self.upload('products/shirt.png', 700, 350)
+        self.assertEqual(generate_derivatives(source), 2 * len(FORMATS))
+
+        rows = ImageDerivative.objects.filter(source=source, format='webp').order_by('width')
+        expected = [width for width in WIDTHS if width < 700]
+        self.assertEqual([row.width for row in rows], expected)
+        for row in rows:
+            self.assertEqual(row.name, f'derivatives/products/shirt-{row.width}w.webp')
+            with default_storage.open(row.name) as fh, Image.open(fh) as image:
+                self.assertEqual((image.format, image.width), ('WEBP', row.width))
+
+        # A known source is not redone
+        self.assertEqual(generate_derivatives(source), 0)
+
+    def test_small_original_is_not_upscaled(self):
+        source = self.upload('products/swatch.png', 200, 200)
+        generate_derivatives(source)
+        self.assertEqual(
+            list(ImageDerivative.objects.filter(source=source).values_list('width', flat=True).distinct()), [200]
+        )
+
+    def test_srcset_lists_only_existing_files(self):
+        source = self.upload('products/shirt.png', 700, 350)
+        html = self.render(source)
+        self.assertNotIn('srcset', html)
+        self.assertIn(f'src="{settings.MEDIA_URL}{source}"', html)
+
+        generate_derivatives(source)
+        html = self.render(source)
+        for fmt in FORMATS:
+            entries = self.srcset(html, fmt)
+            self.assertEqual([width for _, width in entries], [f'{width}w' for width in WIDTHS if width < 700])
+            for url, _ in entries:
+                self.assertTrue(url.startswith(settings.MEDIA_URL))
+                self.assertTrue(default_storage.exists(url[len(settings.MEDIA_URL):]), url)
+
+
+class MediaBlobTests(StorefrontTestCase):
+    """Every row pointing at a stored file holds one reference; the file goes with the last one."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title='Clothing', is_parent=True)
+        cls.user = make_user()
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        overrides = override_settings(MEDIA_ROOT=media.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def store(self, content=b'the same picture'):
+        return store_blob(ContentFile(content), 'product_media', '.jpg')
+
+    def refs(self, name):
+        blob = MediaBlob.objects.filter(name=name).first()
+        return blob.ref_count if blob else None
+
+    def delete(self, instance):
+        with self.captureOnCommitCallbacks(execute=True):
+            instance.delete()
+
+    def test_identical_uploads_share_one_file(self):
+        name, created = self.store()
+        self.assertTrue(created)
+        self.assertEqual(self.store(), (name, False))
+        self.assertNotEqual(self.store(b'another picture')[0], name)
+        self.assertEqual(self.refs(name), 2)
+        self.assertEqual(default_storage.open(name).read(), b'the same picture')
+
+    def test_references_from_every_model(self):
+        name, _ = self.store()
+        product = make_product(self.category, photo=name)
+        media = ProductMedia.objects.create(product=product, file=name)
+        url = default_storage.url(name)
+        cart = Cart.objects.create(user=self.user, product=product, size='M', color='Red', selected_image=url)
+        order = Order.objects.create(
+            user=self.user, order_number='ORD-1', subtotal=Decimal('40'), total=Decimal('40'), **DETAILS
+        )
+        line = OrderLine.objects.create(
+            order=order, product=product, title=product.title, selected_image=url,
+            quantity=1, unit_price=Decimal('40'), line_total=Decimal('40'),
+        )
+        # store_blob's reference belongs to the ProductMedia row
+        self.assertEqual(self.refs(name), 4)
+
+        for instance, left in ((cart, 3), (media, 2), (line, 1)):
+            self.delete(instance)
+            self.assertEqual(self.refs(name), left)
+            self.assertTrue(default_storage.exists(name))
+
+        # Pointing the product elsewhere drops the last reference
+        product.photo = 'products/elsewhere.jpg'
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertIsNone(self.refs(name))
+        self.assertFalse(default_storage.exists(name))
+
+    def test_stored_again_before_the_delete_runs(self):
+        name, _ = self.store()
+        media = ProductMedia.objects.create(product=make_product(self.category), file=name)
+        with self.captureOnCommitCallbacks() as callbacks:
+            media.delete()
+        self.assertEqual(self.refs(name), 0)
+
+        # Another upload of the same content lands before the deletion
+        self.assertEqual(self.store(), (name, False))
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.refs(name), 1)
+        self.assertTrue(default_storage.exists(name))
+
+    def test_stored_again_after_the_delete(self):
+        name, _ = self.store()
+        media = ProductMedia.objects.create(product=make_product(self.category), file=name)
+        self.delete(media)
+        self.assertFalse(default_storage.exists(name))
+
+        self.assertEqual(self.store(), (name, True))
+        self.assertEqual(self.refs(name), 1)
+        self.assertTrue(default_storage.exists(name))
+
+class MediaServingTests(SimpleTestCase):
+    CONTENT = bytes(range(256)) * 4
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        (self.root / 'videos').mkdir()
+        (self.root / 'videos' / 'clip.mp4').write_bytes(self.CONTENT)
+
+    def get(self, path='videos/clip.mp4', **headers):
+        request = RequestFactory().get(f'/media/{path}', **headers)
+        return serve_media(request, path, document_root=self.root)
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=0-99', 1024), (0, 99))
+        self.assertEqual(parse_range('bytes=1000-2000', 1024), (1000, 1023))
+        self.assertEqual(parse_range('bytes=-100', 1024), (924, 1023))
+        self.assertEqual(parse_range('bytes=500-', 1024), (500, 1023))
+        self.assertIs(parse_range('bytes=2000-', 1024), False)
+        self.assertIs(parse_range('bytes=-0', 1024), False)
+        # Whole file: no header, several ranges, nonsense
+        self.assertIsNone(parse_range('', 1024))
+        self.assertIsNone(parse_range('bytes=0-1,5-9', 1024))
+        self.assertIsNone(parse_range('bytes=9-1', 1024))
+
+    def test_whole_file(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], str(len(self.CONTENT)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=2592000')
+        self.assertEqual(self.body(response), self.CONTENT)
+
+    def test_single_range(self):
+        response = self.get(HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(self.body(response), self.CONTENT[10:20])
+
+    def test_suffix_range(self):
+        response = self.get(HTTP_RANGE='bytes=-24')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 1000-1023/1024')
+        self.assertEqual(self.body(response), self.CONTENT[-24:])
+
+    def test_open_ended_range(self):
+        response = self.get(HTTP_RANGE='bytes=1000-')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 1000-1023/1024')
+        self.assertEqual(self.body(response), self.CONTENT[1000:])
+
+    def test_unsatisfiable_range(self):
+        response = self.get(HTTP_RANGE='bytes=5000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+    def test_if_none_match(self):
+        etag = self.get()['ETag']
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_if_modified_since(self):
+        last_modified = self.get()['Last-Modified']
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=http_date(0)).status_code, 200)
+
+    def test_if_range(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag).status_code, 206)
+        # The file changed since the client's copy: send all of it
+        response = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.CONTENT)
+
+    def test_content_addressed_names_are_immutable(self):
+        name = f'{"a" * 64}.mp4'
+        (self.root / 'videos' / name).write_bytes(self.CONTENT)
+        self.assertEqual(self.get(f'videos/{name}')['Cache-Control'], f'public, max-age={IMMUTABLE_MAX_AGE}, immutable')
+
+    def test_path_traversal(self):
+        with self.assertRaises(Http404):
+            self.get('videos/../../etc/passwd')
+        with self.assertRaises(Http404):
+            self.get('missing.mp4')
+        # Without a document root only the upload directories of the project are served
+        request = RequestFactory().get('/media/eshop/settings.py')
+        with self.assertRaises(Http404):
+            serve_media(request, 'eshop/settings.py')
+        with self.assertRaises(Http404):
+            serve_media(request, 'products/../eshop/settings.py')
+
+    def test_route_leaves_other_urls_alone(self):
+        # APPEND_SLASH still redirects, the media route only answers under MEDIA_URL
+        self.assertRedirects(
+            self.client.get('/orders/shop'), '/orders/shop/', status_code=301, fetch_redirect_response=False
+        )
+        self.assertEqual(self.client.get('/media/eshop/settings.py').status_code, 404)
+
+
+
+
+class StaticFilesTests(SimpleTestCase):
+    """collectstatic writes hashed, pre-compressed copies; serve_static picks the encoding and cache policy."""
+
+    CSS = ''.join(f'.rule-{i} {{ color: #{i:06x}; margin: {i}px; }}\n' for i in range(100)).encode()
+
+    def setUp(self):
+        source, root = tempfile.TemporaryDirectory(), tempfile.TemporaryDirectory()
+        self.addCleanup(source.cleanup)
+        self.addCleanup(root.cleanup)
+        (Path(source.name) / 'css').mkdir()
+        (Path(source.name) / 'css' / 'site.css').write_bytes(self.CSS)
+        (Path(source.name) / 'css' / 'tiny.css').write_bytes(b'body { margin: 0; }')
+        (Path(source.name) / 'logo.png').write_bytes(b'\x89PNG' + bytes(2048))
+
+        overrides = override_settings(
+            STATIC_ROOT=root.name, STATICFILES_DIRS=[source.name],
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.root = Path(root.name)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        hashed_names.cache_clear()
+        self.addCleanup(hashed_names.cache_clear)
+        self.hashed = staticfiles_storage.stored_name('css/site.css')
+
+    def get(self, path, accept_encoding=None):
+        headers = {'HTTP_ACCEPT_ENCODING': accept_encoding} if accept_encoding is not None else {}
+        return serve_static(RequestFactory().get(f'/static/{path}', **headers), path)
+
+    def test_siblings_for_hashed_and_plain_names(self):
+        self.assertNotEqual(self.hashed, 'css/site.css')
+        encodings = ['gz', 'br'] if brotli else ['gz']
+        for name in (self.hashed, 'css/site.css'):
+            for encoding in encodings:
+                self.assertTrue((self.root / f'{name}.{encoding}').is_file(), f'{name}.{encoding}')
+            self.assertEqual(gzip.decompress((self.root / f'{name}.gz').read_bytes()), self.CSS)
+        # Too small to be worth it, or not a compressible type
+        tiny = staticfiles_storage.stored_name('css/tiny.css')
+        logo = staticfiles_storage.stored_name('logo.png')
+        self.assertEqual(list(self.root.glob(f'{tiny}.*')) + list(self.root.glob(f'{logo}.*')), [])
+
+    def test_accept_encoding_negotiation(self):
+        br = self.root / f'{self.hashed}.br'
+        if not br.exists():
+            br.write_bytes(b'brotli body')
+        cases = {
+            'gzip, deflate, br': 'br',
+            'gzip': 'gzip',
+            'br;q=0, gzip;q=0.5': 'gzip',
+            'identity': None,
+            None: None,
+        }
+        for accept_encoding, expected in cases.items():
+            with self.subTest(accept_encoding=accept_encoding):
+                response = self.get(self.hashed, accept_encoding)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.get('Content-Encoding'), expected)
+                self.assertEqual(response['Content-Type'], 'text/css')
+                self.assertIn('Accept-Encoding', response['Vary'])
+        plain = self.get(self.hashed)
+        self.assertEqual(b''.join(plain.streaming_content), self.CSS)
+
+    def test_immutable_only_for_hashed_names(self):
+        self.assertEqual(
+            self.get(self.hashed, 'gzip')['Cache-Control'], f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        )
+        self.assertEqual(self.get('css/site.css', 'gzip')['Cache-Control'], f'public, max-age={UNHASHED_MAX_AGE}')
+
+    def test_siblings_and_manifest_are_not_served(self):
+        for path in (f'{self.hashed}.gz', 'staticfiles.json', '../secret.css'):
+            with self.subTest(path=path), self.assertRaises(Http404):
+                self.get(path)
+
+class FailingEmailBackend(BaseEmailBackend):
+    """Delivery backend for the outbox tests whose server always refuses the message."""
+
+    def send_messages(self, email_messages):
+        raise ConnectionError("Mail server refused the message.")
+
+
+@override_settings(
+    # The test runner swaps EMAIL_BACKEND for locmem; put the outbox back in front of it
+    EMAIL_BACKEND='orders.outbox.OutboxEmailBackend',
+    EMAIL_DELIVERY_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    EMAIL_OUTBOX_THREAD=False,
+)
+class OutboxTests(TestCase):
+
+    def queue(self, status='queued', **fields):
+        return OutgoingEmail.objects.create(
+            subject='Hello', body='Hi', to=['customer@example.com'], status=status, **fields
+        )
+
+    def test_contact_form_and_password_reset_only_enqueue(self):
+        make_user('forgetful@example.com')
+        response = self.client.post(
+            reverse('landing_contact'), {'name': 'Ann', 'email': 'ann@example.com', 'message': 'Hello'}
+        )
+        self.assertRedirects(response, reverse('landing_contact'), fetch_redirect_response=False)
+        self.client.post(reverse('password_reset'), {'email': 'forgetful@example.com'})
+
+        self.assertEqual(mail.outbox, [])
+        queued = OutgoingEmail.objects.order_by('id')
+        self.assertEqual([email.status for email in queued], ['queued', 'queued'])
+        self.assertEqual(queued[1].to, ['forgetful@example.com'])
+
+        call_command('send_queued_email', stdout=io.StringIO())
+        self.assertEqual([message.to for message in mail.outbox], [queued[0].to, ['forgetful@example.com']])
+        self.assertFalse(OutgoingEmail.objects.exclude(status='sent').exists())
+
+    def test_batch_delivery(self):
+        for _ in range(3):
+            self.queue()
+        self.queue(send_after=timezone.now() + timedelta(hours=1))
+
+        self.assertEqual(deliver_outbox(batch_size=2), (2, 0))
+        self.assertEqual(deliver_outbox(batch_size=2), (1, 0))
+        self.assertEqual(deliver_outbox(batch_size=2), (0, 0))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(OutgoingEmail.objects.filter(status='sent').count(), 3)
+
+    @override_settings(EMAIL_DELIVERY_BACKEND='orders.tests.FailingEmailBackend')
+    def test_failure_is_retried_with_backoff(self):
+        email = self.queue()
+        self.assertEqual(deliver_outbox(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('queued', 1))
+        self.assertEqual(email.last_error, 'Mail server refused the message.')
+        self.assertGreater(email.send_after, timezone.now() + timedelta(minutes=1))
+        # Not due again until the backoff is over
+        self.assertEqual(deliver_outbox(), (0, 0))
+
+        OutgoingEmail.objects.filter(pk=email.pk).update(send_after=timezone.now(), attempts=MAX_ATTEMPTS - 1)
+        self.assertEqual(deliver_outbox(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('failed', MAX_ATTEMPTS))
+
+    def test_expired_claims_are_swept(self):
+        expired = timezone.now() - timedelta(seconds=1)
+        interrupted = self.queue(status='sending', attempts=1, send_after=expired)
+        exhausted = self.queue(status='sending', attempts=MAX_ATTEMPTS, send_after=expired)
+        in_flight = self.queue(status='sending', attempts=1, send_after=timezone.now() + timedelta(minutes=5))
+
+        self.assertEqual(deliver_outbox(), (1, 0))
+        statuses = dict(OutgoingEmail.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses, {interrupted.pk: 'sent', exhausted.pk: 'failed', in_flight.pk: 'sending'})
+        self.assertEqual(OutgoingEmail.objects.get(pk=exhausted.pk).last_error, 'Delivery was interrupted.')
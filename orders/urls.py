@@ -9,6 +9,7 @@ urlpatterns = [
     path('apply-coupon/', views.apply_coupon, name='apply_coupon'),
     path('remove-coupon/', views.remove_coupon, name='remove_coupon'),
     path('cart/remove/', views.remove_from_cart_view, name='remove_from_cart'),
+    path('cart/api/', views.cart_api, name='cart_api'),
     path('shop/', views.shop_all_products, name='shop_all'),
     path('shop/category/<int:category_id>/', views.shop_by_category, name='shop_by_category'),
     path('shop/brand/<int:brand_id>/', views.shop_by_brand, name='shop_by_brand'),
@@ -1,7 +1,9 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from eshop_app.models import Product, Banner
 from django.utils import timezone
-from django.views.decorators.http import require_POST
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
+import json
 from datetime import timedelta
 from decimal import Decimal
 from urllib.parse import quote_plus
@@ -10,84 +12,52 @@ from eshop_app.models import Category
 from django.contrib.auth.decorators import login_required
 from eshop_app.models import Category, Brand
 from eshop_app.models import CustomUser
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from eshop_app.models import Contact
 from django.core.mail import send_mail
 from eshop_app.models import Blog, Coupon
 from eshop_app.models import AboutUs, Team, Client
 from .models import Wishlist, Address
-from .models import Cart
+from .models import Cart, Order
 from django.db.models import Q
 from django.template.loader import render_to_string
 from django.db import transaction
 from django.db.models import Max 
 from eshop_app.models import GeneralFAQ
-from decimal import Decimal, ROUND_HALF_UP
+from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
 from django.contrib import messages
+from .listing import category_filter, render_product_listing
+from .pricing import get_cart_pricing, price_buy_now
+from .gallery import get_color_gallery
+from .related import get_related_products
+from .search import search_products
+from .categories import get_category_tree
+from .homepage import homepage_context
+from .checkout import CheckoutError, buy_now, checkout_cart
+from .cart_batch import CartBatchError, apply_cart_operations
+from .coupons import (
+    fresh_coupon, get_active_coupons, limit_message, user_redemption_count, user_redemption_counts,
+)
+from .conditional import blog_detail_etag, product_detail_etag
+from .facets import color_q, facet_counts, filter_by_color, filter_by_size, size_q
 
 
 
 def index(request):
     filter_type = request.GET.get('filter', 'all')
 
-    # Base queryset
-    all_products = Product.objects.filter(status='active')
-
-    # Featured Products
-    featured_products = Product.objects.filter(is_featured=True, status='active').order_by('-created_at')
-
-    # Hot & Discounted Products for Carousel
-    hot_discounted_products = (
-        Product.objects.filter(
-            Q(condition__iexact='Hot') | Q(discount__isnull=False),
-            status='active',
-            deal_end_date__isnull=False
-        )
-        .exclude(discount=0)
-        .filter(deal_end_date__gte=timezone.now())
-        .order_by('-discount', '-created_at')[:10]
-    )
-
-    # Filtering logic for main product grid
-    if filter_type == 'new-arrivals':
-        all_products = all_products.filter(
-            created_at__gte=timezone.now() - timedelta(days=7)
-        ).order_by('-created_at')
-    elif filter_type == 'hot-sales':
-        all_products = all_products.filter(price__lt=50).order_by('-price')
-    else:
-        all_products = all_products.order_by('-created_at')
-
-    homepage_products = all_products[:9]
-
-    # Banners
-    banners = Banner.objects.all()
-
-    # ✅ Fetch only Parent Categories (Main Categories like Men, Women, Kids)
-    parent_categories = Category.objects.filter(is_parent=True, status='active').order_by('title')
-
-    # Wishlist logic
-    if request.user.is_authenticated:
-        wishlisted_ids = Wishlist.objects.filter(user=request.user).values_list('product_id', flat=True)
-    else:
-        wishlisted_ids = []
-
-    context = {
-        'products': homepage_products,
-        'total_products_count': all_products.count(),
-        'filter_type': filter_type,
-        'banners': banners,
-        'featured_products': featured_products,
-        'wishlisted_ids': wishlisted_ids,
-        'hot_discounted_products': hot_discounted_products,
-        'categories': parent_categories,  # ✅ pass to template
-    }
+    # Every section comes from the homepage cache (orders/homepage.py);
+    # index.html also caches the rendered fragments
+    context = homepage_context(filter_type)
 
     return render(request, 'index.html', context)
 
 def category_products(request, id):
     # --- Get main category ---
-    main_category = get_object_or_404(Category, pk=id, status='active')
+    tree = get_category_tree()
+    main_category = tree.get(id, active=True)
+    if main_category is None:
+        raise Http404("Category not found")
 
     # --- Get all query parameters ---
     query = request.GET.get('q', '')
@@ -96,7 +66,8 @@ def category_products(request, id):
     max_price = request.GET.get('max_price')
     size = request.GET.get('size')
     color = request.GET.get('color')
-    sort_option = request.GET.get('sort', 'low_to_high')
+    # Searches default to relevance ordering
+    sort_option = request.GET.get('sort', 'relevance' if query else 'low_to_high')
     subcategory_id = request.GET.get('subcategory')
 
     # --- Base queryset ---
@@ -111,7 +82,7 @@ def category_products(request, id):
         selected_subcat_id = int(subcategory_id)  # Convert to int for comparison
     else:
         # Include main category and all its children
-        child_ids = main_category.children.filter(status='active').values_list('id', flat=True)
+        child_ids = [child.id for child in tree.active_children(main_category.id)]
         products = products.filter(
             Q(category_id=main_category.id) |
             Q(category_id__in=child_ids) |
@@ -131,11 +102,9 @@ def category_products(request, id):
     else:
         selected_brand_id = None
 
-    # --- Search ---
+    # --- Search (full-text backend, annotates search_rank) ---
     if query:
-        products = products.filter(
-            Q(title__icontains=query) | Q(description__icontains=query)
-        )
+        products = search_products(products, query)
 
     # --- Price range filter ---
     if min_price:
@@ -149,41 +118,24 @@ def category_products(request, id):
         except (ValueError, TypeError):
             max_price = None
 
-    # --- Size filter ---
+    # --- Size filter (indexed facet table) ---
     if size:
-        products = products.filter(size__icontains=size)
+        products = filter_by_size(products, size)
 
-    # --- Color filter ---
+    # --- Color filter (indexed facet table) ---
     if color:
-        products = products.filter(color_data__icontains=color)
-
-    # --- Sorting logic ---
-    if sort_option == 'low_to_high':
-        products = products.order_by('price')
-    elif sort_option == 'high_to_low':
-        products = products.order_by('-price')
-    else:
-        products = products.order_by('-created_at')
+        products = filter_by_color(products, color)
 
     # --- Sidebar Data ---
-    subcategories = main_category.children.filter(status='active')
+    subcategories = tree.active_children(main_category.id)
     brands = Brand.objects.filter(status='active').order_by('title')
     sizes_list = ['xs', 's', 'm', 'l', 'xl', '2xl', 'xxl', '3xl', '4xl']
     colors_list = ['c-1', 'c-2', 'c-3', 'c-4', 'c-5', 'c-6', 'c-7', 'c-8', 'c-9']
 
-    # --- Wishlist Data ---
-    if request.user.is_authenticated:
-        wishlisted_ids = list(
-            Wishlist.objects.filter(user=request.user).values_list('product_id', flat=True)
-        )
-    else:
-        wishlisted_ids = []
-
     # --- Context ---
     context = {
         'main_category': main_category,
         'subcategories': subcategories,
-        'products': products,
         'brands': brands,
         'selected_brand_id': selected_brand_id,
         'selected_min_price': min_price,
@@ -194,82 +146,38 @@ def category_products(request, id):
         'colors_list': colors_list,
         'search_query': query,
         'selected_sort': sort_option,
-        'wishlisted_ids': wishlisted_ids,
         'selected_subcat_id': selected_subcat_id,  # This will be None when no subcategory is selected
     }
 
-    return render(request, 'category_products.html', context)
+    # Sorting and keyset pagination are handled by the listing engine
+    return render_product_listing(
+        request, 'category_products.html', 'category_product_items.html',
+        products, context, sort_option=sort_option
+    )
 
 
+# Browsers revalidate every time and get a 304 while nothing on the page changed
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=product_detail_etag)
 def product_detail_view(request, pk):
     product = get_object_or_404(Product, pk=pk)
 
     # ✅ Handle sizes cleanly
     sizes = [s.strip() for s in product.size.split(',')] if product.size else []
 
-    colors = []
-    primary_color = None
-    gallery_images = []
-
-    # ✅ Build color-based gallery
-    if hasattr(product, 'color_data') and product.color_data:
-        for color in product.color_data:
-            color_name = color.get('name')
-            if not color_name:
-                continue
-
-            media = product.media_files.filter(
-                file_type='image',
-                color_name__iexact=color_name
-            )
-
-            if media.exists():
-                ordered = list(media.order_by('-is_primary', '-id'))
-                color['images'] = [m.file.url for m in ordered]
-                color['thumb'] = ordered[0].file.url
-                colors.append(color)
-
-        if colors:
-            primary_color = colors[0]['name']
-            gallery_images = colors[0]['images']
+    # ✅ Color-based gallery (one media query, cached per product)
+    gallery = get_color_gallery(product)
 
-    # ✅ Fallback: no color-specific images
-    if not gallery_images:
-        gallery_images = [
-            m.file.url for m in product.media_files.filter(file_type='image').order_by('-is_primary', '-id')
-        ]
-
-    # ✅ Mark active color
-    for color in colors:
-        color['is_current'] = (color['name'] == primary_color)
-
-    # ✅ Get related products
-    top_category = product.category
-    while top_category and top_category.parent:
-        top_category = top_category.parent
-
-    subcategories = Category.objects.filter(parent=top_category)
-
-    related_products = Product.objects.filter(
-        Q(category=top_category) | Q(category__in=subcategories)
-    ).exclude(pk=pk).order_by('-id')[:8]
-
-    # ✅ Get wishlisted items for current user
-    if request.user.is_authenticated:
-        wishlisted_ids = list(
-            Wishlist.objects.filter(user=request.user).values_list('product_id', flat=True)
-        )
-    else:
-        wishlisted_ids = []
+    # ✅ Related products from the precomputed index
+    related_products = get_related_products(product)
 
     context = {
         "product": product,
         "sizes": sizes,
-        "colors": colors,
-        "gallery_images": gallery_images,
-        "primary_color": primary_color,
+        "colors": gallery['colors'],
+        "gallery_images": gallery['gallery_images'],
+        "primary_color": gallery['primary_color'],
         "related_products": related_products,
-        "wishlisted_ids": wishlisted_ids,
     }
 
     return render(request, "product_details.html", context)
@@ -325,99 +233,87 @@ def add_to_cart_view(request, product_id):
 
     return redirect('product_detail', pk=product_id)
 
+@login_required
+@require_POST
+def cart_api(request):
+    """
+    Apply a batch of cart operations (JSON body: {"operations": [...]}, see
+    orders/cart_batch.py) and return the new totals and badge count.
+    """
+    try:
+        payload = json.loads(request.body or b'{}')
+        apply_cart_operations(request.user, payload.get('operations'))
+    except (ValueError, AttributeError):
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON body.'}, status=400)
+    except CartBatchError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    pricing = get_cart_pricing(request)
+    applied_coupon = request.session.get('applied_coupon')
+    discount_amount = Decimal('0.00')
+    if applied_coupon:
+        discount_amount = pricing.coupon_amount(
+            applied_coupon.get('discount_type'), applied_coupon.get('discount_value')
+        )
+
+    return JsonResponse({
+        'status': 'success',
+        'items': [
+            {
+                'item_id': line.item_id,
+                'product_id': line.product.id,
+                'quantity': line.quantity,
+                'line_total': str(line.line_total),
+                'line_discount': str(line.line_discount),
+            }
+            for line in pricing.lines
+        ],
+        'subtotal': str(pricing.subtotal),
+        'shipping': str(pricing.shipping),
+        'discount_amount': str(discount_amount),
+        'total': str(pricing.total(discount_amount)),
+        'cart_total_quantity': sum(line.quantity for line in pricing.lines),
+    })
+
+
 def cart_preview(request):
     cart_items = Cart.objects.filter(user=request.user).select_related('product')[:3]
     html = render_to_string('cart_preview.html', {'cart_items': cart_items})
     return JsonResponse({'html': html})
 
 
-@login_required
 @login_required
 def shopping_cart_view(request):
-    cart_items = Cart.objects.filter(user=request.user).select_related('product')
+    pricing = get_cart_pricing(request)
 
-    if not cart_items.exists():
+    if not pricing:
         return redirect('shop_all')
 
-    cart_subtotal = Decimal('0.00')
-    total_shipping = Decimal('0.00')
-    product_discount_total = Decimal('0.00')
-    all_free_shipping = True
-    enriched_items = []
-
-    # --- Calculate per-item and subtotal ---
-    for item in cart_items:
-        product = item.product
-        qty = item.quantity or 1
-        price = Decimal(product.price or 0).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        discount_percent = Decimal(product.discount or 0)
-
-        per_unit_discount = (price * discount_percent / 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP) if discount_percent > 0 else Decimal('0.00')
-        line_original = (price * qty).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        line_discount = (per_unit_discount * qty).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        line_after_discount = (line_original - line_discount).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-
-        cart_subtotal += line_after_discount
-        product_discount_total += line_discount
-
-        # Shipping
-        if hasattr(product, 'shipping_label') and product.shipping_label == 'free':
-            product_shipping = Decimal('0.00')
-        else:
-            product_shipping = Decimal(str(getattr(product, 'shipping_charge', 10.00))).quantize(Decimal('0.01'))
-            all_free_shipping = False
-
-        total_shipping += product_shipping
-
-        image_url = item.selected_image or (getattr(product.photo, 'url', '') if getattr(product, 'photo', None) else "")
-
-        enriched_items.append({
-            'product': product,
-            'quantity': qty,
-            'size': item.size or 'N/A',
-            'color': item.color or 'N/A',
-            'price': price,
-            'discount_percent': discount_percent,
-            'per_unit_discount': per_unit_discount,
-            'line_original': line_original,
-            'line_discount': line_discount,
-            'line_after_discount': line_after_discount,
-            'item_id': item.id,
-            'shipping_charge': product_shipping,
-            'selected_image': image_url,
-        })
-
-    if all_free_shipping:
-        total_shipping = Decimal('0.00')
-
     # --- Apply coupon if present ---
     applied_coupon = request.session.get('applied_coupon')
     coupon_amount = Decimal('0.00')
 
     if applied_coupon:
-        discount_type = applied_coupon.get('discount_type')
-        discount_value = Decimal(applied_coupon.get('discount_value') or 0)
-        
         # Calculate coupon discount based on CART SUBTOTAL only (before shipping)
-        if discount_type == 'percent':
-            coupon_amount = (cart_subtotal * discount_value / Decimal('100')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        else:
-            coupon_amount = min(discount_value, cart_subtotal).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        coupon_amount = pricing.coupon_amount(
+            applied_coupon.get('discount_type'), applied_coupon.get('discount_value')
+        )
 
-        # Calculate final total: (subtotal - coupon) + shipping
-        order_total = (cart_subtotal - coupon_amount + total_shipping).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-    else:
-        order_total = (cart_subtotal + total_shipping).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    order_total = pricing.total(coupon_amount)
 
     # --- Coupons list ---
-    now = timezone.now()
-    coupons = Coupon.objects.filter(is_active=True, start_date__lte=now, end_date__gte=now)
+    coupons = get_active_coupons().coupons
+    used_by_user = user_redemption_counts(request.user, coupons)
+    coupons = [
+        coupon for coupon in coupons
+        if limit_message(coupon, used_by_user.get(coupon.id, 0)) is None
+    ]
 
     context = {
-        'cart_items': enriched_items,
-        'cart_subtotal': cart_subtotal.quantize(Decimal('0.01')),
-        'shipping_cost': total_shipping.quantize(Decimal('0.01')),
-        'product_discount_total': product_discount_total.quantize(Decimal('0.01')),
+        'cart_items': pricing.lines,
+        'cart_subtotal': pricing.subtotal,
+        'shipping_cost': pricing.shipping,
+        'product_discount_total': pricing.product_discount_total,
         'order_total': order_total,
         'coupons': coupons,
         'applied_coupon': applied_coupon,
@@ -426,66 +322,36 @@ def shopping_cart_view(request):
 
     return render(request, 'shopping_cart.html', context)
 
+@login_required
 def apply_coupon(request):
     if request.method == 'POST':
         code = request.POST.get('coupon_code')
-        now = timezone.now()
 
-        try:
-            coupon = Coupon.objects.get(
-                code=code,
-                is_active=True,
-                start_date__lte=now,
-                end_date__gte=now
-            )
-        except Coupon.DoesNotExist:
+        # The row, not the cached list: another worker may have just changed it
+        coupon = fresh_coupon(code)
+        if coupon is None:
             messages.error(request, "Invalid coupon code.")
             request.session.pop('applied_coupon', None)
             return redirect('shopping_cart')
 
-        cart_items = Cart.objects.filter(user=request.user).select_related('product')
-
-        # Calculate cart subtotal EXACTLY the same way as shopping_cart_view
-        cart_subtotal = Decimal('0.00')
-        total_shipping = Decimal('0.00')
-        all_free_shipping = True
-
-        for item in cart_items:
-            product = item.product
-            qty = item.quantity or 1
-            price = Decimal(product.price or 0).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-            discount_percent = Decimal(product.discount or 0)
-
-            # Calculate exactly like shopping_cart_view
-            per_unit_discount = (price * discount_percent / 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP) if discount_percent > 0 else Decimal('0.00')
-            line_original = (price * qty).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-            line_discount = (per_unit_discount * qty).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-            line_after_discount = (line_original - line_discount).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-
-            cart_subtotal += line_after_discount
-
-            # Shipping calculation
-            if hasattr(product, 'shipping_label') and product.shipping_label == 'free':
-                product_shipping = Decimal('0.00')
-            else:
-                product_shipping = Decimal(str(getattr(product, 'shipping_charge', 10.00))).quantize(Decimal('0.01'))
-                all_free_shipping = False
-            total_shipping += product_shipping
+        used_by_user = user_redemption_count(coupon, request.user) if coupon.per_user_limit else 0
+        limit_error = limit_message(coupon, used_by_user)
+        if limit_error:
+            messages.error(request, limit_error)
+            request.session.pop('applied_coupon', None)
+            return redirect('shopping_cart')
 
-        if all_free_shipping:
-            total_shipping = Decimal('0.00')
+        # Same breakdown as shopping_cart_view
+        pricing = get_cart_pricing(request)
 
         # Check minimum order amount based on SUBTOTAL (not including shipping)
-        if cart_subtotal < coupon.min_order_amount:
+        if pricing.subtotal < coupon.min_order_amount:
             messages.error(request, f"Coupon requires minimum order of ₹{coupon.min_order_amount}")
             request.session.pop('applied_coupon', None)
             return redirect('shopping_cart')
 
         # Calculate discount amount based on SUBTOTAL only
-        if coupon.discount_type == 'percent':
-            discount_amount = (cart_subtotal * coupon.discount_value / Decimal('100')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        else:
-            discount_amount = min(coupon.discount_value, cart_subtotal).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        discount_amount = pricing.coupon_amount(coupon.discount_type, coupon.discount_value)
 
         # Store in session
         request.session['applied_coupon'] = {
@@ -567,7 +433,8 @@ def shop_all_products(request):
     max_price = request.GET.get('max_price')
     size = request.GET.get('size')
     color = request.GET.get('color')
-    sort_option = request.GET.get('sort', 'low_to_high')
+    # Searches default to relevance ordering
+    sort_option = request.GET.get('sort', 'relevance' if query else 'low_to_high')
 
     # Base queryset
     products = Product.objects.filter(status='active')
@@ -577,119 +444,88 @@ def shop_all_products(request):
     selected_parent_id = None
     is_parent_active = False  # Define at function scope
 
+    # Sidebar filters are collected per facet so the facet counts can
+    # leave each facet's own selection out
+    filters = {}
+
     # --- Apply Filters ---
     
+    tree = get_category_tree()
+
     # Category filter
     if category_id:
-        try:
-            category = Category.objects.get(pk=category_id, status='active')
+        category = tree.get(category_id, active=True)
+        if category is None:
+            category_id = None
+        else:
             selected_category = category
             
-            # Determine the set of category IDs to filter products by
+            # A parent covers its own products and its children's; a child
+            # its products via category_id OR child_category_id
+            filters['category'] = category_filter(category, tree)
             if category.is_parent:
-                # If parent is selected, include products assigned to parent OR any child
-                child_ids = category.children.filter(status='active').values_list('id', flat=True)
-                
-                # Filter products that have:
-                # 1. category_id = parent.id OR
-                # 2. category_id in child_ids OR
-                # 3. child_category_id in child_ids
-                products = products.filter(
-                    Q(category_id=category.id) |
-                    Q(category_id__in=child_ids) |
-                    Q(child_category_id__in=child_ids)
-                )
                 selected_parent_id = category.id
                 is_parent_active = True
             else:
-                # If subcategory (child) is selected, show products assigned to this child
-                # Products can be assigned via category_id OR child_category_id
-                products = products.filter(
-                    Q(category_id=category.id) | 
-                    Q(child_category_id=category.id)
-                )
                 # Find the parent of the subcategory for sidebar highlighting
-                if category.parent:
-                    selected_parent_id = category.parent.id
+                if category.parent_id in tree.nodes:
+                    selected_parent_id = category.parent_id
                     is_parent_active = True
-        except Category.DoesNotExist:
-            category_id = None
     
     # Brand filter
+    selected_brand_id = None
     if brand_id:
         try:
-            brand_id_int = int(brand_id)
-            products = products.filter(brand_id=brand_id_int)
+            selected_brand_id = int(brand_id)
+            filters['brand'] = Q(brand_id=selected_brand_id)
         except (ValueError, TypeError):
             brand_id = None
     
-    # Search query
+    # Search query (full-text backend, annotates search_rank)
     if query:
-        products = products.filter(
-            Q(title__icontains=query) | 
-            Q(description__icontains=query)
-        )
+        products = search_products(products, query)
     
     # Price range filter
+    price_filter = Q()
     if min_price:
         try:
-            products = products.filter(price__gte=Decimal(min_price))
-        except (ValueError, TypeError):
+            price_filter &= Q(price__gte=Decimal(min_price))
+        except (ValueError, TypeError, InvalidOperation):
             min_price = None
     if max_price:
         try:
-            products = products.filter(price__lte=Decimal(max_price))
-        except (ValueError, TypeError):
+            price_filter &= Q(price__lte=Decimal(max_price))
+        except (ValueError, TypeError, InvalidOperation):
             max_price = None
+    if price_filter:
+        filters['price'] = price_filter
     
-    # Size filter - handle comma-separated sizes in product
+    # Size filter - exact match on the normalized size facet
     if size:
-        products = products.filter(size__icontains=size)
+        filters['size'] = size_q(size)
     
-    # Color filter - search in color_data JSONField
+    # Color filter - exact match on the normalized colour facet
     if color:
-        products = products.filter(color_data__icontains=color)
-
-    # --- Sorting logic ---
-    if sort_option == 'low_to_high':
-        products = products.order_by('price')
-    elif sort_option == 'high_to_low':
-        products = products.order_by('-price')
-    else:
-        products = products.order_by('-created_at')
+        filters['color'] = color_q(color)
 
     # --- Sidebar data ---
-    parent_cats = Category.objects.filter(
-        is_parent=True, 
-        status='active'
-    ).prefetch_related('children')
+    parent_cats = tree.parents()
     
     brands = Brand.objects.filter(status='active').order_by('title')
 
-    # --- Sizes and colors ---
-    sizes_list = ['xs', 's', 'm', 'l', 'xl', '2xl', 'xxl', '3xl', '4xl']
-    colors_list = ['c-1', 'c-2', 'c-3', 'c-4', 'c-5', 'c-6', 'c-7', 'c-8', 'c-9'] 
+    # Per-option counts for the current filter set; empty options are hidden.
+    # Infinite-scroll requests only render product cards, so skip them there.
+    facets = None
+    if request.GET.get('format') != 'json':
+        facets = facet_counts(products, filters, category_tree=tree, brands=brands)
 
-    # --- Wishlist data ---
-    if request.user.is_authenticated:
-        wishlisted_ids = list(
-            Wishlist.objects.filter(user=request.user).values_list('product_id', flat=True)
-        )
-    else:
-        wishlisted_ids = []
-
-    # Convert brand_id to int for template comparison
-    selected_brand_id = None
-    if brand_id:
-        try:
-            selected_brand_id = int(brand_id)
-        except (ValueError, TypeError):
-            pass
+    for sidebar_filter in filters.values():
+        products = products.filter(sidebar_filter)
 
     context = {
-        'products': products,
         'parent_cats': parent_cats,
         'brands': brands,
+        'facets': facets,
         'selected_category': selected_category,
         'selected_parent_id': selected_parent_id,
         'selected_brand_id': selected_brand_id,
@@ -700,15 +536,33 @@ def shop_all_products(request):
         'selected_max_price': max_price,
         'selected_size': size,
         'selected_color': color,
-        'sizes_list': sizes_list,
-        'colors_list': colors_list,
         'search_query': query,
         'selected_sort': sort_option,
-        'wishlisted_ids': wishlisted_ids,
     }
 
-    return render(request, 'shop_all.html', context)
+    # Sorting and keyset pagination are handled by the listing engine
+    return render_product_listing(
+        request, 'shop_all.html', 'shop_product_items.html',
+        products, context, sort_option=sort_option
+    )
+
+
+
+def _shop_sidebar(request, filters):
+    """
+    Sidebar data for the shop_by_* pages: categories, brands and facet counts
+    for active products narrowed by `filters` (facet name -> Q).
+    """
+    tree = get_category_tree()
+    brands = Brand.objects.filter(status='active').order_by('title')
 
+    facets = None
+    if request.GET.get('format') != 'json':
+        facets = facet_counts(
+            Product.objects.filter(status='active'), filters,
+            category_tree=tree, brands=brands,
+        )
+    return {'parent_cats': tree.parents(), 'brands': brands, 'facets': facets}
 
 
 def shop_by_category(request, category_id):
@@ -716,50 +570,22 @@ def shop_by_category(request, category_id):
     Display products filtered by category (handles both parent and child categories)
     """
     # Get main or subcategory
-    category = get_object_or_404(Category, pk=category_id, status='active')
+    tree = get_category_tree()
+    category = tree.get(category_id, active=True)
+    if category is None:
+        raise Http404("Category not found")
 
-    # If it's a parent category, include all child categories + itself
-    if category.is_parent:
-        child_ids = category.children.filter(status='active').values_list('id', flat=True)
-        
-        # Products can be assigned to:
-        # 1. Parent category directly (category_id = parent.id)
-        # 2. Child category via category_id
-        # 3. Child category via child_category_id
-        products = Product.objects.filter(
-            Q(category_id=category.id) |
-            Q(category_id__in=child_ids) |
-            Q(child_category_id__in=child_ids),
-            status='active'
-        ).distinct()
-    else:
-        # Subcategory – show products assigned via category_id OR child_category_id
-        products = Product.objects.filter(
-            Q(category_id=category.id) | 
-            Q(child_category_id=category.id),
-            status='active'
-        ).distinct()
-
-    # Sidebar data
-    parent_cats = Category.objects.filter(is_parent=True, status='active')
-    brands = Brand.objects.filter(status='active')
-
-    # Wishlist data
-    if request.user.is_authenticated:
-        wishlisted_ids = list(
-            Wishlist.objects.filter(user=request.user).values_list('product_id', flat=True)
-        )
-    else:
-        wishlisted_ids = []
+    # A parent includes all child categories + itself
+    products_filter = category_filter(category, tree)
+    products = Product.objects.filter(products_filter, status='active')
 
     context = {
-        'products': products,
-        'parent_cats': parent_cats,
-        'brands': brands,
+        **_shop_sidebar(request, {'category': products_filter}),
         'selected_category': category,
-        'wishlisted_ids': wishlisted_ids,
     }
-    return render(request, 'shop_all.html', context)
+    return render_product_listing(
+        request, 'shop_all.html', 'shop_product_items.html', products, context
+    )
 
 
 def shop_by_brand(request, brand_id):
@@ -768,57 +594,33 @@ def shop_by_brand(request, brand_id):
     """
     brand = get_object_or_404(Brand, pk=brand_id, status='active')
     products = Product.objects.filter(brand=brand, status='active')
-    
-    parent_cats = Category.objects.filter(is_parent=True, status='active')
-    brands = Brand.objects.filter(status='active')
-
-    # Wishlist data
-    if request.user.is_authenticated:
-        wishlisted_ids = list(
-            Wishlist.objects.filter(user=request.user).values_list('product_id', flat=True)
-        )
-    else:
-        wishlisted_ids = []
 
     context = {
-        'products': products,
-        'parent_cats': parent_cats,
-        'brands': brands,
+        **_shop_sidebar(request, {'brand': Q(brand=brand)}),
         'selected_category': None,
         'selected_brand': brand,
-        'wishlisted_ids': wishlisted_ids,
     }
-    return render(request, 'shop_all.html', context)
+    return render_product_listing(
+        request, 'shop_all.html', 'shop_product_items.html', products, context
+    )
 
 
 def shop_by_color(request, color):
     """
     Display products filtered by color
     """
-    products = Product.objects.filter(color_data__icontains=color, status='active')
-
-    parent_cats = Category.objects.filter(is_parent=True, status='active')
-    brands = Brand.objects.filter(status='active')
-
-    # Wishlist data
-    if request.user.is_authenticated:
-        wishlisted_ids = list(
-            Wishlist.objects.filter(user=request.user).values_list('product_id', flat=True)
-        )
-    else:
-        wishlisted_ids = []
+    products = filter_by_color(Product.objects.filter(status='active'), color)
 
     context = {
-        'products': products,
-        'parent_cats': parent_cats,
-        'brands': brands,
+        **_shop_sidebar(request, {'color': color_q(color)}),
         'selected_color': color,
         'selected_category': None,
         'selected_brand': None,
         'selected_size': None,
-        'wishlisted_ids': wishlisted_ids,
     }
-    return render(request, 'shop_all.html', context)
+    return render_product_listing(
+        request, 'shop_all.html', 'shop_product_items.html', products, context
+    )
 
 
 # --- Shop by Size ---
@@ -826,65 +628,38 @@ def shop_by_size(request, size):
     """
     Display products filtered by size
     """
-    products = Product.objects.filter(size__icontains=size, status='active')
-
-    parent_cats = Category.objects.filter(is_parent=True, status='active')
-    brands = Brand.objects.filter(status='active')
-
-    # Wishlist data
-    if request.user.is_authenticated:
-        wishlisted_ids = list(
-            Wishlist.objects.filter(user=request.user).values_list('product_id', flat=True)
-        )
-    else:
-        wishlisted_ids = []
+    products = filter_by_size(Product.objects.filter(status='active'), size)
 
     context = {
-        'products': products,
-        'parent_cats': parent_cats,
-        'brands': brands,
+        **_shop_sidebar(request, {'size': size_q(size)}),
         'selected_size': size,
         'selected_category': None,
         'selected_brand': None,
         'selected_color': None,
-        'wishlisted_ids': wishlisted_ids,
     }
-    return render(request, 'shop_all.html', context)
+    return render_product_listing(
+        request, 'shop_all.html', 'shop_product_items.html', products, context
+    )
 
 
 def shop_by_price(request, min_price, max_price):
     """
     Display products filtered by price range
     """
-    products = Product.objects.filter(
-        price__gte=min_price, 
-        price__lte=max_price, 
-        status='active'
-    )
-
-    parent_cats = Category.objects.filter(is_parent=True, status='active')
-    brands = Brand.objects.filter(status='active')
-
-    # Wishlist data
-    if request.user.is_authenticated:
-        wishlisted_ids = list(
-            Wishlist.objects.filter(user=request.user).values_list('product_id', flat=True)
-        )
-    else:
-        wishlisted_ids = []
+    price_filter = Q(price__gte=min_price, price__lte=max_price)
+    products = Product.objects.filter(price_filter, status='active')
 
     context = {
-        'products': products,
-        'parent_cats': parent_cats,
-        'brands': brands,
+        **_shop_sidebar(request, {'price': price_filter}),
         'selected_price_range': f"{min_price}-{max_price}",
         'selected_category': None,
         'selected_brand': None,
         'selected_color': None,
         'selected_size': None,
-        'wishlisted_ids': wishlisted_ids,
     }
-    return render(request, 'shop_all.html', context)
+    return render_product_listing(
+        request, 'shop_all.html', 'shop_product_items.html', products, context
+    )
 
 @login_required
 def profile_view(request):
@@ -945,6 +720,7 @@ def landing_contact(request):
         recipient_list = ['vasant@crawlerstechnologies.com']
 
         try:
+            # Only queued here; delivered by orders/outbox.py
             send_mail(subject, full_message, email, recipient_list)
             # Store success message in session
             request.session['success_message'] = "Your message has been sent successfully! We will get back to you."
@@ -964,6 +740,8 @@ def landing_blog(request):
     }
     return render(request, 'landing_blog.html', context)
 
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=blog_detail_etag)
 def landing_blog_detail(request, slug):
     blog = get_object_or_404(Blog, slug=slug, status=1)
     return render(request, 'landing_blog_detail.html', {'blog': blog})
@@ -999,7 +777,7 @@ def toggle_wishlist(request, product_id):
             else:
                 is_added = True
 
-            # Get updated wishlist count
+            # Counted in the database: the cached id set is only dropped once this commits
             wishlist_count = Wishlist.objects.filter(user=request.user).count()
 
             return JsonResponse({
@@ -1036,37 +814,66 @@ def wishlist_preview(request):
     return JsonResponse({'html': html})
 
 
+CHECKOUT_FIELDS = ('first_name', 'last_name', 'email', 'phone', 'address', 'payment_method')
+
+
+def _checkout_details(request):
+    details = {field: request.POST.get(field, '').strip() for field in CHECKOUT_FIELDS}
+    missing = [field for field in CHECKOUT_FIELDS[:5] if not details[field]]
+    if missing:
+        raise CheckoutError("Please fill in all required billing details.")
+    return details
+
+
+def _order_placed_url(order):
+    # Land on the tracking page for the new order
+    return f"{reverse('track_order')}?order_number={order.order_number}&email={quote_plus(order.email)}&success=1"
+
+
 def buy_now_view(request, pk):
+    product = get_object_or_404(Product, pk=pk)
+    error_message = None
+
+    if request.method == 'POST':
+        if not request.user.is_authenticated:
+            return redirect(f"{reverse('login')}?next={request.path}")
+        try:
+            quantity = int(request.POST.get('quantity', 1))
+        except ValueError:
+            quantity = 0
+        try:
+            order = buy_now(
+                request.user, product.pk, quantity, _checkout_details(request),
+                size=request.POST.get('size', ''),
+                color=request.POST.get('color', ''),
+                coupon_code=request.POST.get('coupon_code') or None,
+            )
+        except CheckoutError as e:
+            error_message = str(e)
+        else:
+            return redirect(_order_placed_url(order))
+
     # ✅ Remove any previously applied coupon when entering Buy Now page
     if 'applied_coupon' in request.session:
         del request.session['applied_coupon']
 
-    product = get_object_or_404(Product, pk=pk)
     size = request.GET.get('size')
     color = request.GET.get('color')
-    quantity = int(request.GET.get('quantity', 1))
-    order_total = Decimal(str(product.price)) * Decimal(str(quantity))
-
-    now = timezone.now()
+    try:
+        quantity = max(int(request.GET.get('quantity', 1)), 1)
+    except ValueError:
+        quantity = 1
+    order_total = price_buy_now(product, quantity).subtotal
 
     # ✅ Fetch only valid coupons
-    coupons = Coupon.objects.filter(
-        is_active=True,
-        min_order_amount__lte=order_total,
-        start_date__lte=now
-    ).filter(
-        Q(end_date__isnull=True) | Q(end_date__gte=now)
-    )
+    coupons = get_active_coupons().eligible(order_total)
 
-    valid_coupons = []
-    for coupon in coupons:
-        if coupon.usage_limit > 0 and hasattr(coupon, "used_count"):
-            if coupon.used_count >= coupon.usage_limit:
-                continue
-        if coupon.per_user_limit > 0 and hasattr(coupon, "used_by_user_count"):
-            if coupon.used_by_user_count >= coupon.per_user_limit:
-                continue
-        valid_coupons.append(coupon)
+    # Hide coupons this customer can no longer use
+    used_by_user = user_redemption_counts(request.user, coupons)
+    valid_coupons = [
+        coupon for coupon in coupons
+        if limit_message(coupon, used_by_user.get(coupon.id, 0)) is None
+    ]
 
     # ✅ Fetch user's saved addresses (if logged in)
     addresses = []
@@ -1081,72 +888,55 @@ def buy_now_view(request, pk):
         'order_total': order_total,
         'coupons': valid_coupons,
         'addresses': addresses,  # ✅ Pass addresses to template
+        'error_message': error_message,
     }
 
     return render(request, 'buy_now.html', context)
 
+@login_required
 def checkout_view(request):
     """
     Display checkout page with proper shipping calculation.
+    POST places the order (see orders/checkout.py).
     """
-    cart_items = Cart.objects.filter(user=request.user).select_related('product')
-    if not cart_items.exists():
-        return redirect('shopping_cart')
-
-    subtotal = Decimal('0.00')
-    total_shipping = Decimal('0.00')
-    all_free_shipping = True
-    enriched_items = []
-
-    for item in cart_items:
-        product = item.product
-        line_total = item.subtotal
-        subtotal += line_total
-
-        # ✅ Calculate shipping per product
-        shipping_label = getattr(product, 'shipping_label', '')
-        shipping_charge = getattr(product, 'shipping_charge', Decimal('0.00'))
+    applied_coupon = request.session.get('applied_coupon')
+    error_message = None
 
-        # If product has explicit free shipping
-        if shipping_label == 'free' or shipping_charge == 0:
-            product_shipping = Decimal('0.00')
+    if request.method == 'POST':
+        try:
+            order = checkout_cart(
+                request.user, _checkout_details(request),
+                coupon_code=applied_coupon.get('code') if applied_coupon else None,
+            )
+        except CheckoutError as e:
+            error_message = str(e)
         else:
-            product_shipping = Decimal(str(shipping_charge))
-            all_free_shipping = False
-
-        total_shipping += product_shipping
-
-        enriched_items.append({
-            'product': product,
-            'quantity': item.quantity,
-            'line_total': line_total,
-            'shipping_charge': product_shipping,
-        })
+            request.session.pop('applied_coupon', None)
+            return redirect(_order_placed_url(order))
 
-    # ✅ Automatic Free Shipping condition (only if total >= 1000)
-    # if subtotal >= 1000:
-    #     total_shipping = Decimal('0.00')
-    # ❌ Don’t force free shipping just because all items are labeled free — only skip if subtotal < 1000.
+    pricing = get_cart_pricing(request)
+    if not pricing:
+        return redirect('shopping_cart')
 
-    # ✅ Apply coupon if available
-    applied_coupon = request.session.get('applied_coupon')
+    # ✅ Apply coupon if available (recomputed against the current subtotal)
     discount_amount = Decimal('0.00')
     if applied_coupon:
-        discount_amount = Decimal(applied_coupon['discount_amount'])
-
-    total = subtotal + total_shipping - discount_amount
+        discount_amount = pricing.coupon_amount(
+            applied_coupon.get('discount_type'), applied_coupon.get('discount_value')
+        )
 
     # ✅ Fetch saved addresses
     addresses = Address.objects.filter(user=request.user)
 
     context = {
-        'cart_items': enriched_items,
-        'subtotal': subtotal,
-        'shipping_charge': total_shipping,
+        'cart_items': pricing.lines,
+        'subtotal': pricing.subtotal,
+        'shipping_charge': pricing.shipping,
         'discount_amount': discount_amount,
-        'total': total,
+        'total': pricing.total(discount_amount),
         'applied_coupon': applied_coupon,
         'addresses': addresses,
+        'error_message': error_message,
     }
 
     return render(request, 'checkout.html', context)
@@ -1237,7 +1027,24 @@ def shipping_policy_view(request):
     return render(request, 'shipping_policy.html')
 
 def track_order_view(request):
-    return render(request, 'track_order.html')
+    order_number = request.GET.get('order_number', '').strip()
+    email = request.GET.get('email', '').strip()
+
+    order = None
+    if order_number and email:
+        order = (
+            Order.objects.filter(order_number__iexact=order_number, email__iexact=email)
+            .prefetch_related('lines')
+            .first()
+        )
+
+    context = {
+        'order': order,
+        'order_number': order_number,
+        'email': email,
+        'searched': bool(order_number and email),
+    }
+    return render(request, 'track_order.html', context)
 
 def return_policy_view(request):
     return render(request, 'return_policy.html')
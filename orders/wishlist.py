@@ -0,0 +1,37 @@
+# orders/wishlist.py
+"""
+Per-user wishlist membership cache.
+
+Each user's wishlisted product ids are kept as a frozenset in the cache
+backend, so listing pages check `product.pk in wishlisted_ids` in O(1)
+without querying Wishlist. The set is loaded lazily on first use and
+dropped by the Wishlist signals in orders/signals.py once a change commits,
+so the next read rebuilds it; patching the cached set in place could let two
+concurrent toggles (or a toggle and a rebuild) store a stale set for a day.
+"""
+from django.core.cache import cache
+
+from .models import Wishlist
+
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def wishlist_cache_key(user_id):
+    return f'wishlist_ids:{user_id}'
+
+
+def get_wishlist_ids(user):
+    """Return a frozenset of product ids in the user's wishlist (empty for anonymous users)."""
+    if not user.is_authenticated:
+        return frozenset()
+
+    key = wishlist_cache_key(user.pk)
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(Wishlist.objects.filter(user=user).values_list('product_id', flat=True))
+        cache.set(key, ids, CACHE_TIMEOUT)
+    return ids
+
+
+def invalidate_wishlist_ids(user_id):
+    cache.delete(wishlist_cache_key(user_id))